@@ -0,0 +1,135 @@
+"""
+Compares nominal and robust tunings over a matrix of sampled workloads, or
+exactly at the worst case workload of each KL radius
+"""
+
+import numpy as np
+import pandas as pd
+from numba import njit, prange
+from robust.workload_uncertainty import kl_worst_case_grid
+
+# Tuning columns repeated on every sample row of the comparison
+TUNING_COLUMNS = (
+    'workload_idx', 'z0', 'z1', 'q', 'w', 'N', 'M',
+    'robust_rho', 'robust_m_filt', 'robust_T', 'robust_is_leveling_policy',
+    'robust_exit_mode',
+    'nominal_m_filt', 'nominal_T', 'nominal_is_leveling_policy')
+SAMPLE_COLUMNS = ('z0_s', 'z1_s', 'q_s', 'w_s')
+
+
+@njit(cache=True, nogil=True, parallel=True)
+def compare_tunings(samples, expected, nominal, robust, ops_mask):
+    """Cost of every sample under the nominal and robust tuning of each row,
+    and the KL divergence of the sample from the row's expected workload
+
+    :param samples: (n, 4) sampled workloads
+    :param expected: (t, 4) expected workload of each tuning
+    :param nominal: (t, 4) [Z0, Z1, Q, W] of each nominal tuning
+    :param robust: (t, 4) [Z0, Z1, Q, W] of each robust tuning
+    :param ops_mask: (4,) operations included in the divergence
+    :return rho_hat, nominal_cost, robust_cost: (t * n,) tuning major
+    """
+    t, n = expected.shape[0], samples.shape[0]
+    rho_hat = np.empty(t * n)
+    nominal_cost = np.empty(t * n)
+    robust_cost = np.empty(t * n)
+    for row in prange(t * n):
+        i, j = row // n, row % n
+        distance = 0.
+        nominal_total = 0.
+        robust_total = 0.
+        for op in range(4):
+            x, y = samples[j, op], expected[i, op]
+            nominal_total += x * nominal[i, op]
+            robust_total += x * robust[i, op]
+            # Same conventions as scipy.special.rel_entr
+            if not ops_mask[op] or x == 0:
+                continue
+            if y > 0:
+                distance += x * np.log(x / y)
+            else:
+                distance = np.inf
+        rho_hat[row] = distance
+        nominal_cost[row] = nominal_total
+        robust_cost[row] = robust_total
+
+    return rho_hat, nominal_cost, robust_cost
+
+
+def tuning_components(tunings, cost_func, prefix):
+    """Stacks the [Z0, Z1, Q, W] of one design of each tuning
+
+    :param tunings: DataFrame of CreateWorkloadUncertaintyTunings
+    :param cost_func: cost function with the tunings' N, phi, s, B and E
+    :param prefix: 'nominal' or 'robust'
+    """
+    components = np.empty((len(tunings), 4))
+    for idx, (m_filt, T, policy, N, M) in enumerate(zip(
+            tunings[f'{prefix}_m_filt'], tunings[f'{prefix}_T'],
+            tunings[f'{prefix}_is_leveling_policy'],
+            tunings['N'], tunings['M'])):
+        cost_func.M = M
+        cost_func.is_leveling_policy = bool(policy)
+        components[idx] = cost_func.calculate_components(m_filt / N, T)
+
+    return components
+
+
+def comparison_frame(tunings, samples, cost_func, ops_mask):
+    """One row per (tuning, sample) with the nominal and robust costs
+
+    :param tunings: DataFrame of CreateWorkloadUncertaintyTunings
+    :param samples: (n, 4) sampled workloads
+    :param cost_func: cost function with the tunings' N, phi, s, B and E,
+        its memory and policy are overwritten per tuning
+    :param ops_mask:
+    """
+    tunings = tunings.rename(columns={'rho': 'robust_rho'})
+    samples = np.ascontiguousarray(samples, dtype=np.float64)
+    n = samples.shape[0]
+
+    rho_hat, nominal_cost, robust_cost = compare_tunings(
+        samples,
+        tunings[['z0', 'z1', 'q', 'w']].to_numpy(dtype=np.float64),
+        tuning_components(tunings, cost_func, 'nominal'),
+        tuning_components(tunings, cost_func, 'robust'),
+        np.array(ops_mask, dtype=np.bool_))
+
+    columns = {key: np.repeat(tunings[key].to_numpy(), n)
+               for key in TUNING_COLUMNS}
+    for op, key in enumerate(SAMPLE_COLUMNS):
+        columns[key] = np.tile(samples[:, op], len(tunings))
+    columns['sample_idx'] = np.tile(np.arange(n), len(tunings))
+    columns['rho_hat'] = rho_hat
+    columns['nominal_cost'] = nominal_cost
+    columns['robust_cost'] = robust_cost
+
+    return pd.DataFrame(columns)
+
+
+def worst_case_frame(tunings, cost_func, rhos):
+    """One row per (tuning, rho) with the exact worst case cost of the
+    nominal and robust tunings over the KL ball of radius rho around the
+    tuning's expected workload, and the workloads attaining them
+
+    :param tunings: DataFrame of CreateWorkloadUncertaintyTunings
+    :param cost_func: cost function with the tunings' N, phi, s, B and E,
+        its memory and policy are overwritten per tuning
+    :param rhos: KL radii to evaluate at
+    """
+    tunings = tunings.rename(columns={'rho': 'robust_rho'})
+    rhos = np.asarray(rhos, dtype=np.float64)
+    expected = tunings[['z0', 'z1', 'q', 'w']].to_numpy(dtype=np.float64)
+    r = len(rhos)
+
+    columns = {key: np.repeat(tunings[key].to_numpy(), r)
+               for key in TUNING_COLUMNS}
+    columns['rho_eval'] = np.tile(rhos, len(tunings))
+    for prefix in ('nominal', 'robust'):
+        costs, worst = kl_worst_case_grid(
+            tuning_components(tunings, cost_func, prefix), expected, rhos)
+        columns[f'{prefix}_worst_cost'] = costs.reshape(-1)
+        for op, key in enumerate(('z0', 'z1', 'q', 'w')):
+            columns[f'{prefix}_worst_{key}'] = worst[:, :, op].reshape(-1)
+
+    return pd.DataFrame(columns)
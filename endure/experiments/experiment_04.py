@@ -14,7 +14,8 @@ import numpy as np
 import pandas as pd
 
 from lsm_tree.PyRocksDB import RocksDB
-from lsm_tree.cost_function import CostFunction
+from lsm_tree.cost_function import (CostFunction, LEVEL_COLUMNS,
+                                    rocksdb_level_buckets)
 from data.data_provider import DataProvider
 from data.data_exporter import DataExporter
 
@@ -73,6 +74,11 @@ class Experiment04(object):
                 row[f'{key}'] = val
 
             row['model_io'] = cf.calculate_cost(settings['h'], settings['T'])
+            levels = cf.calculate_level_components(settings['h'],
+                                                   settings['T'])
+            run_prob = LEVEL_COLUMNS.index('run_prob')
+            for bucket, vals in rocksdb_level_buckets(levels).items():
+                row[f'model_{bucket}_hit'] = z1 * vals[run_prob]
             df.append(row)
             self.de.export_csv_file(pd.DataFrame(df), 'experiment_04_checkpoint.csv')
 
@@ -3,16 +3,13 @@ from copy import deepcopy
 # import warnings
 # warnings.filterwarnings('ignore', category=RuntimeWarning)
 
-import numpy as np
 # np.seterr(all='ignore')
-import pandas as pd
-from tqdm import tqdm
-from scipy.special import rel_entr
 
 from data.data_provider import DataProvider
 from data.data_exporter import DataExporter
 from jobs.create_workload_uncertainty_tunings import CreateWorkloadUncertaintyTunings
 from jobs.sample_uncertain_workloads import SampleUncertainWorkloads
+from experiments.comparison import comparison_frame
 from lsm_tree.cost_function import CostFunction
 
 
@@ -82,70 +79,18 @@ class Experiment01(object):
         # Sample uncertain workloads object
         suw = SampleUncertainWorkloads(config)
 
-        # Create workload uncertainty tunings and get a list of tunings dictionaries
+        # Create workload uncertainty tunings
         cwut = CreateWorkloadUncertaintyTunings(config)
-        tunings = cwut.run().to_dict('records')
-
-        comparisons = []
-        sample_wls = suw.get_uncertain_samples(sample_size, ops_mask)
-
-        # Calculating distances for all expected WLs
-        self.logger.info('Calcuting rho hat values for all expected workloads')
-        distances = {}
-        for wl in expected_workloads:
-            key = str(wl)
-            w0 = [wl['z0'], wl['z1'], wl['q'], wl['w']]
-            w0_tmp = [op for op, mask in list(zip(w0, ops_mask)) if mask]
-            distances[key] = []
-            for sample in sample_wls:
-                w_hat = [sample['z0'], sample['z1'], sample['q'], sample['w']]
-                w_hat_tmp = [op for op, mask in list(zip(w_hat, ops_mask)) if mask]
-                distances[key].append(np.sum(rel_entr(w_hat_tmp, w0_tmp)))
+        tunings = cwut.run()
+
+        sample_matrix = suw.get_uncertain_sample_matrix(sample_size, ops_mask)
 
+        # Every (tuning, sample) pair is evaluated by one compiled kernel
         self.logger.info('Calculating cost of tunings')
-        for tuning in tqdm(tunings, desc='Tunings', ncols=120):
-            row = {}
-            row['workload_idx'] = tuning['workload_idx']
-            row['w'] = {'z0': tuning['z0'], 'z1': tuning['z1'], 'q': tuning['q'], 'w': tuning['w']}
-            row['N'] = tuning['N']
-            row['M'] = tuning['M']
-
-            # Tunings
-            row['robust_rho'] = tuning['rho']
-            row['robust_m_filt'] = tuning['robust_m_filt']
-            row['robust_T'] = tuning['robust_T']
-            row['robust_is_leveling_policy'] = tuning['robust_is_leveling_policy']
-            row['robust_exit_mode'] = tuning['robust_exit_mode']
-
-            row['nominal_m_filt'] = tuning['nominal_m_filt']
-            row['nominal_T'] = tuning['nominal_T']
-            row['nominal_is_leveling_policy'] = tuning['nominal_is_leveling_policy']
-
-            config['lsm_tree_config']['M'] = tuning['M']
-
-            distance = distances[str(row['w'])]
-            for idx, w_hat in enumerate(tqdm(sample_wls, desc='Sample Workloads', ncols=120, leave=False)):
-                row['rho_hat'] = distance[idx]
-                row['w_hat'] = w_hat
-                row['sample_idx'] = idx
-
-                # Get nominal cost
-                config['lsm_tree_config']['is_leveling_policy'] = row['nominal_is_leveling_policy']
-                cf = CostFunction(**config['lsm_tree_config'], **w_hat)
-                nominal_cost = cf.calculate_cost(row['nominal_m_filt'] / row['N'], row['nominal_T'])
-                row['nominal_cost'] = nominal_cost
-                del cf
-
-                # Get robust cost
-                config['lsm_tree_config']['is_leveling_policy'] = row['robust_is_leveling_policy']
-                cf = CostFunction(**config['lsm_tree_config'], **w_hat)
-                robust_cost = cf.calculate_cost(row['robust_m_filt'] / row['N'], row['robust_T'])
-                row['robust_cost'] = robust_cost
-                del cf
-
-                comparisons.append(deepcopy(row))
-
-        df = pd.DataFrame(comparisons)
+        cf = CostFunction(**config['lsm_tree_config'],
+                          **expected_workloads[0])
+        df = comparison_frame(tunings, sample_matrix, cf, ops_mask)
+
         self.logger.info("Exporting data from experiment 01")
         self.data_exporter.export_csv_file(df, 'experiment_01.csv')
         self.logger.info("Finished Experiment 01\n")
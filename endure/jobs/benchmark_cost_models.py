@@ -0,0 +1,217 @@
+"""
+Benchmarks the cost models on deep trees and checks the linear-time Z1
+against the quadratic per-level formulation, and the KL worst case against
+a direct minimization of its dual
+"""
+
+import logging
+import time
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize_scalar
+from scipy.special import logsumexp
+from lsm_tree.cost_function import CostFunction
+from lsm_tree.cost_func import (EndureTierLevelCost, EndureQFixedCost,
+                                EndureKHybridCost, EndureYZHybridCost, Policy)
+from robust.workload_uncertainty import kl_worst_case
+from data.data_exporter import DataExporter
+
+
+def reference_z1(fp, run_prob, runs):
+    """Quadratic Z1 re-summing the upper level false positives per level
+
+    :param fp: false positive rate of each level
+    :param run_prob: probability the entry lives in each level
+    :param runs: number of runs in each level
+    :return z1:
+    """
+    z1 = 0
+    for i in range(len(fp)):
+        upper_fp = 0
+        for j in range(i):
+            upper_fp += runs[j] * fp[j]
+        z1 += run_prob[i] * (1 + upper_fp + ((runs[i] - 1) / 2) * fp[i])
+
+    return z1
+
+
+def reference_kl_worst_case(components, workload, rho):
+    """Worst case cost minimizing the dual lamb * (rho + log(sum(w *
+    exp(c / lamb)))) over log(lamb), on the operations the workload runs
+
+    :param components: [Z0, Z1, Q, W]
+    :param workload: (z0, z1, q, w)
+    :param rho: radius of the KL ball
+    :return cost:
+    """
+    c, w = components[workload > 0], workload[workload > 0]
+    if c.max() == c.min():
+        return c.max()
+
+    def dual(log_lamb):
+        lamb = np.exp(log_lamb)
+        return lamb * (rho + logsumexp(c / lamb, b=w))
+
+    sol = minimize_scalar(dual, bounds=(-20, 20), method='bounded',
+                          options={'xatol': 1e-10})
+    return min(sol.fun, c.max())
+
+
+class BenchmarkCostModels(object):
+    """
+    Times the cost models across deep trees and verifies Z1
+    """
+
+    def __init__(self, config):
+        """Constructor
+
+        :param config:
+        """
+        self.config = config
+        self.logger = logging.getLogger('rlt_logger')
+        self.data_exporter = DataExporter(self.config)
+        self.bench_config = self.config['benchmark_cost_models']
+
+    def time_calls(self, func, *args):
+        """Returns the mean wall time of a call in microseconds
+
+        :param func:
+        :param args:
+        """
+        repeats = self.bench_config['repeats']
+        func(*args)  # Exclude compilation
+        start = time.perf_counter()
+        for _ in range(repeats):
+            func(*args)
+
+        return (time.perf_counter() - start) * 1e6 / repeats
+
+    def cost_func_models(self, N, H, T):
+        """Yields (name, model, Z1 function, params, per level runs) for the
+        cost_func.py models
+
+        :param N:
+        :param H:
+        :param T:
+        """
+        lsm = self.config['lsm_tree_config']
+        args = (lsm['B'], lsm['E'], H, N, lsm['phi'], lsm['s'])
+        k = np.full(128, 3.)
+
+        cf = EndureTierLevelCost(*args)
+        yield ('tier', cf, cf.Z1, (Policy.Tiering,), lambda L: [T - 1] * L)
+        yield ('level', cf, cf.Z1, (Policy.Leveling,), lambda L: [1] * L)
+        cf = EndureQFixedCost(*args)
+        yield ('qfixed', cf, cf.Z1, (3.,), lambda L: [3.] * L)
+        cf = EndureKHybridCost(*args)
+        yield ('khybrid', cf, cf.Z1, (k,), lambda L: list(k[:L]))
+        cf = EndureYZHybridCost(*args)
+        yield ('yzhybrid', cf, cf.Z1, (3., 2.),
+               lambda L: [3.] * (L - 1) + [2.])
+
+    def benchmark_cost_func(self, N, H, h, T):
+        """Benchmarks the cost_func.py models at a single tuning"""
+        rows = []
+        for name, cf, z1_func, params, runs in self.cost_func_models(N, H, T):
+            L = int(cf.L(h, T, True))
+            mbuff = cf.mbuff(h)
+            Nf = sum([(T - 1) * (T ** (level - 1)) * mbuff / cf.E
+                      for level in range(1, L + 1)])
+            fp = [cf.fp(h, T, i) for i in range(1, L + 1)]
+            run_prob = [cf.run_prob(i, T, mbuff, Nf) for i in range(1, L + 1)]
+
+            expected = reference_z1(fp, run_prob, runs(L))
+            z1 = z1_func(h, T, *params)
+            rows.append({
+                'model': name, 'N': N, 'h': h, 'T': T, 'L': L,
+                'z1': z1, 'z1_reference': expected,
+                'rel_err': abs(z1 - expected) / abs(expected),
+                'z1_us': self.time_calls(z1_func, h, T, *params)})
+
+        return rows
+
+    def benchmark_cost_function(self, N, H, h, T):
+        """Benchmarks CostFunction at a single tuning"""
+        rows = []
+        lsm = self.config['lsm_tree_config']
+        for is_leveling_policy in (True, False):
+            cf = CostFunction(N, lsm['phi'], lsm['s'], lsm['B'], lsm['E'],
+                              H * N, is_leveling_policy,
+                              0.25, 0.25, 0.25, 0.25)
+            L = int(cf.L(h, T))
+            mbuff = cf.M - (h * cf.N)
+            Nf = sum([(T - 1) * (T ** (level - 1)) * mbuff / cf.E
+                      for level in range(1, L + 1)])
+            fp = [cf.fp(h, T, i) for i in range(1, L + 1)]
+
+            expected = 0
+            for i in range(1, L + 1):
+                run_prob = (mbuff * (T ** (i - 1))) / (Nf * cf.E)
+                fp_levels_sum = sum(fp[:max(i - 2, 0)])
+                if not is_leveling_policy:
+                    fp_levels_sum += ((T - 2) / 2) * fp[i - 1]
+                expected += (T - 1) * run_prob * (1 + fp_levels_sum)
+            z1 = cf.Z1(h, T)
+            rows.append({
+                'model': 'level' if is_leveling_policy else 'tier',
+                'N': N, 'h': h, 'T': T, 'L': L,
+                'z1': z1, 'z1_reference': expected,
+                'rel_err': abs(z1 - expected) / abs(expected),
+                'z1_us': self.time_calls(cf.Z1, h, T)})
+
+        return rows
+
+    def check_kl_worst_case(self):
+        """Compares kl_worst_case to reference_kl_worst_case, on workloads
+        leaving operations out, whose costs may be arbitrarily large"""
+        rows = []
+        components = np.array([1., 2., 3., 1000.])
+        for workload in ((0.25, 0.25, 0.25, 0.25), (0.5, 0.3, 0.2, 0.),
+                         (0., 0.5, 0.5, 0.), (0.9, 0., 0., 0.1)):
+            workload = np.array(workload)
+            for rho in (0.1, 0.5, 2.):
+                cost = kl_worst_case(components, workload, rho)[0]
+                expected = reference_kl_worst_case(components, workload, rho)
+                rows.append({
+                    'workload': tuple(workload), 'rho': rho,
+                    'cost': cost, 'cost_reference': expected,
+                    'rel_err': abs(cost - expected) / abs(expected)})
+
+        return rows
+
+    def run(self):
+        """
+        Runs the job
+        """
+        self.logger.info('Starting job: Benchmark Cost Models')
+        H = self.config['expected_memory_bits_per_element'][0]
+
+        df = []
+        for N in self.bench_config['N']:
+            for T in self.bench_config['T']:
+                for h in self.bench_config['h']:
+                    for row in self.benchmark_cost_func(N, H, h, T):
+                        row['cost_model'] = 'cost_func'
+                        df.append(row)
+                    for row in self.benchmark_cost_function(N, H, h, T):
+                        row['cost_model'] = 'cost_function'
+                        df.append(row)
+
+        df = pd.DataFrame(df)
+        self.logger.info(f'Max relative Z1 error: {df["rel_err"].max():.3e}')
+        self.logger.info(
+            'Mean Z1 call time (us): '
+            f'{df.groupby("cost_model")["z1_us"].mean().to_dict()}')
+        self.data_exporter.export_csv_file(df, 'benchmark_cost_models.csv')
+
+        kl = pd.DataFrame(self.check_kl_worst_case())
+        # NaN compares false, so a NaN cost fails the check too
+        if not (kl['rel_err'] <= 1e-6).all():
+            self.logger.warning(
+                'kl_worst_case disagrees with its reference:\n'
+                f'{kl[~(kl["rel_err"] <= 1e-6)]}')
+        self.logger.info(f'Max relative KL error: {kl["rel_err"].max():.3e}')
+        self.data_exporter.export_csv_file(kl, 'benchmark_kl_worst_case.csv')
+
+        self.logger.info('Finished job: Benchmark Cost Models\n')
+        return df
@@ -0,0 +1,122 @@
+"""
+Benchmarks the solver backends on the nominal and robust tuning problems
+"""
+
+import logging
+import time
+import numpy as np
+import pandas as pd
+from lsm_tree.cost_function import CostFunction
+from lsm_tree.nominal import NominalWorkloadTuning
+from lsm_tree.solvers import SOLVERS
+from robust.workload_uncertainty import WorkloadUncertainty
+from data.data_exporter import DataExporter
+
+# Uniform, unimodal, bimodal and trimodal workloads of the Endure paper
+STANDARD_WORKLOADS = [
+    {'z0': 0.25, 'z1': 0.25, 'q': 0.25, 'w': 0.25},
+    {'z0': 0.97, 'z1': 0.01, 'q': 0.01, 'w': 0.01},
+    {'z0': 0.01, 'z1': 0.97, 'q': 0.01, 'w': 0.01},
+    {'z0': 0.01, 'z1': 0.01, 'q': 0.97, 'w': 0.01},
+    {'z0': 0.01, 'z1': 0.01, 'q': 0.01, 'w': 0.97},
+    {'z0': 0.49, 'z1': 0.49, 'q': 0.01, 'w': 0.01},
+    {'z0': 0.49, 'z1': 0.01, 'q': 0.49, 'w': 0.01},
+    {'z0': 0.49, 'z1': 0.01, 'q': 0.01, 'w': 0.49},
+    {'z0': 0.01, 'z1': 0.49, 'q': 0.49, 'w': 0.01},
+    {'z0': 0.01, 'z1': 0.49, 'q': 0.01, 'w': 0.49},
+    {'z0': 0.01, 'z1': 0.01, 'q': 0.49, 'w': 0.49},
+    {'z0': 0.33, 'z1': 0.33, 'q': 0.33, 'w': 0.01},
+    {'z0': 0.33, 'z1': 0.33, 'q': 0.01, 'w': 0.33},
+    {'z0': 0.33, 'z1': 0.01, 'q': 0.33, 'w': 0.33},
+    {'z0': 0.01, 'z1': 0.33, 'q': 0.33, 'w': 0.33},
+]
+
+
+class BenchmarkSolvers(object):
+    """
+    Times every solver backend on the same tuning problems and compares the
+    costs they reach
+    """
+
+    def __init__(self, config):
+        """Constructor
+
+        :param config:
+        """
+        self.config = config
+        self.logger = logging.getLogger('rlt_logger')
+        self.data_exporter = DataExporter(self.config)
+        self.bench_config = self.config['benchmark_solvers']
+
+    def problems(self, cf, solver):
+        """Yields (problem, rho, policy, solve) for one cost function, solve()
+        returning the design and its objective
+
+        :param cf:
+        :param solver:
+        """
+        nominal = NominalWorkloadTuning(cf, solver=solver)
+        robust = WorkloadUncertainty(cf, solver=solver)
+        for policy in (True, False):
+            yield ('nominal', 0, policy,
+                   lambda policy=policy: nominal.get_nominal_design(policy))
+            for rho in self.bench_config['rhos']:
+                yield ('robust', rho, policy,
+                       lambda policy=policy, rho=rho:
+                       robust.get_robust_design(rho, policy))
+
+    def time_solve(self, solve):
+        """Returns the design and the best wall time in milliseconds
+
+        :param solve:
+        """
+        solve()  # Exclude compilation
+        best = np.inf
+        for _ in range(self.bench_config['repeats']):
+            start = time.perf_counter()
+            design = solve()
+            best = min(best, time.perf_counter() - start)
+
+        return design, best * 1e3
+
+    def run(self):
+        """
+        Runs the job
+        """
+        self.logger.info('Starting job: Benchmark Solvers')
+        workloads = self.bench_config.get('workloads') or STANDARD_WORKLOADS
+        solvers = self.bench_config.get('solvers') or sorted(SOLVERS)
+        lsm = dict(self.config['lsm_tree_config'])
+        lsm['M'] = (self.config['expected_memory_bits_per_element'][0]
+                    * lsm['N'])
+
+        df = []
+        for idx, w in enumerate(workloads):
+            cf = CostFunction(**lsm, **w)
+            for solver in solvers:
+                for problem, rho, policy, solve in self.problems(cf, solver):
+                    design, wall_ms = self.time_solve(solve)
+                    df.append({
+                        'solver': solver, 'workload_idx': idx,
+                        'problem': problem, 'rho': rho,
+                        'is_leveling_policy': policy, 'wall_ms': wall_ms,
+                        'nfev': design['nfev'], 'njev': design['njev'],
+                        'exit_mode': design['exit_mode'],
+                        'T': design['T'], 'M_h': design['M_h'],
+                        'obj': design.get('obj', design['cost'])})
+
+        df = pd.DataFrame(df)
+        # Gap to the best objective any backend reached on the same problem
+        best = df.groupby(['workload_idx', 'problem', 'rho',
+                           'is_leveling_policy'])['obj'].transform('min')
+        df['rel_gap'] = (df['obj'] - best) / best
+        summary = df.groupby('solver').agg(
+            wall_ms=('wall_ms', 'mean'), nfev=('nfev', 'mean'),
+            njev=('njev', 'mean'), mean_gap=('rel_gap', 'mean'),
+            max_gap=('rel_gap', 'max'),
+            failed=('exit_mode', lambda modes: int((modes != 0).sum())))
+        self.logger.info(f'Solver summary:\n{summary.to_string()}')
+        self.data_exporter.export_csv_file(df, 'benchmark_solvers.csv')
+
+        self.logger.info('Finished job: Benchmark Solvers\n')
+        return df
@@ -0,0 +1,45 @@
+"""
+Builds the memory-mapped cost surface table
+"""
+
+import logging
+import os
+import time
+from lsm_tree.cost_surface import CostSurface
+
+
+class BuildCostSurface(object):
+    """
+    Tabulates the cost model over the configured (h, T, N, M) grid
+    """
+
+    def __init__(self, config):
+        """Constructor
+
+        :param config:
+        """
+        self.config = config
+        self.logger = logging.getLogger('rlt_logger')
+
+    def run(self):
+        """
+        Runs the job
+        """
+        self.logger.info('Starting job: Build Cost Surface')
+        surface_config = self.config['cost_surface']
+        lsm = self.config['lsm_tree_config']
+        path = os.path.join(self.config['app']['DATA_DIR'],
+                            surface_config['dirname'])
+
+        start = time.perf_counter()
+        surface = CostSurface.build(
+            path,
+            surface_config['h'], surface_config['T'],
+            surface_config['N'], surface_config['M'],
+            lsm['phi'], lsm['s'], lsm['B'], lsm['E'])
+        self.logger.info(
+            f'Tabulated {surface.components.shape} components in '
+            f'{time.perf_counter() - start:.2f}s to {path}')
+
+        self.logger.info('Finished job: Build Cost Surface\n')
+        return surface
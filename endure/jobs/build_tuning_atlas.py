@@ -0,0 +1,52 @@
+"""
+Builds the atlas of precomputed designs over the workload simplex
+"""
+
+import logging
+import os
+import time
+from lsm_tree.tuning_atlas import TuningAtlas
+
+
+class BuildTuningAtlas(object):
+    """
+    Solves the configured (rho, bits per element) slices of the atlas,
+    resuming any slice a previous run left unfinished
+    """
+
+    def __init__(self, config):
+        """Constructor
+
+        :param config:
+        """
+        self.config = config
+        self.logger = logging.getLogger('rlt_logger')
+
+    def run(self):
+        """
+        Runs the job
+        """
+        self.logger.info('Starting job: Build Tuning Atlas')
+        atlas_config = self.config['tuning_atlas']
+        path = os.path.join(self.config['app']['DATA_DIR'],
+                            atlas_config['dirname'])
+
+        start = time.perf_counter()
+        atlas = TuningAtlas.build(
+            path, self.config['lsm_tree_config'], atlas_config['rhos'],
+            atlas_config['bits']
+            or self.config['expected_memory_bits_per_element'],
+            resolution=atlas_config['resolution'],
+            levels=atlas_config['levels'], margin=atlas_config['margin'],
+            tol_h=atlas_config['tol_h'], tol_T=atlas_config['tol_T'],
+            solver=self.config.get('solver', 'slsqp'),
+            max_workers=atlas_config['max_workers'],
+            chunk_size=atlas_config['chunk_size'])
+        num_points = sum(len(atlas_slice.coords)
+                         for atlas_slice in atlas.slices.values())
+        self.logger.info(
+            f'Atlas of {len(atlas.slices)} slices and {num_points} workloads '
+            f'in {time.perf_counter() - start:.2f}s at {path}')
+
+        self.logger.info('Finished job: Build Tuning Atlas\n')
+        return atlas
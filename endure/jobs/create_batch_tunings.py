@@ -0,0 +1,45 @@
+"""
+Tunes a batch of (workload, rho, N, M) rows, such as every instance of a
+fleet, in one pass
+"""
+
+import logging
+import os
+import time
+import pandas as pd
+from lsm_tree.batch_tuning import BatchTuning
+from data.data_exporter import DataExporter
+
+
+class CreateBatchTunings(object):
+    """
+    Reads the rows to tune from a CSV file in DATA_DIR and exports their
+    designs
+    """
+
+    def __init__(self, config):
+        """Constructor
+
+        :param config:
+        """
+        self.config = config
+        self.logger = logging.getLogger('rlt_logger')
+        self.data_exporter = DataExporter(self.config)
+
+    def run(self):
+        """
+        Runs the job
+        """
+        self.logger.info('Starting job: Create Batch Tunings')
+        batch_config = self.config['batch_tuning']
+        rows = pd.read_csv(os.path.join(self.config['app']['DATA_DIR'],
+                                        batch_config['input']))
+
+        start = time.perf_counter()
+        df = BatchTuning.from_config(self.config).tune(rows)
+        self.logger.info(f'Tuned {len(df)} rows as {df["group"].nunique()} '
+                         f'keys in {time.perf_counter() - start:.2f}s')
+        self.data_exporter.export_csv_file(df, batch_config['filename'])
+
+        self.logger.info('Finished job: Create Batch Tunings\n')
+        return df
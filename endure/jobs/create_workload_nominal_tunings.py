@@ -8,7 +8,9 @@ import pandas as pd
 from scipy.stats import chi2
 from copy import deepcopy
 from lsm_tree.cost_function import CostFunction
+from lsm_tree.multi_start import MultiStart
 from lsm_tree.nominal import NominalWorkloadTuning
+from lsm_tree.policy_bounds import PolicyBounds
 from data.data_exporter import DataExporter
 
 
@@ -30,6 +32,8 @@ class CreateNominalWorkloadTunings(object):
         expected_workloads = self.config['expected_workloads']
         expected_memory_bits_per_element = self.config['expected_memory_bits_per_element']
 
+        multi_start = MultiStart.from_config(self.config)
+
         # Create a dataframe to store results
         df = []
 
@@ -54,7 +58,9 @@ class CreateNominalWorkloadTunings(object):
                 tmp['M'] = self.config['lsm_tree_config']['M']
 
                 cf = CostFunction(**self.config['lsm_tree_config'], **w)
-                nominal = NominalWorkloadTuning(cf)
+                nominal = NominalWorkloadTuning(
+                    cf, multi_start, PolicyBounds.from_config(cf, self.config),
+                    self.config.get('solver', 'slsqp'))
                 nominal_design = nominal.get_nominal_design(is_leveling_policy=None)
                 tmp['nominal_m_filt'] = nominal_design['M_filt']
                 tmp['nominal_m_buff'] = nominal_design['M_buff']
@@ -64,6 +70,9 @@ class CreateNominalWorkloadTunings(object):
 
                 df.append(deepcopy(tmp))
 
+        if multi_start is not None:
+            multi_start.close()
+
         df = pd.DataFrame(df)
         self.data_exporter.export_csv_file(df, 'workload_nominal_tunings.csv')
 
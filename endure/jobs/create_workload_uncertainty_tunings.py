@@ -8,7 +8,10 @@ import pandas as pd
 from tqdm import tqdm
 from copy import deepcopy
 from lsm_tree.cost_function import CostFunction
+from lsm_tree.integer_tuning import IntegerTuning
+from lsm_tree.multi_start import MultiStart
 from lsm_tree.nominal import NominalWorkloadTuning
+from lsm_tree.policy_bounds import PolicyBounds
 from robust.workload_uncertainty import WorkloadUncertainty
 from data.data_exporter import DataExporter
 
@@ -36,6 +39,21 @@ class CreateWorkloadUncertaintyTunings(object):
 
         return rhos
 
+    def deployment(self, row, prefix, design):
+        """Copies the rounded and deployed configurations of a design that
+        went through IntegerTuning.deploy into the row
+
+        :param row:
+        :param prefix: 'nominal' or 'robust'
+        :param design:
+        """
+        for kind in ('rounded', 'deployed'):
+            row[f'{prefix}_{kind}_T'] = design[f'{kind}_T']
+            row[f'{prefix}_{kind}_m_h'] = design[f'{kind}_M_h']
+            row[f'{prefix}_{kind}_cost'] = design[f'{kind}_cost']
+            if f'{kind}_obj' in design:
+                row[f'{prefix}_{kind}_obj'] = design[f'{kind}_obj']
+
     def run(self):
         """
         Runs the job
@@ -47,9 +65,15 @@ class CreateWorkloadUncertaintyTunings(object):
         expected_memory_bits_per_element = (
                 self.config['expected_memory_bits_per_element'])
         rhos = self.create_rho_list()
+        continuation = self.config['uncertain_workload_config'].get(
+            'continuation', False)
+        multi_start = MultiStart.from_config(self.config)
+        deployment = (self.config.get('deployment') or {}).get('mode', 'none')
+        solver = self.config.get('solver', 'slsqp')
 
         # Create a dataframe to store results
         df = []
+        path = []
         expected_workloads_pbar = tqdm(expected_workloads, desc='WL', ncols=120)
 
         for idx, w in enumerate(expected_workloads_pbar):
@@ -76,7 +100,9 @@ class CreateWorkloadUncertaintyTunings(object):
 
                 cf = CostFunction(**self.config['lsm_tree_config'], **w)
 
-                nominal = NominalWorkloadTuning(cf)
+                policy_bounds = PolicyBounds.from_config(cf, self.config)
+                nominal = NominalWorkloadTuning(
+                    cf, multi_start, policy_bounds, solver)
                 nominal_design = nominal.get_nominal_design(
                     is_leveling_policy=None)
                 row['nominal_m_h'] = nominal_design['M_h']
@@ -86,18 +112,24 @@ class CreateWorkloadUncertaintyTunings(object):
                 row['nominal_cost'] = nominal_design['cost']
                 row['nominal_is_leveling_policy'] = (
                         nominal_design['is_leveling_policy'])
-
-                robust = WorkloadUncertainty(cf)
-                for rho in rhos:
-                    row['rho'] = rho
-                    tiering_design = robust.get_robust_tiering_design(
-                        rho, nominal_design=None)
-                    leveling_design = robust.get_robust_leveling_design(
-                        rho, nominal_design=None)
-                    if tiering_design['obj'] < leveling_design['obj']:
-                        robust_design = tiering_design
-                    else:
-                        robust_design = leveling_design
+                if deployment != 'none':
+                    integer = IntegerTuning(cf)
+                    self.deployment(row, 'nominal', integer.deploy(
+                        nominal_design,
+                        exhaustive=(deployment == 'exhaustive')))
+
+                robust = WorkloadUncertainty(
+                    cf, multi_start, policy_bounds, solver)
+                if continuation:
+                    robust_designs = robust.get_robust_path(
+                        rhos, nominal_design=nominal_design)
+                else:
+                    robust_designs = [
+                        min(robust.get_robust_designs(rho).values(),
+                            key=lambda design: design['obj'])
+                        for rho in rhos]
+                for robust_design in robust_designs:
+                    row['rho'] = robust_design['rho']
                     row['robust_exit_mode'] = robust_design['exit_mode']
                     row['robust_m_h'] = robust_design['M_h']
                     row['robust_m_filt'] = robust_design['M_filt']
@@ -106,13 +138,31 @@ class CreateWorkloadUncertaintyTunings(object):
                     row['robust_cost'] = robust_design['cost']
                     row['robust_is_leveling_policy'] = (
                             robust_design['is_leveling_policy'])
+                    if deployment != 'none':
+                        self.deployment(row, 'robust', integer.deploy(
+                            robust_design, rho=robust_design['rho'],
+                            exhaustive=(deployment == 'exhaustive')))
+
+                    # Designs added between grid rhos only go to the path
+                    if continuation:
+                        row['refined'] = robust_design['refined']
+                        path.append(deepcopy(row))
+                        if robust_design['refined']:
+                            continue
+                        del row['refined']
 
                     # Append the design to the dataframe
                     df.append(deepcopy(row))
 
+        if multi_start is not None:
+            multi_start.close()
+
         df = pd.DataFrame(df)
         self.data_exporter.export_csv_file(
             df, 'workload_uncertainty_tunings.csv')
+        if continuation:
+            self.data_exporter.export_csv_file(
+                pd.DataFrame(path), 'workload_uncertainty_path.csv')
 
         self.logger.info("Finished job: Create Workload Uncertainty Tunings\n")
         return df
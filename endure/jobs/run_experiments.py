@@ -1,13 +1,27 @@
 """
 This class runs the experiments
 """
+import importlib
 import logging
-from experiments.experiment_01 import Experiment01
-from experiments.experiment_02 import Experiment02
-from experiments.experiment_03 import Experiment03
-from experiments.experiment_04 import Experiment04
-from experiments.experiment_05 import Experiment05
-from experiments.experiment_07 import Experiment07
+
+# Experiment name -> (module, class), imported only when an experiment runs
+EXPERIMENTS = {
+    'experiment_01': ('experiments.experiment_01', 'Experiment01'),
+    'experiment_02': ('experiments.experiment_02', 'Experiment02'),
+    'experiment_03': ('experiments.experiment_03', 'Experiment03'),
+    'experiment_04': ('experiments.experiment_04', 'Experiment04'),
+    'experiment_05': ('experiments.experiment_05', 'Experiment05'),
+    'experiment_07': ('experiments.experiment_07', 'Experiment07'),
+}
+
+
+def load_experiment(expt_name):
+    """Imports and returns the class implementing an experiment
+
+    :param expt_name: key of EXPERIMENTS
+    """
+    module_name, class_name = EXPERIMENTS[expt_name]
+    return getattr(importlib.import_module(module_name), class_name)
 
 
 class ExperimentDriver(object):
@@ -31,23 +45,10 @@ class ExperimentDriver(object):
 
         # Run experiments
         for expt_name in expt_list:
-            if expt_name == "experiment_01":
-                expt = Experiment01(self.config)
-                expt.run()
-            if expt_name == "experiment_02":
-                expt = Experiment02(self.config)
-                expt.run()
-            if expt_name == "experiment_03":
-                expt = Experiment03(self.config)
-                expt.run()
-            if expt_name == "experiment_04":
-                expt = Experiment04(self.config)
-                expt.run()
-            if expt_name == "experiment_05":
-                expt = Experiment05(self.config)
-                expt.run()
-            if expt_name == "experiment_07":
-                expt = Experiment07(self.config)
-                expt.run()
+            if expt_name not in EXPERIMENTS:
+                self.logger.warning(f'Unknown experiment: {expt_name}')
+                continue
+            expt = load_experiment(expt_name)(self.config)
+            expt.run()
 
         self.logger.info("Finished experiments")
@@ -24,31 +24,40 @@ class SampleUncertainWorkloads(object):
         self.logger = logging.getLogger('rlt_logger')
         self.data_exporter = DataExporter(self.config)
 
-    def get_uncertain_samples(self, num_samples, ops=(True, True, True, True)):
+    def get_uncertain_sample_matrix(self, num_samples,
+                                    ops=(True, True, True, True)):
         """
-        Gets a sample in the alpha uncertainty region of the expected workload
+        Samples workloads as an (num_samples, 4) array of (z0, z1, q, w),
+        drawing the same workloads as get_uncertain_samples
 
-        :param expected_workload:
-        :param alpha:
-        :param N:
+        :param num_samples:
+        :param ops: mask of the operations to sample, the rest are 0
         :return samples:
         """
         np.random.seed(0)
 
-        samples = []
-
         self.logger.info(
             f'Sampling workloads '
             f'{[op for op, mask in list(zip(["z0", "z1", "q", "w"], ops)) if mask]}')
 
-        # Number of workloads in the sample outside uncertainty region
-        for _ in range(num_samples):
-            w_hat = np.random.randint(100, size=len(ops))
-            w_hat = [num if mask else 0 for num, mask in list(zip(w_hat, ops))]
-            w_hat = w_hat / np.sum(w_hat)
-            w_hat = np.around(w_hat, PRECISION)
+        w_hat = np.random.randint(100, size=(num_samples, len(ops)))
+        w_hat = w_hat * np.array(ops, dtype=bool)
+        w_hat = w_hat / np.sum(w_hat, axis=1, keepdims=True)
+
+        return np.around(w_hat, PRECISION)
+
+    def get_uncertain_samples(self, num_samples, ops=(True, True, True, True)):
+        """
+        Gets a sample in the alpha uncertainty region of the expected workload
 
-            z0_sample, z1_sample, q_sample, w_sample = w_hat
+        :param expected_workload:
+        :param alpha:
+        :param N:
+        :return samples:
+        """
+        samples = []
+        for z0_sample, z1_sample, q_sample, w_sample in (
+                self.get_uncertain_sample_matrix(num_samples, ops)):
             sample = {}
             sample['z0'] = z0_sample
             sample['z1'] = z1_sample
@@ -0,0 +1,51 @@
+"""
+Trains the surrogate tuner on designs of the exact tuners
+"""
+
+import logging
+import os
+import time
+from lsm_tree.surrogate import SurrogateTuning, sample_designs
+
+
+class TrainSurrogate(object):
+    """
+    Solves random problems with the exact tuners and fits the surrogate
+    """
+
+    def __init__(self, config):
+        """Constructor
+
+        :param config:
+        """
+        self.config = config
+        self.logger = logging.getLogger('rlt_logger')
+
+    def run(self):
+        """
+        Runs the job
+        """
+        self.logger.info('Starting job: Train Surrogate')
+        surrogate_config = self.config['surrogate']
+        path = os.path.join(self.config['app']['DATA_DIR'],
+                            surrogate_config['dirname'])
+
+        start = time.perf_counter()
+        X, Y = sample_designs(
+            self.config['lsm_tree_config'], surrogate_config['num_samples'],
+            surrogate_config['rho'], surrogate_config['N'],
+            surrogate_config['bits'], self.config.get('solver', 'slsqp'))
+        self.logger.info(f'Solved {len(X)} problems in '
+                         f'{time.perf_counter() - start:.2f}s')
+
+        start = time.perf_counter()
+        surrogate = SurrogateTuning.build(
+            path, X, Y, hidden=surrogate_config['hidden'],
+            epochs=surrogate_config['epochs'],
+            threshold=surrogate_config['threshold'],
+            solver=self.config.get('solver', 'slsqp'))
+        self.logger.info(f'Trained in {time.perf_counter() - start:.2f}s '
+                         f'to {path}')
+
+        self.logger.info('Finished job: Train Surrogate\n')
+        return surrogate
@@ -0,0 +1,102 @@
+"""
+Compiles the cost model kernels ahead of the jobs so the compile cost is paid
+once and reported instead of being hidden in the first optimizer call
+"""
+
+import logging
+import time
+import numpy as np
+from lsm_tree.cost_function import (CostFunction, cost_components,
+                                    cost_components_jacobian)
+from lsm_tree.cost_func import (EndureTierLevelCost, EndureQFixedCost,
+                                EndureKHybridCost, EndureYZHybridCost, Policy)
+
+
+class WarmUpCostModels(object):
+    """
+    Calls every cost model kernel once and logs the time it took
+    """
+
+    def __init__(self, config):
+        """Constructor
+
+        :param config:
+        """
+        self.config = config
+        self.logger = logging.getLogger('rlt_logger')
+
+    def timed(self, name, func, *args):
+        """Calls func once and returns (name, seconds)
+
+        :param name:
+        :param func:
+        :param args:
+        """
+        start = time.perf_counter()
+        func(*args)
+        return name, time.perf_counter() - start
+
+    def warm_up_cost_function(self):
+        """Compiles CostFunction and its kernels"""
+        lsm = self.config['lsm_tree_config']
+        N, M = float(lsm['N']), float(lsm['M'])
+        h = (M / N) / 2
+        args = (N, float(lsm['phi']), float(lsm['s']), int(lsm['B']),
+                int(lsm['E']), M)
+
+        yield self.timed('cost_components', cost_components,
+                         h, 10., *args, True)
+        yield self.timed('cost_components_jacobian', cost_components_jacobian,
+                         h, 10., *args, True)
+        start = time.perf_counter()
+        cf = CostFunction(*args, True, 0.25, 0.25, 0.25, 0.25)
+        yield 'CostFunction', time.perf_counter() - start
+        yield self.timed('CostFunction.calculate_cost', cf.calculate_cost,
+                         h, 10.)
+        yield self.timed('CostFunction.calculate_cost_gradient',
+                         cf.calculate_cost_gradient, h, 10.)
+
+    def warm_up_cost_func(self):
+        """Compiles the cost_func.py models and their kernels"""
+        lsm = self.config['lsm_tree_config']
+        H = self.config['expected_memory_bits_per_element'][0]
+        args = (float(lsm['B']), float(lsm['E']), float(H), float(lsm['N']),
+                float(lsm['phi']), float(lsm['s']))
+        h, T = H / 2, 10.
+        workloads = np.full((1, 4), 0.25)
+        hs, Ts = np.array([h]), np.array([T])
+        K = np.full((1, 64), 2.)
+
+        cf = EndureTierLevelCost(*args)
+        for name, func, params, batch_params in (
+                ('EndureTierLevelCost', cf, (Policy.Leveling,),
+                 (Policy.Leveling,)),
+                ('EndureQFixedCost', EndureQFixedCost(*args), (2.,),
+                 (np.array([2.]),)),
+                ('EndureKHybridCost', EndureKHybridCost(*args), (K[0],),
+                 (K,)),
+                ('EndureYZHybridCost', EndureYZHybridCost(*args), (2., 2.),
+                 (np.array([2.]), np.array([2.])))):
+            yield self.timed(f'{name}.calc_cost', func.calc_cost,
+                             h, T, *params, 0.25, 0.25, 0.25, 0.25)
+            yield self.timed(f'{name}.calc_cost_grad', func.calc_cost_grad,
+                             h, T, *params, 0.25, 0.25, 0.25, 0.25)
+            yield self.timed(f'{name}.calc_cost_batch', func.calc_cost_batch,
+                             hs, Ts, *batch_params, workloads)
+
+    def run(self):
+        """
+        Runs the job
+        """
+        self.logger.info('Starting job: Warm Up Cost Models')
+        start = time.perf_counter()
+        timings = {}
+        for warm_up in (self.warm_up_cost_function, self.warm_up_cost_func):
+            for name, seconds in warm_up():
+                self.logger.debug(f'{name}: {seconds:.3f}s')
+                timings[name] = seconds
+        total = time.perf_counter() - start
+        self.logger.info(f'Cost models ready in {total:.2f}s')
+
+        self.logger.info('Finished job: Warm Up Cost Models\n')
+        return timings
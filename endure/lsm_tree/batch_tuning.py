@@ -0,0 +1,232 @@
+"""
+Batch tuning of many (workload, rho, N, M) rows, such as every instance of
+a fleet
+
+Rows are quantized, the workload shares, N and M to relative steps of
+workload_step and size_step, in log space so small shares keep their
+precision, and rho to multiples of rho_step. Rows sharing a quantized key
+are solved once, at the key's center. The unique keys are sorted by (N, M,
+rho, workload) and cut into contiguous chunks; within a chunk every solve
+starts from the previous design of the same policy, which neighbouring keys
+mostly share. Chunks are solved on a process pool, and the designs are
+broadcast back to the rows they stand for as a table with one typed column
+per field, their cost and objective evaluated at each row's own workload,
+rho, N and M.
+"""
+
+import logging
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from numba import njit
+from lsm_tree.cost_function import CostFunction, cost_components
+from lsm_tree.nominal import NominalWorkloadTuning
+from robust.workload_uncertainty import WorkloadUncertainty, kl_worst_case
+
+INPUT_COLUMNS = ('z0', 'z1', 'q', 'w', 'rho', 'N', 'M')
+RESULT_DTYPES = {
+    'group': np.int64,
+    'M_h': np.float64,
+    'T': np.float64,
+    'M_filt': np.float64,
+    'M_buff': np.float64,
+    'is_leveling_policy': np.bool_,
+    'cost': np.float64,
+    'obj': np.float64,
+    'exit_mode': np.int64,
+}
+# Key of a zero share, which must not merge with small ones: the KL ball
+# only reweights operations the expected workload runs
+ZERO_SHARE_KEY = np.iinfo(np.int64).min
+
+# Fields solve_chunk returns per key, in order
+DESIGN_FIELDS = ('M_h', 'T', 'is_leveling_policy', 'cost', 'obj',
+                 'exit_mode')
+
+
+def as_rows(rows):
+    """(n, 7) array of INPUT_COLUMNS from a DataFrame, whose rho defaults to
+    0 (nominal), or from an array of that layout"""
+    if isinstance(rows, pd.DataFrame):
+        if 'rho' not in rows:
+            rows = rows.assign(rho=0.)
+        return rows[list(INPUT_COLUMNS)].to_numpy(dtype=np.float64)
+    return np.asarray(rows, dtype=np.float64).reshape(-1, len(INPUT_COLUMNS))
+
+
+@njit(cache=True, nogil=True)
+def row_objectives(hs, Ts, policies, rows, phi, s, B, E):
+    """Nominal cost and objective, the KL worst case cost where rho > 0, of
+    each row's design
+
+    :param hs: (n,) bits per element
+    :param Ts: (n,) size ratios
+    :param policies: (n,) is_leveling_policy
+    :param rows: (n, 7) array of INPUT_COLUMNS
+    :param phi:
+    :param s:
+    :param B:
+    :param E:
+    :return costs, objs:
+    """
+    costs = np.empty(rows.shape[0])
+    objs = np.empty(rows.shape[0])
+    for i in range(rows.shape[0]):
+        workload = rows[i, :4].copy()
+        rho, N, M = rows[i, 4], rows[i, 5], rows[i, 6]
+        components = cost_components(hs[i], Ts[i], N, phi, s, B, E, M,
+                                     policies[i])
+        costs[i] = workload @ components
+        objs[i] = costs[i]
+        if rho > 0:
+            objs[i] = kl_worst_case(components, workload, rho)[0]
+
+    return costs, objs
+
+
+def solve_chunk(lsm, rows, solver='slsqp'):
+    """Solves rows in order, each from the previous design of each policy
+
+    :param lsm: lsm_tree_config giving phi, s, B and E
+    :param rows: (m, 7) array of INPUT_COLUMNS
+    :param solver:
+    :return designs: (m, len(DESIGN_FIELDS)) of the best policy of each row
+    """
+    designs = np.empty((len(rows), len(DESIGN_FIELDS)))
+    seeds = {}
+    for idx, (z0, z1, q, w, rho, N, M) in enumerate(rows):
+        cf = CostFunction(N, lsm['phi'], lsm['s'], lsm['B'], lsm['E'], M,
+                          True, z0, z1, q, w)
+        if rho == 0:
+            tuner = NominalWorkloadTuning(cf, solver=solver)
+        else:
+            tuner = WorkloadUncertainty(cf, solver=solver)
+        best = None
+        for policy in (True, False):
+            seed = None
+            if policy in seeds:
+                h, T = seeds[policy]
+                seed = {'M_filt': h * N, 'T': T}
+            if rho == 0:
+                design = tuner.get_nominal_design(policy, None, seed)
+                design['obj'] = design['cost']
+            else:
+                design = tuner.get_robust_design(rho, policy, None, seed)
+            seeds[policy] = (design['M_h'], design['T'])
+            if best is None or design['obj'] < best['obj']:
+                best = design
+        designs[idx] = [best[field] for field in DESIGN_FIELDS]
+
+    return designs
+
+
+class BatchTuning(object):
+    """
+    Tunes a batch of rows, solving each quantized key once
+    """
+
+    def __init__(self, lsm, workload_step=0.02, rho_step=0.01,
+                 size_step=0.01, solver='slsqp', max_workers=1,
+                 chunk_size=256) -> None:
+        """Constructor
+
+        :param lsm: lsm_tree_config giving phi, s, B and E
+        :param workload_step: relative quantum of the workload shares
+        :param rho_step: quantum of rho
+        :param size_step: relative quantum of N and M
+        :param solver: backend of the tuners
+        :param max_workers: processes solving chunks, inline if 1
+        :param chunk_size: keys solved in order, warm starting each other
+        """
+        self.lsm = lsm
+        self.workload_step = workload_step
+        self.rho_step = rho_step
+        self.size_step = size_step
+        self.solver = solver
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.logger = logging.getLogger("rlt_logger")
+
+    @classmethod
+    def from_config(cls, config):
+        """BatchTuning of the batch_tuning section of config
+
+        :param config:
+        """
+        settings = dict(config['batch_tuning'])
+        settings.pop('input', None)
+        settings.pop('filename', None)
+        return cls(config['lsm_tree_config'],
+                   solver=config.get('solver', 'slsqp'), **settings)
+
+    def quantize(self, rows):
+        """Integer keys of rows, (n, 7)"""
+        with np.errstate(divide='ignore'):
+            log_shares = np.log(rows[:, :4]) / np.log1p(self.workload_step)
+        return np.column_stack([
+            np.where(rows[:, :4] > 0, np.rint(log_shares), ZERO_SHARE_KEY),
+            np.rint(rows[:, 4] / self.rho_step),
+            np.rint(np.log(rows[:, 5:]) / np.log1p(self.size_step)),
+        ]).astype(np.int64)
+
+    def centers(self, keys):
+        """Rows at the center of keys, the workload shares normalized"""
+        workloads = np.where(
+            keys[:, :4] == ZERO_SHARE_KEY, 0,
+            np.exp(keys[:, :4] * np.log1p(self.workload_step)))
+        workloads /= workloads.sum(axis=1, keepdims=True)
+        return np.column_stack([
+            workloads, keys[:, 4] * self.rho_step,
+            np.exp(keys[:, 5:] * np.log1p(self.size_step))])
+
+    def tune(self, rows):
+        """Designs of every row
+
+        :param rows: DataFrame with columns z0, z1, q, w, N, M and optionally
+            rho, or an (n, 7) array in that order with rho before N
+        :return designs: DataFrame with the input columns and, typed as in
+            RESULT_DTYPES, the group of rows solved together and the design
+            of the best policy at its key, with the row's own cost and obj
+        """
+        rows = as_rows(rows)
+        keys, group = np.unique(self.quantize(rows), axis=0,
+                                return_inverse=True)
+        group = group.reshape(-1)
+        centers = self.centers(keys)
+        # N, M and rho vary slowest so chunks stay on one tree
+        order = np.lexsort(keys[:, [3, 2, 1, 0, 4, 6, 5]].T)
+        self.logger.info(f'Tuning {len(rows)} rows as {len(keys)} keys')
+
+        chunks = [order[start:start + self.chunk_size]
+                  for start in range(0, len(order), self.chunk_size)]
+        if self.max_workers == 1:
+            results = [solve_chunk(self.lsm, centers[chunk], self.solver)
+                       for chunk in chunks]
+        else:
+            with ProcessPoolExecutor(self.max_workers) as pool:
+                results = list(pool.map(
+                    solve_chunk, [self.lsm] * len(chunks),
+                    [centers[chunk] for chunk in chunks],
+                    [self.solver] * len(chunks)))
+
+        designs = np.empty((len(keys), len(DESIGN_FIELDS)))
+        for chunk, result in zip(chunks, results):
+            designs[chunk] = result
+
+        table = {column: rows[:, idx]
+                 for idx, column in enumerate(INPUT_COLUMNS)}
+        table['group'] = group
+        for idx, field in enumerate(DESIGN_FIELDS):
+            table[field] = designs[group, idx]
+        # Each row keeps its key's split of memory between filters and
+        # buffer, so the buffer stays positive whatever the row's own M
+        filter_share = designs[:, 0] * centers[:, 5] / centers[:, 6]
+        table['M_filt'] = filter_share[group] * rows[:, 6]
+        table['M_buff'] = rows[:, 6] - table['M_filt']
+        table['M_h'] = table['M_filt'] / rows[:, 5]
+        table['cost'], table['obj'] = row_objectives(
+            table['M_h'], table['T'], table['is_leveling_policy'] > 0, rows,
+            float(self.lsm['phi']), float(self.lsm['s']),
+            int(self.lsm['B']), int(self.lsm['E']))
+        df = pd.DataFrame(table)
+        return df.astype(RESULT_DTYPES)[list(table)]
@@ -1,7 +1,7 @@
 import numpy as np
 import enum
 from numba.experimental import jitclass
-from numba import types
+from numba import njit, types
 
 spec = [
     ('B', types.float64),
@@ -23,6 +23,466 @@ class Policy(enum.Enum):
     YZHybrid = 4
 
 
+# The cost models are evaluated by module level kernels compiled with
+# cache=True, so numba persists their machine code in __pycache__ (indexed by
+# source file and CPU) and later processes load it instead of re-compiling.
+# The jitclasses keep the per-model API and delegate to the kernels, passing
+# their parameters as params = (B, E, H, N, phi, s). Kernels are nogil so
+# threads calling them directly evaluate tunings in parallel.
+
+
+@njit(cache=True, nogil=True)
+def level_count(h: float, T: float, E: float, H: float, N: float,
+                ceil: bool = False) -> float:
+    mbuff = ((H - h) * N) / BITS_IN_BYTES
+    level = np.log(((N * E) / mbuff) + 1) / np.log(T)
+    return np.ceil(level) if ceil else level
+
+
+@njit(cache=True, nogil=True)
+def level_false_positives(h: float, T: float, levels: float) -> np.ndarray:
+    alpha = np.exp(-h * (np.log(2)**2))
+    top = (T ** (T / (T - 1)))
+    fp = np.empty(int(levels))
+    for i in range(1, int(levels) + 1):
+        fp[i - 1] = alpha * (top / (T**(levels + 1 - i)))
+    return fp
+
+
+@njit(cache=True, nogil=True)
+def level_gradient(N: float, E: float, mbuff: float, dmbuff_dh: float,
+                   T: float) -> tuple:
+    """Derivatives of the fractional level count log(NE / mbuff + 1) / log(T)
+    with respect to (h, T)"""
+    ratio = (N * E) / mbuff
+    level = np.log(ratio + 1) / np.log(T)
+    dlevel_dh = -(ratio / mbuff) * dmbuff_dh / ((ratio + 1) * np.log(T))
+    dlevel_dT = -level / (T * np.log(T))
+    return dlevel_dh, dlevel_dT
+
+
+@njit(cache=True, nogil=True)
+def runs_jacobian(
+    h: float,
+    T: float,
+    levels: float,
+    runs: np.ndarray,
+    druns_dT: np.ndarray
+) -> tuple:
+    """Derivatives of Z0 and Z1 for a tree whose i-th level holds runs[i] runs
+
+    Z0 = sum(runs[i] * fp[i]) and
+    Z1 = sum(run_prob[i] * (1 + sum(runs[j] * fp[j], j < i)
+                            + ((runs[i] - 1) / 2) * fp[i])).
+    Returns the (2, 2) Jacobian of [Z0, Z1] with respect to (h, T), where
+    druns_dT holds the derivative of each run count with respect to T, and the
+    (2, L) derivatives of [Z0, Z1] with respect to each level's run count.
+    The level count ceil(L) is piecewise constant and held fixed.
+    """
+    L = int(levels)
+    dfp_dh = -(np.log(2)**2)
+    dlog_top = (T - 1 - np.log(T)) / ((T - 1) ** 2)
+    growth = levels * (T ** (levels - 1)) / ((T ** levels) - 1)
+
+    fp = level_false_positives(h, T, levels)
+    dfp_dT = np.empty(L)
+    run_prob = np.empty(L)
+    for i in range(1, L + 1):
+        dfp_dT[i - 1] = fp[i - 1] * (dlog_top - (levels + 1 - i) / T)
+        run_prob[i - 1] = (T - 1) * (T ** (i - 1)) / ((T ** levels) - 1)
+
+    jac = np.zeros((2, 2))
+    druns = np.zeros((2, L))
+    upper_fp = 0
+    dupper_fp_dT = 0
+    for i in range(L):
+        jac[0, 0] += dfp_dh * runs[i] * fp[i]
+        jac[0, 1] += (runs[i] * dfp_dT[i]) + (druns_dT[i] * fp[i])
+        druns[0, i] = fp[i]
+
+        current_fp = ((runs[i] - 1) / 2) * fp[i]
+        inner = 1 + upper_fp + current_fp
+        dinner_dh = dfp_dh * (upper_fp + current_fp)
+        dinner_dT = (dupper_fp_dT + (druns_dT[i] / 2) * fp[i]
+                     + ((runs[i] - 1) / 2) * dfp_dT[i])
+        drun_prob_dT = run_prob[i] * ((1 / (T - 1)) + (i / T) - growth)
+        jac[1, 0] += run_prob[i] * dinner_dh
+        jac[1, 1] += (drun_prob_dT * inner) + (run_prob[i] * dinner_dT)
+
+        upper_fp += runs[i] * fp[i]
+        dupper_fp_dT += (runs[i] * dfp_dT[i]) + (druns_dT[i] * fp[i])
+
+    lower_run_prob = 0
+    for i in range(L - 1, -1, -1):
+        druns[1, i] = fp[i] * ((run_prob[i] / 2) + lower_run_prob)
+        lower_run_prob += run_prob[i]
+
+    return jac, druns
+
+
+@njit(cache=True, nogil=True)
+def tier_level_components(h: float, T: float, tiering: bool,
+                          params: tuple) -> np.ndarray:
+    B, E, H, N, phi, s = params
+    return tier_level_components_at_levels(
+        h, T, level_count(h, T, E, H, N, True), tiering, params)
+
+
+@njit(cache=True, nogil=True)
+def tier_level_components_at_levels(h: float, T: float, levels: float,
+                                    tiering: bool,
+                                    params: tuple) -> np.ndarray:
+    """[Z0, Z1, Q, W] with the level count ceil(L) held at levels"""
+    B, E, H, N, phi, s = params
+    fp = level_false_positives(h, T, levels)
+    L = fp.shape[0]
+    mbuff = ((H - h) * N) / BITS_IN_BYTES
+    Nf = mbuff * ((T ** L) - 1) / E
+
+    z0 = 0
+    z1 = 0
+    upper_fp = 0
+    for i in range(1, L + 1):
+        z0 += fp[i - 1]
+        run_prob = (T - 1) * mbuff * T**(i - 1) / (Nf * E)
+        if tiering:
+            curr_fp = ((T - 2) / 2) * fp[i - 1]
+            z1 += run_prob * (1 + (upper_fp * (T - 1)) + curr_fp)
+        else:  # Policy.Leveling
+            z1 += run_prob * (1 + upper_fp)
+        upper_fp += fp[i - 1]
+    if tiering:
+        z0 *= (T - 1)
+
+    level = level_count(h, T, E, H, N)
+    q = s * N / B
+    w = (1 + phi) * level / B
+    if tiering:
+        q += (T - 1) * level
+    else:  # Policy.Leveling
+        q += level
+        w *= (T / 2)
+
+    return np.array([z0, z1, q, w])
+
+
+@njit(cache=True, nogil=True)
+def tier_level_components_jac(h: float, T: float, tiering: bool,
+                              params: tuple) -> np.ndarray:
+    """Jacobian of [Z0, Z1, Q, W] with respect to (h, T)"""
+    B, E, H, N, phi, s = params
+    return tier_level_components_jac_at_levels(
+        h, T, level_count(h, T, E, H, N, True), tiering, params)
+
+
+@njit(cache=True, nogil=True)
+def tier_level_components_jac_at_levels(h: float, T: float, levels: float,
+                                        tiering: bool,
+                                        params: tuple) -> np.ndarray:
+    """Jacobian of tier_level_components_at_levels with respect to (h, T)"""
+    B, E, H, N, phi, s = params
+    L = int(levels)
+    level = level_count(h, T, E, H, N)
+    dlevel_dh, dlevel_dT = level_gradient(
+        N, E, ((H - h) * N) / BITS_IN_BYTES, -N / BITS_IN_BYTES, T)
+    if tiering:
+        runs, druns_dT = np.full(L, T - 1), np.ones(L)
+    else:  # Policy.Leveling
+        runs, druns_dT = np.ones(L), np.zeros(L)
+    z_jac, _ = runs_jacobian(h, T, levels, runs, druns_dT)
+
+    jac = np.zeros((4, 2))
+    jac[:2] = z_jac
+    w_scale = (1 + phi) / B
+    if tiering:
+        jac[2, 0] = (T - 1) * dlevel_dh
+        jac[2, 1] = level + (T - 1) * dlevel_dT
+        jac[3, 0] = w_scale * dlevel_dh
+        jac[3, 1] = w_scale * dlevel_dT
+    else:  # Policy.Leveling
+        jac[2, 0] = dlevel_dh
+        jac[2, 1] = dlevel_dT
+        jac[3, 0] = w_scale * (T / 2) * dlevel_dh
+        jac[3, 1] = w_scale * ((level / 2) + (T / 2) * dlevel_dT)
+
+    return jac
+
+
+@njit(cache=True, nogil=True)
+def tier_level_cost_batch(h: np.ndarray, T: np.ndarray, tiering: bool,
+                          workloads: np.ndarray, params: tuple) -> np.ndarray:
+    costs = np.empty((h.shape[0], workloads.shape[0]))
+    for i in range(h.shape[0]):
+        if np.isnan(h[i]) or np.isnan(T[i]):
+            costs[i, :] = np.finfo(np.float64).max
+            continue
+        components = tier_level_components(h[i], T[i], tiering, params)
+        for j in range(workloads.shape[0]):
+            costs[i, j] = ((workloads[j, 0] * components[0])
+                           + (workloads[j, 1] * components[1])
+                           + (workloads[j, 2] * components[2])
+                           + (workloads[j, 3] * components[3]))
+
+    return costs
+
+
+@njit(cache=True, nogil=True)
+def qfixed_components(h: float, T: float, Q: float,
+                      params: tuple) -> np.ndarray:
+    B, E, H, N, phi, s = params
+    return qfixed_components_at_levels(
+        h, T, level_count(h, T, E, H, N, True), Q, params)
+
+
+@njit(cache=True, nogil=True)
+def qfixed_components_at_levels(h: float, T: float, levels: float, Q: float,
+                                params: tuple) -> np.ndarray:
+    """[Z0, Z1, Q, W] with the level count ceil(L) held at levels"""
+    B, E, H, N, phi, s = params
+    fp = level_false_positives(h, T, levels)
+    L = fp.shape[0]
+    mbuff = ((H - h) * N) / BITS_IN_BYTES
+    Nf = mbuff * ((T ** L) - 1) / E
+
+    z0 = 0
+    z1 = 0
+    upper_fp = 0
+    for level in range(1, L + 1):
+        z0 += Q * fp[level - 1]
+        current_fp = ((Q - 1) / 2) * fp[level - 1]
+        z1 += ((T - 1) * mbuff * T**(level - 1) / (Nf * E)
+               * (1 + upper_fp + current_fp))
+        upper_fp += Q * fp[level - 1]
+
+    level = level_count(h, T, E, H, N)
+    q = (Q * level) + (s * N / B)
+    w = level * (T - 1 + Q) * (1 + phi) / (2 * Q * B)
+
+    return np.array([z0, z1, q, w])
+
+
+@njit(cache=True, nogil=True)
+def qfixed_components_jac(h: float, T: float, Q: float,
+                          params: tuple) -> np.ndarray:
+    """Jacobian of [Z0, Z1, Q, W] with respect to (h, T, Q)"""
+    B, E, H, N, phi, s = params
+    return qfixed_components_jac_at_levels(
+        h, T, level_count(h, T, E, H, N, True), Q, params)
+
+
+@njit(cache=True, nogil=True)
+def qfixed_components_jac_at_levels(h: float, T: float, levels: float,
+                                    Q: float, params: tuple) -> np.ndarray:
+    """Jacobian of qfixed_components_at_levels with respect to (h, T, Q)"""
+    B, E, H, N, phi, s = params
+    L = int(levels)
+    level = level_count(h, T, E, H, N)
+    dlevel_dh, dlevel_dT = level_gradient(
+        N, E, ((H - h) * N) / BITS_IN_BYTES, -N / BITS_IN_BYTES, T)
+    z_jac, druns = runs_jacobian(h, T, levels, np.full(L, Q), np.zeros(L))
+
+    jac = np.zeros((4, 3))
+    jac[:2, :2] = z_jac
+    jac[0, 2] = np.sum(druns[0])
+    jac[1, 2] = np.sum(druns[1])
+    jac[2, 0] = Q * dlevel_dh
+    jac[2, 1] = Q * dlevel_dT
+    jac[2, 2] = level
+    w_scale = (1 + phi) / (2 * Q * B)
+    jac[3, 0] = w_scale * (T - 1 + Q) * dlevel_dh
+    jac[3, 1] = w_scale * (level + (T - 1 + Q) * dlevel_dT)
+    jac[3, 2] = -w_scale * level * (T - 1) / Q
+
+    return jac
+
+
+@njit(cache=True, nogil=True)
+def qfixed_cost_batch(h: np.ndarray, T: np.ndarray, Q: np.ndarray,
+                      workloads: np.ndarray, params: tuple) -> np.ndarray:
+    costs = np.empty((h.shape[0], workloads.shape[0]))
+    for i in range(h.shape[0]):
+        if np.isnan(h[i]) or np.isnan(T[i]) or np.isnan(Q[i]):
+            costs[i, :] = np.finfo(np.float64).max
+            continue
+        components = qfixed_components(h[i], T[i], Q[i], params)
+        for j in range(workloads.shape[0]):
+            costs[i, j] = ((workloads[j, 0] * components[0])
+                           + (workloads[j, 1] * components[1])
+                           + (workloads[j, 2] * components[2])
+                           + (workloads[j, 3] * components[3]))
+
+    return costs
+
+
+@njit(cache=True, nogil=True)
+def khybrid_components(h: float, T: float, K: np.ndarray,
+                       params: tuple) -> np.ndarray:
+    B, E, H, N, phi, s = params
+    fp = level_false_positives(h, T, level_count(h, T, E, H, N, True))
+    L = fp.shape[0]
+    mbuff = ((H - h) * N) / BITS_IN_BYTES
+    Nf = mbuff * ((T ** L) - 1) / E
+
+    z0 = 0
+    z1 = 0
+    upper_fp = 0
+    for level in range(1, L + 1):
+        z0 += K[level - 1] * fp[level - 1]
+        current_fp = ((K[level - 1] - 1) / 2) * fp[level - 1]
+        z1 += ((T - 1) * mbuff * T**(level - 1) / (Nf * E)
+               * (1 + upper_fp + current_fp))
+        upper_fp += K[level - 1] * fp[level - 1]
+
+    q = s * N / B
+    w = 0
+    for level in range(0, L):
+        q += K[level]
+        w += (T - 1 + K[level]) / (2 * K[level])
+    w *= (1 + phi) / B
+
+    return np.array([z0, z1, q, w])
+
+
+@njit(cache=True, nogil=True)
+def khybrid_components_jac(h: float, T: float, K: np.ndarray,
+                           params: tuple) -> np.ndarray:
+    """Jacobian of [Z0, Z1, Q, W] with respect to (h, T, K[0], ...)"""
+    B, E, H, N, phi, s = params
+    levels = level_count(h, T, E, H, N, True)
+    L = int(levels)
+    z_jac, druns = runs_jacobian(
+        h, T, levels, K[:L].astype(np.float64), np.zeros(L))
+
+    jac = np.zeros((4, 2 + len(K)))
+    jac[:2, :2] = z_jac
+    jac[:2, 2:2 + L] = druns
+    w_scale = (1 + phi) / B
+    for level in range(L):
+        jac[2, 2 + level] = 1
+        jac[3, 1] += w_scale / (2 * K[level])
+        jac[3, 2 + level] = -w_scale * (T - 1) / (2 * (K[level] ** 2))
+
+    return jac
+
+
+@njit(cache=True, nogil=True)
+def khybrid_cost_batch(h: np.ndarray, T: np.ndarray, K: np.ndarray,
+                       workloads: np.ndarray, params: tuple) -> np.ndarray:
+    costs = np.empty((h.shape[0], workloads.shape[0]))
+    for i in range(h.shape[0]):
+        if np.isnan(h[i]) or np.isnan(T[i]):
+            costs[i, :] = np.finfo(np.float64).max
+            continue
+        components = khybrid_components(h[i], T[i], K[i], params)
+        for j in range(workloads.shape[0]):
+            costs[i, j] = ((workloads[j, 0] * components[0])
+                           + (workloads[j, 1] * components[1])
+                           + (workloads[j, 2] * components[2])
+                           + (workloads[j, 3] * components[3]))
+
+    return costs
+
+
+@njit(cache=True, nogil=True)
+def yzhybrid_components(h: float, T: float, Y: float, Z: float,
+                        params: tuple) -> np.ndarray:
+    B, E, H, N, phi, s = params
+    return yzhybrid_components_at_levels(
+        h, T, level_count(h, T, E, H, N, True), Y, Z, params)
+
+
+@njit(cache=True, nogil=True)
+def yzhybrid_components_at_levels(h: float, T: float, levels: float,
+                                  Y: float, Z: float,
+                                  params: tuple) -> np.ndarray:
+    """[Z0, Z1, Q, W] with the level count ceil(L) held at levels"""
+    B, E, H, N, phi, s = params
+    fp = level_false_positives(h, T, levels)
+    L = fp.shape[0]
+    mbuff = ((H - h) * N) / BITS_IN_BYTES
+    Nf = mbuff * ((T ** L) - 1) / E
+
+    z0 = 0
+    z1 = 0
+    upper_fp = 0
+    for level in range(1, L):
+        z0 += Y * fp[level - 1]
+        current_fp = ((Y - 1) / 2) * fp[level - 1]
+        z1 += ((T - 1) * mbuff * T**(level - 1) / (Nf * E)
+               * (1 + upper_fp + current_fp))
+        upper_fp += Y * fp[level - 1]
+    z0 += Z * fp[L - 1]
+    current_fp = ((Z - 1) / 2) * fp[L - 1]
+    z1 += ((T - 1) * mbuff * T**(L - 1) / (Nf * E)
+           * (1 + upper_fp + current_fp))
+
+    q = s * N / B
+    q += Y * levels - 1
+    q += Z
+    w = (levels - 1) * (T - 1 + Y) / (2 * Y)  # middle levels
+    w += (T - 1 + Z) / (2 * Z)  # last level is different
+    w *= (1 + phi) / B
+
+    return np.array([z0, z1, q, w])
+
+
+@njit(cache=True, nogil=True)
+def yzhybrid_components_jac(h: float, T: float, Y: float, Z: float,
+                            params: tuple) -> np.ndarray:
+    """Jacobian of [Z0, Z1, Q, W] with respect to (h, T, Y, Z)"""
+    B, E, H, N, phi, s = params
+    return yzhybrid_components_jac_at_levels(
+        h, T, level_count(h, T, E, H, N, True), Y, Z, params)
+
+
+@njit(cache=True, nogil=True)
+def yzhybrid_components_jac_at_levels(h: float, T: float, levels: float,
+                                      Y: float, Z: float,
+                                      params: tuple) -> np.ndarray:
+    """Jacobian of yzhybrid_components_at_levels with respect to (h, T, Y,
+    Z)"""
+    B, E, H, N, phi, s = params
+    L = int(levels)
+    runs = np.full(L, Y)
+    runs[L - 1] = Z
+    z_jac, druns = runs_jacobian(h, T, levels, runs, np.zeros(L))
+
+    jac = np.zeros((4, 4))
+    jac[:2, :2] = z_jac
+    jac[0, 2] = np.sum(druns[0, :L - 1])
+    jac[1, 2] = np.sum(druns[1, :L - 1])
+    jac[0, 3] = druns[0, L - 1]
+    jac[1, 3] = druns[1, L - 1]
+    jac[2, 2] = levels
+    jac[2, 3] = 1
+    w_scale = (1 + phi) / B
+    jac[3, 1] = w_scale * (((levels - 1) / (2 * Y)) + (1 / (2 * Z)))
+    jac[3, 2] = -w_scale * (levels - 1) * (T - 1) / (2 * (Y ** 2))
+    jac[3, 3] = -w_scale * (T - 1) / (2 * (Z ** 2))
+
+    return jac
+
+
+@njit(cache=True, nogil=True)
+def yzhybrid_cost_batch(h: np.ndarray, T: np.ndarray, Y: np.ndarray,
+                        Z: np.ndarray, workloads: np.ndarray,
+                        params: tuple) -> np.ndarray:
+    costs = np.empty((h.shape[0], workloads.shape[0]))
+    for i in range(h.shape[0]):
+        if (np.isnan(h[i]) or np.isnan(T[i])
+                or np.isnan(Y[i]) or np.isnan(Z[i])):
+            costs[i, :] = np.finfo(np.float64).max
+            continue
+        components = yzhybrid_components(h[i], T[i], Y[i], Z[i], params)
+        for j in range(workloads.shape[0]):
+            costs[i, j] = ((workloads[j, 0] * components[0])
+                           + (workloads[j, 1] * components[1])
+                           + (workloads[j, 2] * components[2])
+                           + (workloads[j, 3] * components[3]))
+
+    return costs
+
+
 @jitclass(spec)
 class EndureTierLevelCost:
     def __init__(
@@ -37,12 +497,14 @@ class EndureTierLevelCost:
         self.B, self.E, self.H, self.N = B, E, H, N
         self.phi, self.s = phi, s
 
+    def params(self) -> tuple:
+        return (self.B, self.E, self.H, self.N, self.phi, self.s)
+
     def mbuff(self, h: float) -> float:
         return (((self.H - h) * self.N) / BITS_IN_BYTES)
 
     def L(self, h: float, T: float, ceil: bool = False) -> float:
-        level = np.log(((self.N * self.E) / self.mbuff(h)) + 1) / np.log(T)
-        return np.ceil(level) if ceil else level
+        return level_count(h, T, self.E, self.H, self.N, ceil)
 
     def fp(self, h: float, T: float, i: int) -> float:
         alpha = np.exp(-h * (np.log(2)**2))
@@ -50,48 +512,46 @@ class EndureTierLevelCost:
         bot = (T**(self.L(h, T, ceil=True) + 1 - i))
         return alpha * (top / bot)
 
+    def fp_levels(self, h: float, T: float) -> np.ndarray:
+        return level_false_positives(h, T, self.L(h, T, ceil=True))
+
     def Nfull(self, h: float, T: float, levels: int) -> float:
-        return sum([(T - 1) * (T ** (level - 1)) * self.mbuff(h) / self.E
-                   for level in range(1, levels + 1)])
+        # Closed form of sum((T - 1) * T**(l - 1) * mbuff / E, l=1..levels)
+        return self.mbuff(h) * ((T ** levels) - 1) / self.E
 
     def run_prob(self, level: int, T: float, mbuff: float, Nf: float) -> float:
         return (T - 1) * mbuff * T**(level - 1) / (Nf * self.E)
 
     def Z0(self, h: float, T: float, policy: Policy) -> float:
-        z0 = sum([self.fp(h, T, level)
-                 for level in range(1, int(self.L(h, T, ceil=True)) + 1)])
-        if policy == Policy.Tiering:
-            z0 *= (T - 1)
-        return z0
+        return self.calc_components(h, T, policy)[0]
 
     def Z1(self, h: float, T: float, policy: Policy) -> float:
-        L = int(self.L(h, T, ceil=True))
-        z1 = 0
-        for i in range(1, L + 1):
-            upper_fp = sum([self.fp(h, T, j) for j in range(1, i)])
-            run_prob = self.run_prob(i, T, self.mbuff(h), self.Nfull(h, T, L))
-            if policy == Policy.Tiering:
-                upper_fp *= (T - 1)
-                curr_fp = ((T - 2) / 2) * self.fp(h, T, i)
-                z1 += run_prob * (1 + upper_fp + curr_fp)
-            else:  # Policy.Leveling
-                z1 += run_prob * (1 + upper_fp)
-
-        return z1
+        return self.calc_components(h, T, policy)[1]
 
     def Q(self, h: float, T: float, policy: Policy) -> float:
-        q = self.s * self.N / self.B
-        if policy == Policy.Tiering:
-            q += (T - 1) * self.L(h, T, ceil=False)
-        else:  # Policy.Leveling
-            q += self.L(h, T, ceil=False)
-        return q
+        return self.calc_components(h, T, policy)[2]
 
     def W(self, h: float, T: float, policy: Policy) -> float:
-        w = (1 + self.phi) * self.L(h, T, ceil=False) / self.B
-        if policy == Policy.Leveling:
-            w *= (T / 2)
-        return w
+        return self.calc_components(h, T, policy)[3]
+
+    def calc_components(
+        self,
+        h: float,
+        T: float,
+        policy: Policy
+    ) -> np.ndarray:
+        return tier_level_components(
+            h, T, policy == Policy.Tiering, self.params())
+
+    def calc_components_jac(
+        self,
+        h: float,
+        T: float,
+        policy: Policy
+    ) -> np.ndarray:
+        """Jacobian of [Z0, Z1, Q, W] with respect to (h, T)"""
+        return tier_level_components_jac(
+            h, T, policy == Policy.Tiering, self.params())
 
     def calc_cost(
         self,
@@ -106,10 +566,40 @@ class EndureTierLevelCost:
         if np.isnan(h) or np.isnan(T):
             return np.finfo(np.float64).max
 
-        return ((z0 * self.Z0(h, T, policy))
-                + (z1 * self.Z1(h, T, policy))
-                + (q * self.Q(h, T, policy))
-                + (w * self.W(h, T, policy)))
+        components = self.calc_components(h, T, policy)
+        return ((z0 * components[0])
+                + (z1 * components[1])
+                + (q * components[2])
+                + (w * components[3]))
+
+    def calc_cost_grad(
+        self,
+        h: float,
+        T: float,
+        policy: Policy,
+        z0: float,
+        z1: float,
+        q: float,
+        w: float
+    ) -> np.ndarray:
+        if np.isnan(h) or np.isnan(T):
+            return np.zeros(2)
+
+        jac = self.calc_components_jac(h, T, policy)
+        return ((z0 * jac[0])
+                + (z1 * jac[1])
+                + (q * jac[2])
+                + (w * jac[3]))
+
+    def calc_cost_batch(
+        self,
+        h: np.ndarray,
+        T: np.ndarray,
+        policy: Policy,
+        workloads: np.ndarray
+    ) -> np.ndarray:
+        return tier_level_cost_batch(
+            h, T, policy == Policy.Tiering, workloads, self.params())
 
 
 @jitclass(spec)
@@ -126,12 +616,14 @@ class EndureQFixedCost():
         self.B, self.E, self.H, self.N = B, E, H, N
         self.phi, self.s = phi, s
 
+    def params(self) -> tuple:
+        return (self.B, self.E, self.H, self.N, self.phi, self.s)
+
     def mbuff(self, h: float) -> float:
         return (((self.H - h) * self.N) / BITS_IN_BYTES)
 
     def L(self, h: float, T: float, ceil: bool = False) -> float:
-        level = np.log(((self.N * self.E) / self.mbuff(h)) + 1) / np.log(T)
-        return np.ceil(level) if ceil else level
+        return level_count(h, T, self.E, self.H, self.N, ceil)
 
     def fp(self, h: float, T: float, i: int) -> float:
         alpha = np.exp(-h * (np.log(2)**2))
@@ -139,41 +631,34 @@ class EndureQFixedCost():
         bot = (T**(self.L(h, T, ceil=True) + 1 - i))
         return alpha * (top / bot)
 
+    def fp_levels(self, h: float, T: float) -> np.ndarray:
+        return level_false_positives(h, T, self.L(h, T, ceil=True))
+
     def Nfull(self, h: float, T: float, levels: int) -> float:
-        return sum([(T - 1) * (T ** (level - 1)) * self.mbuff(h) / self.E
-                   for level in range(1, levels + 1)])
+        # Closed form of sum((T - 1) * T**(l - 1) * mbuff / E, l=1..levels)
+        return self.mbuff(h) * ((T ** levels) - 1) / self.E
 
     def run_prob(self, level: int, T: float, mbuff: float, Nf: float) -> float:
         return (T - 1) * mbuff * T**(level - 1) / (Nf * self.E)
 
     def Z0(self, h: float, T: float, Q: float) -> float:
-        z0 = 0
-        for level in range(1, int(self.L(h, T, ceil=True)) + 1):
-            z0 += Q * self.fp(h, T, level)
-
-        return z0
+        return self.calc_components(h, T, Q)[0]
 
     def Z1(self, h: float, T: float, Q: float) -> float:
-        L = int(self.L(h, T, ceil=True))
-        mbuff = self.mbuff(h)
-        Nf = self.Nfull(h, T, L)
-
-        z1 = 0
-        for level in range(1, L + 1):
-            upper_fp = 0
-            for j in range(1, level):
-                upper_fp += Q * self.fp(h, T, j)
-            current_fp = ((Q - 1) / 2) * self.fp(h, T, level)
-            z1 += (self.run_prob(level, T, mbuff, Nf)
-                   * (1 + upper_fp + current_fp))
-
-        return z1
+        return self.calc_components(h, T, Q)[1]
 
     def Q(self, h: float, T: float, Q: float) -> float:
-        return (Q * self.L(h, T)) + (self.s * self.N / self.B)
+        return self.calc_components(h, T, Q)[2]
 
     def W(self, h: float, T: float, Q: float) -> float:
-        return self.L(h, T) * (T - 1 + Q) * (1 + self.phi) / (2 * Q * self.B)
+        return self.calc_components(h, T, Q)[3]
+
+    def calc_components(self, h: float, T: float, Q: float) -> np.ndarray:
+        return qfixed_components(h, T, Q, self.params())
+
+    def calc_components_jac(self, h: float, T: float, Q: float) -> np.ndarray:
+        """Jacobian of [Z0, Z1, Q, W] with respect to (h, T, Q)"""
+        return qfixed_components_jac(h, T, Q, self.params())
 
     def calc_cost(
         self,
@@ -188,13 +673,42 @@ class EndureQFixedCost():
         if np.isnan(h) or np.isnan(T) or np.isnan(Q):
             return np.finfo(np.float64).max
 
-        cost = ((z0 * self.Z0(h, T, Q))
-                + (z1 * self.Z1(h, T, Q))
-                + (q * self.Q(h, T, Q))
-                + (w * self.W(h, T, Q)))
+        components = self.calc_components(h, T, Q)
+        cost = ((z0 * components[0])
+                + (z1 * components[1])
+                + (q * components[2])
+                + (w * components[3]))
 
         return cost
 
+    def calc_cost_grad(
+        self,
+        h: float,
+        T: float,
+        Q: float,
+        z0: float,
+        z1: float,
+        q: float,
+        w: float
+    ) -> np.ndarray:
+        if np.isnan(h) or np.isnan(T) or np.isnan(Q):
+            return np.zeros(3)
+
+        jac = self.calc_components_jac(h, T, Q)
+        return ((z0 * jac[0])
+                + (z1 * jac[1])
+                + (q * jac[2])
+                + (w * jac[3]))
+
+    def calc_cost_batch(
+        self,
+        h: np.ndarray,
+        T: np.ndarray,
+        Q: np.ndarray,
+        workloads: np.ndarray
+    ) -> np.ndarray:
+        return qfixed_cost_batch(h, T, Q, workloads, self.params())
+
 
 @jitclass(spec)
 class EndureKHybridCost():
@@ -210,12 +724,14 @@ class EndureKHybridCost():
         self.B, self.E, self.H, self.N = B, E, H, N
         self.phi, self.s = phi, s
 
+    def params(self) -> tuple:
+        return (self.B, self.E, self.H, self.N, self.phi, self.s)
+
     def mbuff(self, h: float) -> float:
         return (((self.H - h) * self.N) / BITS_IN_BYTES)
 
     def L(self, h: float, T: float, ceil: bool = False) -> float:
-        level = np.log(((self.N * self.E) / self.mbuff(h)) + 1) / np.log(T)
-        return np.ceil(level) if ceil else level
+        return level_count(h, T, self.E, self.H, self.N, ceil)
 
     def fp(self, h: float, T: float, i: int) -> float:
         alpha = np.exp(-h * (np.log(2)**2))
@@ -223,48 +739,34 @@ class EndureKHybridCost():
         bot = (T**(self.L(h, T, ceil=True) + 1 - i))
         return alpha * (top / bot)
 
+    def fp_levels(self, h: float, T: float) -> np.ndarray:
+        return level_false_positives(h, T, self.L(h, T, ceil=True))
+
     def Nfull(self, h: float, T: float, levels: int) -> float:
-        return sum([(T - 1) * (T ** (level - 1)) * self.mbuff(h) / self.E
-                   for level in range(1, levels + 1)])
+        # Closed form of sum((T - 1) * T**(l - 1) * mbuff / E, l=1..levels)
+        return self.mbuff(h) * ((T ** levels) - 1) / self.E
 
     def run_prob(self, level: int, T: float, mbuff: float, Nf: float) -> float:
         return (T - 1) * mbuff * T**(level - 1) / (Nf * self.E)
 
     def Z0(self, h: float, T: float, K: list[float]) -> float:
-        z0 = 0
-        for i in range(1, int(self.L(h, T, ceil=True)) + 1):
-            z0 += K[i - 1] * self.fp(h, T, i)
-
-        return z0
+        return self.calc_components(h, T, K)[0]
 
     def Z1(self, h: float, T: float, K: list[float]) -> float:
-        L = int(self.L(h, T, ceil=True))
-        mbuff = self.mbuff(h)
-        nfull = self.Nfull(h, T, L)
-
-        z1 = 0
-        for level in range(1, L + 1):
-            upper_fp = 0
-            run_prob = self.run_prob(level, T, mbuff, nfull)
-            level_fp = self.fp(h, T, level)
-            for j in range(1, level):
-                upper_fp += K[j - 1] * self.fp(h, T, j)
-            current_fp = ((K[level - 1] - 1) / 2) * level_fp
-            z1 += run_prob * (1 + upper_fp + current_fp)
-
-        return z1
+        return self.calc_components(h, T, K)[1]
 
     def Q(self, h: float, T: float, K: list[float]) -> float:
-        L = int(self.L(h, T, ceil=True))
-        return (self.s * self.N / self.B) + sum(K[:L])
+        return self.calc_components(h, T, K)[2]
 
     def W(self, h: float, T: float, K: list[float]) -> float:
-        L = int(self.L(h, T, ceil=True))
-        w = 0
-        for level in range(0, L):
-            w += (T - 1 + K[level]) / (2 * K[level])
-        w *= (1 + self.phi) / self.B
-        return w
+        return self.calc_components(h, T, K)[3]
+
+    def calc_components(self, h: float, T: float, K) -> np.ndarray:
+        return khybrid_components(h, T, K, self.params())
+
+    def calc_components_jac(self, h: float, T: float, K) -> np.ndarray:
+        """Jacobian of [Z0, Z1, Q, W] with respect to (h, T, K[0], ...)"""
+        return khybrid_components_jac(h, T, K, self.params())
 
     def calc_cost(
         self,
@@ -279,13 +781,42 @@ class EndureKHybridCost():
         if np.isnan(h) or np.isnan(T):
             return np.finfo(np.float64).max
 
-        cost = ((z0 * self.Z0(h, T, K))
-                + (z1 * self.Z1(h, T, K))
-                + (q * self.Q(h, T, K))
-                + (w * self.W(h, T, K)))
+        components = self.calc_components(h, T, K)
+        cost = ((z0 * components[0])
+                + (z1 * components[1])
+                + (q * components[2])
+                + (w * components[3]))
 
         return cost
 
+    def calc_cost_grad(
+        self,
+        h: float,
+        T: float,
+        K,
+        z0: float,
+        z1: float,
+        q: float,
+        w: float
+    ) -> np.ndarray:
+        if np.isnan(h) or np.isnan(T):
+            return np.zeros(2 + len(K))
+
+        jac = self.calc_components_jac(h, T, K)
+        return ((z0 * jac[0])
+                + (z1 * jac[1])
+                + (q * jac[2])
+                + (w * jac[3]))
+
+    def calc_cost_batch(
+        self,
+        h: np.ndarray,
+        T: np.ndarray,
+        K: np.ndarray,  # One row of files per level for each tuning
+        workloads: np.ndarray
+    ) -> np.ndarray:
+        return khybrid_cost_batch(h, T, K, workloads, self.params())
+
 
 @jitclass(spec)
 class EndureYZHybridCost():
@@ -301,12 +832,14 @@ class EndureYZHybridCost():
         self.B, self.E, self.H, self.N = B, E, H, N
         self.phi, self.s = phi, s
 
+    def params(self) -> tuple:
+        return (self.B, self.E, self.H, self.N, self.phi, self.s)
+
     def mbuff(self, h: float) -> float:
         return (((self.H - h) * self.N) / BITS_IN_BYTES)
 
     def L(self, h: float, T: float, ceil: bool = False) -> float:
-        level = np.log(((self.N * self.E) / self.mbuff(h)) + 1) / np.log(T)
-        return np.ceil(level) if ceil else level
+        return level_count(h, T, self.E, self.H, self.N, ceil)
 
     def fp(self, h: float, T: float, i: int) -> float:
         alpha = np.exp(-h * (np.log(2)**2))
@@ -314,58 +847,46 @@ class EndureYZHybridCost():
         bot = (T**(self.L(h, T, ceil=True) + 1 - i))
         return alpha * (top / bot)
 
+    def fp_levels(self, h: float, T: float) -> np.ndarray:
+        return level_false_positives(h, T, self.L(h, T, ceil=True))
+
     def Nfull(self, h: float, T: float, levels: int) -> float:
-        return sum([(T - 1) * (T ** (level - 1)) * self.mbuff(h) / self.E
-                   for level in range(1, levels + 1)])
+        # Closed form of sum((T - 1) * T**(l - 1) * mbuff / E, l=1..levels)
+        return self.mbuff(h) * ((T ** levels) - 1) / self.E
 
     def run_prob(self, level: int, T: float, mbuff: float, Nf: float) -> float:
         return (T - 1) * mbuff * T**(level - 1) / (Nf * self.E)
 
     def Z0(self, h: float, T: float, Y: float, Z: float) -> float:
-        z0 = 0
-        L = int(self.L(h, T, ceil=True))
-        for level in range(1, L):
-            z0 += Y * self.fp(h, T, level)
-        z0 += Z * self.fp(h, T, L)
-
-        return z0
+        return self.calc_components(h, T, Y, Z)[0]
 
     def Z1(self, h: float, T: float, Y: float, Z: float) -> float:
-        L = int(self.L(h, T, ceil=True))
-        mbuff = self.mbuff(h)
-        Nf = self.Nfull(h, T, L)
-
-        z1 = 0
-        for level in range(1, L):
-            upper_fp = 0
-            for j in range(1, level):
-                upper_fp += Y * self.fp(h, T, j)
-            current_fp = ((Y - 1) / 2) * self.fp(h, T, level)
-            z1 += self.run_prob(level, T, mbuff, Nf) * \
-                (1 + upper_fp + current_fp)
-
-        upper_fp = 0
-        for j in range(1, L):
-            upper_fp += Y * self.fp(h, T, j)
-        current_fp = ((Z - 1) / 2) * self.fp(h, T, L)
-        z1 += self.run_prob(L, T, mbuff, Nf) * (1 + upper_fp + current_fp)
-
-        return z1
+        return self.calc_components(h, T, Y, Z)[1]
 
     def Q(self, h: float, T: float, Y: float, Z: float) -> float:
-        q = self.s * self.N / self.B
-        q += Y * self.L(h, T, ceil=True) - 1
-        q += Z
-
-        return q
+        return self.calc_components(h, T, Y, Z)[2]
 
     def W(self, h: float, T: float, Y: float, Z: float) -> float:
-        levels = self.L(h, T, ceil=True)
-        w = (levels - 1) * (T - 1 + Y) / (2 * Y)  # middle levels
-        w += (T - 1 + Z) / (2 * Z)  # last level is different
-        w *= (1 + self.phi) / self.B
+        return self.calc_components(h, T, Y, Z)[3]
 
-        return w
+    def calc_components(
+        self,
+        h: float,
+        T: float,
+        Y: float,
+        Z: float
+    ) -> np.ndarray:
+        return yzhybrid_components(h, T, Y, Z, self.params())
+
+    def calc_components_jac(
+        self,
+        h: float,
+        T: float,
+        Y: float,
+        Z: float
+    ) -> np.ndarray:
+        """Jacobian of [Z0, Z1, Q, W] with respect to (h, T, Y, Z)"""
+        return yzhybrid_components_jac(h, T, Y, Z, self.params())
 
     def calc_cost(
         self,
@@ -381,9 +902,40 @@ class EndureYZHybridCost():
         if np.isnan(h) or np.isnan(T) or np.isnan(Y) or np.isnan(Z):
             return np.finfo(np.float64).max
 
-        cost = ((z0 * self.Z0(h, T, Y, Z))
-                + (z1 * self.Z1(h, T, Y, Z))
-                + (q * self.Q(h, T, Y, Z))
-                + (w * self.W(h, T, Y, Z)))
+        components = self.calc_components(h, T, Y, Z)
+        cost = ((z0 * components[0])
+                + (z1 * components[1])
+                + (q * components[2])
+                + (w * components[3]))
 
         return cost
+
+    def calc_cost_grad(
+        self,
+        h: float,
+        T: float,
+        Y: float,
+        Z: float,
+        z0: float,
+        z1: float,
+        q: float,
+        w: float
+    ) -> np.ndarray:
+        if np.isnan(h) or np.isnan(T) or np.isnan(Y) or np.isnan(Z):
+            return np.zeros(4)
+
+        jac = self.calc_components_jac(h, T, Y, Z)
+        return ((z0 * jac[0])
+                + (z1 * jac[1])
+                + (q * jac[2])
+                + (w * jac[3]))
+
+    def calc_cost_batch(
+        self,
+        h: np.ndarray,
+        T: np.ndarray,
+        Y: np.ndarray,
+        Z: np.ndarray,
+        workloads: np.ndarray
+    ) -> np.ndarray:
+        return yzhybrid_cost_batch(h, T, Y, Z, workloads, self.params())
@@ -3,7 +3,7 @@ This class defined the cost function of the LSM tree
 """
 import numpy as np
 from numba.experimental import jitclass
-from numba import types
+from numba import njit, types
 
 spec = [
     ('N', types.float64),
@@ -23,6 +23,227 @@ spec = [
 BITS_IN_BYTES = 8
 
 
+@njit(cache=True, nogil=True)
+def level_count(h, T, N, E, M, get_ceiling=True):
+    mbuff = M - (h * N)
+    level = np.log(((N * E) / mbuff) + 1) / np.log(T)
+    if get_ceiling:
+        level = np.ceil(level)
+
+    return level
+
+
+@njit(cache=True, nogil=True)
+def cost_components(h, T, N, phi, s, B, E, M, is_leveling_policy):
+    """Per-operation costs [Z0, Z1, Q, W] computed in a single pass"""
+    return cost_components_at_levels(
+        h, T, level_count(h, T, N, E, M, True), N, phi, s, B, E, M,
+        is_leveling_policy)
+
+
+@njit(cache=True, nogil=True)
+def cost_components_at_levels(h, T, levels, N, phi, s, B, E, M,
+                              is_leveling_policy):
+    """[Z0, Z1, Q, W] with the level count ceil(L) held at levels, which is
+    smooth in (h, T)"""
+    mbuff = M - (h * N)
+    assert mbuff > 0, 'Mbuff must be positive'
+
+    L = int(levels)
+    alpha = np.exp(-1 * h * (np.log(2) ** 2))
+    top = T ** (T / (T - 1))
+    fp = np.empty(L)
+    for i in range(1, L + 1):
+        fp[i - 1] = (top / (T ** (levels + 1 - i))) * alpha
+
+    z0 = 0
+    for i in range(L):
+        z0 += fp[i]
+    if not is_leveling_policy:
+        z0 *= (T - 1)
+
+    Nf = mbuff * ((T ** levels) - 1) / E
+    z1 = 0
+    fp_levels_sum = 0  # Prefix sum of fp over levels 1..i-2
+    for i in range(1, L + 1):
+        run_prob = (mbuff * (T ** (i - 1))) / (Nf * E)
+        if is_leveling_policy:
+            z1 += (T - 1) * run_prob * (1 + fp_levels_sum)
+        else:
+            z1 += (T - 1) * run_prob * \
+                (1 + fp_levels_sum + ((T - 2) / 2) * fp[i - 1])
+        if i >= 2:
+            fp_levels_sum += fp[i - 2]
+
+    level_frac = level_count(h, T, N, E, M, False)
+    q = s * N / B
+    w = (T - 1) * (1 + phi) * level_frac / B
+    if is_leveling_policy:
+        q += level_frac
+        w /= 2
+    else:
+        q += (level_frac * (T - 1))
+        w /= T
+
+    return np.array([z0, z1, q, w])
+
+
+# Columns of cost_level_components
+LEVEL_COLUMNS = ('z0', 'run_prob', 'z1', 'q', 'w')
+
+
+@njit(cache=True, nogil=True)
+def cost_level_components(h, T, N, phi, s, B, E, M, is_leveling_policy):
+    """Per-level breakdown of [Z0, Z1, Q, W]
+
+    Row i - 1 describes level i with columns LEVEL_COLUMNS: expected false
+    positive I/Os, probability that an existing entry lives in the level,
+    and the level's share of Z1, Q and W. The z0, z1, q and w columns sum to
+    cost_components. The last level is only partially full, so it takes the
+    fractional part of the level count in Q and W, and the selectivity term
+    of Q is split by run_prob.
+    """
+    mbuff = M - (h * N)
+    assert mbuff > 0, 'Mbuff must be positive'
+
+    levels = level_count(h, T, N, E, M, True)
+    L = int(levels)
+    alpha = np.exp(-1 * h * (np.log(2) ** 2))
+    top = T ** (T / (T - 1))
+    level_frac = level_count(h, T, N, E, M, False)
+    runs = 1 if is_leveling_policy else T - 1
+
+    out = np.empty((L, 5))
+    Nf = mbuff * ((T ** levels) - 1) / E
+    fp_levels_sum = 0  # Prefix sum of fp over levels 1..i-2, as in Z1
+    fp_prev = 0
+    for i in range(1, L + 1):
+        fp = (top / (T ** (levels + 1 - i))) * alpha
+        run_prob = (mbuff * (T ** (i - 1))) / (Nf * E)
+        inner = 1 + fp_levels_sum
+        if not is_leveling_policy:
+            inner += ((T - 2) / 2) * fp
+        fill = 1 if i < L else level_frac - (L - 1)
+
+        out[i - 1, 0] = runs * fp
+        out[i - 1, 1] = (T - 1) * run_prob
+        out[i - 1, 2] = (T - 1) * run_prob * inner
+        out[i - 1, 3] = (s * N / B) * (T - 1) * run_prob + runs * fill
+        out[i - 1, 4] = (T - 1) * (1 + phi) * fill / B
+        if is_leveling_policy:
+            out[i - 1, 4] /= 2
+        else:
+            out[i - 1, 4] /= T
+        fp_levels_sum += fp_prev
+        fp_prev = fp
+
+    return out
+
+
+def rocksdb_level_buckets(level_components):
+    """Sums per-level rows into the l0, l1 and l2_plus buckets that RocksDB
+    reports hits for (l0_hit, l1_hit, l2_plus_hit)
+
+    Model level i is RocksDB level i - 1, so rows 0 and 1 are kept and the
+    rest are summed.
+
+    :param level_components: (L, k) array, e.g. from cost_level_components
+    :return buckets: dict of bucket name to (k,) array
+    """
+    level_components = np.asarray(level_components)
+    empty = np.zeros(level_components.shape[1:])
+    return {
+        'l0': level_components[0] if len(level_components) > 0 else empty,
+        'l1': level_components[1] if len(level_components) > 1 else empty,
+        'l2_plus': level_components[2:].sum(axis=0),
+    }
+
+
+@njit(cache=True, nogil=True)
+def cost_components_jacobian(h, T, N, phi, s, B, E, M, is_leveling_policy):
+    """Jacobian of [Z0, Z1, Q, W] with respect to (h, T)"""
+    # ceil(L) is piecewise constant, only the fractional level count used
+    # by Q and W varies smoothly with (h, T)
+    return cost_components_jacobian_at_levels(
+        h, T, level_count(h, T, N, E, M, True), N, phi, s, B, E, M,
+        is_leveling_policy)
+
+
+@njit(cache=True, nogil=True)
+def cost_components_jacobian_at_levels(h, T, levels, N, phi, s, B, E, M,
+                                       is_leveling_policy):
+    """Jacobian of cost_components_at_levels with respect to (h, T)"""
+    mbuff = M - (h * N)
+    assert mbuff > 0, 'Mbuff must be positive'
+
+    L = int(levels)
+    level_frac = level_count(h, T, N, E, M, False)
+    ratio = (N * E) / mbuff
+    dlevel_dh = (ratio / mbuff) * N / ((ratio + 1) * np.log(T))
+    dlevel_dT = -level_frac / (T * np.log(T))
+
+    # d fp / dh = dfp_dh * fp, d fp / dT = fp * (dlog_top - (L + 1 - i) / T)
+    dfp_dh = -1 * (np.log(2) ** 2)
+    alpha = np.exp(dfp_dh * h)
+    top = T ** (T / (T - 1))
+    dlog_top = (T - 1 - np.log(T)) / ((T - 1) ** 2)
+    fp = np.empty(L)
+    dfp_dT = np.empty(L)
+    for i in range(1, L + 1):
+        fp[i - 1] = (top / (T ** (levels + 1 - i))) * alpha
+        dfp_dT[i - 1] = fp[i - 1] * (dlog_top - (levels + 1 - i) / T)
+
+    jac = np.zeros((4, 2))
+    fp_sum = 0
+    dfp_sum_dT = 0
+    for i in range(L):
+        fp_sum += fp[i]
+        dfp_sum_dT += dfp_dT[i]
+    if is_leveling_policy:
+        jac[0, 0] = dfp_dh * fp_sum
+        jac[0, 1] = dfp_sum_dT
+    else:
+        jac[0, 0] = (T - 1) * dfp_dh * fp_sum
+        jac[0, 1] = (T - 1) * dfp_sum_dT + fp_sum
+
+    # Nfull scales with mbuff, so the run probabilities only depend on T
+    growth = levels * (T ** (levels - 1)) / ((T ** levels) - 1)
+    fp_levels_sum = 0
+    dfp_levels_sum_dT = 0
+    for i in range(1, L + 1):
+        run_prob = (T ** (i - 1)) / ((T ** levels) - 1)
+        weight = (T - 1) * run_prob
+        dweight_dT = run_prob + weight * (((i - 1) / T) - growth)
+        inner = 1 + fp_levels_sum
+        dinner_dh = dfp_dh * fp_levels_sum
+        dinner_dT = dfp_levels_sum_dT
+        if not is_leveling_policy:
+            inner += ((T - 2) / 2) * fp[i - 1]
+            dinner_dh += ((T - 2) / 2) * dfp_dh * fp[i - 1]
+            dinner_dT += (fp[i - 1] / 2) + ((T - 2) / 2) * dfp_dT[i - 1]
+        jac[1, 0] += weight * dinner_dh
+        jac[1, 1] += (dweight_dT * inner) + (weight * dinner_dT)
+        if i >= 2:
+            fp_levels_sum += fp[i - 2]
+            dfp_levels_sum_dT += dfp_dT[i - 2]
+
+    if is_leveling_policy:
+        jac[2, 0] = dlevel_dh
+        jac[2, 1] = dlevel_dT
+        jac[3, 0] = (T - 1) * (1 + phi) * dlevel_dh / (2 * B)
+        jac[3, 1] = ((1 + phi) / (2 * B)
+                     * (level_frac + (T - 1) * dlevel_dT))
+    else:
+        jac[2, 0] = (T - 1) * dlevel_dh
+        jac[2, 1] = level_frac + (T - 1) * dlevel_dT
+        jac[3, 0] = ((T - 1) / T) * (1 + phi) * dlevel_dh / B
+        jac[3, 1] = ((1 + phi) / B
+                     * ((level_frac / (T ** 2))
+                        + ((T - 1) / T) * dlevel_dT))
+
+    return jac
+
+
 @jitclass(spec)
 class CostFunction:
     """
@@ -36,18 +257,12 @@ class CostFunction:
         self.z0, self.z1, self.q, self.w = z0, z1, q, w
 
     def L(self, h, T, get_ceiling=True):
-        mbuff = self.M - (h * self.N)
-        level = np.log(((self.N * self.E) / mbuff) + 1) / np.log(T)
-        if get_ceiling:
-            level = np.ceil(level)
-
-        return level
+        return level_count(h, T, self.N, self.E, self.M, get_ceiling)
 
     def N_full(self, L, h, T):
-        num_entries = 0
+        # Closed form of the geometric sum over levels 1..L
         mbuff = self.M - (h * self.N)
-        for level in range(1, int(L) + 1):
-            num_entries += (T - 1) * (T ** (level - 1)) * mbuff / self.E
+        num_entries = mbuff * ((T ** L) - 1) / self.E
 
         return num_entries
 
@@ -57,39 +272,10 @@ class CostFunction:
         return alpha * np.exp(-1 * h * (np.log(2) ** 2))
 
     def Z0(self, h, T):
-        z0 = 0
-        for i in range(1, self.L(h, T) + 1):
-            z0 += self.fp(h, T, i)
-
-        if not self.is_leveling_policy:
-            z0 *= (T - 1)
-
-        return z0
+        return self.calculate_components(h, T)[0]
 
     def Z1(self, h, T):
-        mbuff = self.M - (h * self.N)
-        assert mbuff > 0, 'Mbuff must be positive'
-
-        cost = 0
-        L = self.L(h, T)
-        Nf = self.N_full(L, h, T)
-        def run_prob(i): return (mbuff * (T ** (i - 1))) / (Nf * self.E)
-
-        if self.is_leveling_policy:
-            for i in range(1, L + 1):
-                fp_levels_sum = 0
-                for k in range(1, i - 1):
-                    fp_levels_sum += self.fp(h, T, k)
-                cost += (T - 1) * run_prob(i) * (1 + fp_levels_sum)
-        else:
-            for i in range(1, L + 1):
-                fp_levels_sum = 0
-                for k in range(1, i - 1):
-                    fp_levels_sum += self.fp(h, T, k)
-                cost += (T - 1) * run_prob(i) * \
-                    (1 + fp_levels_sum + ((T - 2) / 2) * self.fp(h, T, i))
-
-        return cost
+        return self.calculate_components(h, T)[1]
 
     def Q(self, h, T):
         q = self.s * self.N / self.B
@@ -107,6 +293,35 @@ class CostFunction:
             w /= T
         return w
 
+    def calculate_components(self, h, T):
+        """Per-operation costs [Z0, Z1, Q, W] computed in a single pass"""
+        return cost_components(h, T, self.N, self.phi, self.s, self.B,
+                               self.E, self.M, self.is_leveling_policy)
+
+    def calculate_level_components(self, h, T):
+        """Per-level [z0, run_prob, z1, q, w], one row per level"""
+        return cost_level_components(h, T, self.N, self.phi, self.s, self.B,
+                                     self.E, self.M, self.is_leveling_policy)
+
+    def calculate_components_jacobian(self, h, T):
+        """Jacobian of [Z0, Z1, Q, W] with respect to (h, T)"""
+        return cost_components_jacobian(h, T, self.N, self.phi, self.s,
+                                        self.B, self.E, self.M,
+                                        self.is_leveling_policy)
+
+    def calculate_cost_gradient(self, h, T):
+        """Gradient of the workload cost with respect to (h, T)"""
+        if np.isnan(h) or np.isnan(T):
+            return np.zeros(2)
+
+        jac = self.calculate_components_jacobian(h, T)
+        grad = ((self.z0 * jac[0])
+                + (self.z1 * jac[1])
+                + (self.q * jac[2])
+                + (self.w * jac[3]))
+
+        return grad
+
     def calculate_cost(self, h, T, is_leveling_policy=None, B=None, E=None):
         if np.isnan(h):
             return np.iinfo(np.int64).max
@@ -118,9 +333,10 @@ class CostFunction:
         if E is not None:
             self.E = E
 
-        cost = ((self.z0 * self.Z0(h, T))
-                + (self.z1 * self.Z1(h, T))
-                + (self.q * self.Q(h, T))
-                + (self.w * self.W(h, T)))
+        components = self.calculate_components(h, T)
+        cost = ((self.z0 * components[0])
+                + (self.z1 * components[1])
+                + (self.q * components[2])
+                + (self.w * components[3]))
 
         return cost
@@ -0,0 +1,191 @@
+"""
+Tabulates the per-operation costs of CostFunction over a (h, T, N, M) grid
+into a memory-mapped table and interpolates costs from it
+"""
+import os
+import numpy as np
+from numba import njit
+from lsm_tree.cost_function import cost_components
+
+COMPONENTS_FILE = 'components.npy'
+AXES_FILE = 'axes.npz'
+
+# Axes are uniform in h and T, and uniform in log space for N and M, so a
+# query point locates its cell with one division per axis
+AXES = ('h', 'T', 'N', 'M')
+LOG_AXES = (False, False, True, True)
+
+
+@njit(cache=True, nogil=True)
+def tabulate(out, hs, Ts, Ns, Ms, phi, s, B, E, is_leveling_policy):
+    """Fills out[h, T, N, M] with [Z0, Z1, Q, W], NaN where h leaves no
+    memory for the buffer"""
+    for i in range(hs.shape[0]):
+        for j in range(Ts.shape[0]):
+            for k in range(Ns.shape[0]):
+                for m in range(Ms.shape[0]):
+                    if Ms[m] - (hs[i] * Ns[k]) <= 0:
+                        out[i, j, k, m, :] = np.nan
+                        continue
+                    out[i, j, k, m, :] = cost_components(
+                        hs[i], Ts[j], Ns[k], phi, s, B, E, Ms[m],
+                        is_leveling_policy)
+
+
+def grid_axis(start, stop, num, log=False):
+    """Uniform (or log-uniform) grid axis
+
+    :param start:
+    :param stop:
+    :param num:
+    :param log: space points evenly in log(x)
+    """
+    if log:
+        return np.geomspace(start, stop, int(num))
+    return np.linspace(start, stop, int(num))
+
+
+class CostSurface(object):
+    """
+    Memory-mapped table of [Z0, Z1, Q, W] over (policy, h, T, N, M)
+
+    Cells are interpolated multilinearly, so costs between grid points smooth
+    over the jumps of the ceiled level count. Corners without a buffer are
+    left out and the weights renormalized over the rest. Points outside the
+    grid, or without a buffer themselves, are NaN as there is no cost to
+    interpolate.
+    """
+
+    def __init__(self, path):
+        """Opens a table written by CostSurface.build, read only and shared
+        between processes through the page cache
+
+        :param path: directory holding the table
+        """
+        self.path = path
+        self.components = np.load(os.path.join(path, COMPONENTS_FILE),
+                                  mmap_mode='r')
+        with np.load(os.path.join(path, AXES_FILE)) as axes:
+            self.axes = [axes[name] for name in AXES]
+            self.params = {key: axes[key].item()
+                           for key in ('phi', 's', 'B', 'E')}
+
+        self.start, self.step, self.size = [], [], []
+        for axis, log in zip(self.axes, LOG_AXES):
+            points = np.log(axis) if log else axis
+            self.start.append(points[0])
+            self.step.append(
+                (points[-1] - points[0]) / max(len(points) - 1, 1))
+            self.size.append(len(points))
+
+    @classmethod
+    def build(cls, path, h, T, N, M, phi, s, B, E):
+        """Tabulates both policies over the grid and returns the opened table
+
+        :param path: directory to write the table to
+        :param h: (start, stop, num) of the bits per element axis
+        :param T: (start, stop, num) of the size ratio axis
+        :param N: (start, stop, num) of the entries axis, log spaced
+        :param M: (start, stop, num) of the total memory axis in bits,
+            log spaced
+        :param phi:
+        :param s:
+        :param B:
+        :param E:
+        """
+        os.makedirs(path, exist_ok=True)
+        axes = [grid_axis(*bounds, log=log)
+                for bounds, log in zip((h, T, N, M), LOG_AXES)]
+        shape = (2,) + tuple(len(axis) for axis in axes) + (4,)
+        components = np.lib.format.open_memmap(
+            os.path.join(path, COMPONENTS_FILE), mode='w+',
+            dtype=np.float64, shape=shape)
+        for policy in (0, 1):  # Tiering, leveling
+            tabulate(components[policy], *axes, float(phi), float(s),
+                     int(B), int(E), bool(policy))
+        components.flush()
+        del components
+
+        np.savez(os.path.join(path, AXES_FILE),
+                 **dict(zip(AXES, axes)), phi=phi, s=s, B=B, E=E)
+
+        return cls(path)
+
+    def locate(self, axis, x):
+        """Returns the lower cell index and the weight of the upper point,
+        clipped to the grid so every query indexes a cell
+
+        :param axis: index into AXES
+        :param x: query coordinates
+        """
+        if LOG_AXES[axis]:
+            x = np.log(x)
+        size = self.size[axis]
+        if size == 1:
+            return np.zeros(np.shape(x), dtype=np.intp), np.zeros(np.shape(x))
+        pos = np.clip((x - self.start[axis]) / self.step[axis], 0, size - 1)
+        idx = np.minimum(pos.astype(np.intp), size - 2)
+
+        return idx, pos - idx
+
+    def calculate_components(self, h, T, N, M, is_leveling_policy):
+        """Interpolated [Z0, Z1, Q, W], the last axis of the result
+
+        NaN where M - h * N <= 0, where a coordinate is outside its axis,
+        or where no corner of the cell with positive weight has a buffer.
+
+        :param h: scalar or array, broadcast against T, N and M
+        :param T:
+        :param N:
+        :param M:
+        :param is_leveling_policy:
+        """
+        h, T, N, M = np.broadcast_arrays(*(np.asarray(x, dtype=np.float64)
+                                           for x in (h, T, N, M)))
+        table = self.components[int(bool(is_leveling_policy))]
+        cells = [self.locate(axis, x) for axis, x in enumerate((h, T, N, M))]
+
+        components = np.zeros(h.shape + (4,))
+        total = np.zeros(h.shape)
+        for corner in range(16):
+            index, weight = [], 1
+            for axis, (idx, frac) in enumerate(cells):
+                upper = (corner >> axis) & 1
+                if self.size[axis] == 1:
+                    if upper:
+                        break
+                    index.append(idx)
+                    continue
+                index.append(idx + upper)
+                weight = weight * (frac if upper else 1 - frac)
+            else:
+                # Skip corners out of reach or without a buffer, which a
+                # zero weight would still turn into NaN
+                values = table[tuple(index)]
+                usable = (weight > 0) & np.isfinite(values[..., 0])
+                weight = np.where(usable, weight, 0)
+                components += weight[..., None] * np.where(
+                    usable[..., None], values, 0)
+                total += weight
+
+        valid = (total > 0) & (M - (h * N) > 0)
+        for axis, x in zip(self.axes, (h, T, N, M)):
+            valid &= (x >= axis[0]) & (x <= axis[-1])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(valid[..., None],
+                            components / total[..., None], np.nan)
+
+    def calculate_cost(self, h, T, N, M, is_leveling_policy, workload):
+        """Interpolated workload cost
+
+        :param h:
+        :param T:
+        :param N:
+        :param M:
+        :param is_leveling_policy:
+        :param workload: (z0, z1, q, w), or an (m, 4) array of workloads which
+            adds a trailing axis of size m to the result
+        """
+        components = self.calculate_components(h, T, N, M, is_leveling_policy)
+
+        return components @ np.asarray(workload, dtype=np.float64).T
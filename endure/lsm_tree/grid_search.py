@@ -0,0 +1,44 @@
+"""
+Grid search over integer size ratios with a polished h
+
+The integer tuners tabulate their objective over an h grid and every
+integer T, take the best h cell of the few best size ratios and refine h
+between that cell's neighbours with a bounded 1-D solve, T staying the
+integer it was tabulated at.
+"""
+
+import numpy as np
+from scipy.optimize import minimize_scalar
+
+
+def polish_grid(hs, Ts, costs, objective, polish_count=3):
+    """Best (h, T) of a grid search, h polished with a bounded 1-D solve
+    between the neighbours of the best cell of the polish_count best size
+    ratios
+
+    :param hs: (n,) h grid
+    :param Ts: (m,) size ratios, kept as they are
+    :param costs: (n, m) objective over hs x Ts, NaN where undefined
+    :param objective: objective(h, T), a scalar
+    :param polish_count:
+    :return cost, h, T, status: status of the polish that gave h, 0 for a
+        grid point
+    """
+    costs = np.where(np.isnan(costs), np.inf, costs)
+    best_h = np.argmin(costs, axis=0)
+    best_T = np.argsort(costs[best_h, np.arange(len(Ts))])
+    best = (np.inf, np.nan, np.nan, 0)
+    for j in best_T[:polish_count]:
+        i = best_h[j]
+        T = Ts[j]
+        h, cost, status = hs[i], costs[i, j], 0
+        sol = minimize_scalar(
+            lambda h: objective(h, T), method='bounded',
+            bounds=(hs[max(i - 1, 0)], hs[min(i + 1, len(hs) - 1)]),
+            options={'xatol': 1e-10})
+        if sol.fun < cost:
+            h, cost, status = sol.x, sol.fun, sol.status
+        if cost < best[0]:
+            best = (cost, h, T, status)
+
+    return best
@@ -0,0 +1,210 @@
+"""
+Global tuning over the size ratios that can be deployed
+
+RocksDB.init_database deploys int(np.ceil(T)), so only the integer size
+ratios in [2, 100] matter. IntegerTuning tabulates CostFunction over every
+integer T and a fine h grid in one batch, picks the best cells and polishes
+their h with a bounded 1-D solve. No start design is involved.
+
+IntegerTuning.deploy maps a continuous design from any of the tuners to the
+configuration RocksDB would build, re-optimizing h at the neighbouring
+integer T (or searching every integer T) and reporting the cost of the
+deployed tree next to the continuous optimum.
+"""
+
+import numpy as np
+from lsm_tree.cost_function import cost_components
+from lsm_tree.cost_surface import tabulate
+from lsm_tree.nominal import workload_vector, cost_args
+from lsm_tree.grid_search import polish_grid
+from robust.workload_uncertainty import (kl_worst_case, kl_worst_case_batch,
+                                         worst_case_objective)
+
+
+class IntegerTuning(object):
+    """
+    Exhaustive nominal and robust tuning over integer size ratios
+    """
+
+    def __init__(self, cost_func, h_points=512, polish_count=3) -> None:
+        """Constructor
+
+        :param cost_func:
+        :param h_points: points of the h grid
+        :param polish_count: best cells whose h is polished
+        """
+        self.cost_func = cost_func
+        self.h_points = h_points
+        self.polish_count = polish_count
+
+    def size_ratios(self):
+        T_UPPER_LIM, T_LOWER_LIM = (100, 2)
+        return np.arange(T_LOWER_LIM, T_UPPER_LIM + 1, dtype=np.float64)
+
+    def h_upper_lim(self):
+        one_mib_in_bits = 1024 * 1024 * 8
+        return ((self.cost_func.M / self.cost_func.N) -
+                (one_mib_in_bits / self.cost_func.N))
+
+    def components(self, hs, Ts, is_leveling_policy):
+        """[Z0, Z1, Q, W] over the (h, T) grid, shape (len(hs), len(Ts), 4)
+
+        :param hs:
+        :param Ts:
+        :param is_leveling_policy:
+        """
+        out = np.empty((len(hs), len(Ts), 1, 1, 4))
+        tabulate(out, hs, Ts,
+                 np.array([self.cost_func.N], dtype=np.float64),
+                 np.array([self.cost_func.M], dtype=np.float64),
+                 float(self.cost_func.phi), float(self.cost_func.s),
+                 int(self.cost_func.B), int(self.cost_func.E),
+                 bool(is_leveling_policy))
+        return out[:, :, 0, 0, :]
+
+    def search(self, grid_objective, objective, is_leveling_policy, h_low,
+               Ts=None):
+        """Best (h, T) of one policy
+
+        :param grid_objective: maps an (n, 4) array of components to costs
+        :param objective: objective(h, T) for the polish
+        :param is_leveling_policy:
+        :param h_low: lower bound of h
+        :param Ts: size ratios to search, every integer one if None
+        :return h, T, cost:
+        """
+        hs = np.linspace(h_low, self.h_upper_lim(), self.h_points)
+        if Ts is None:
+            Ts = self.size_ratios()
+        components = self.components(hs, Ts, is_leveling_policy)
+        costs = grid_objective(components.reshape(-1, 4)).reshape(
+            len(hs), len(Ts))
+        cost, h, T, _ = polish_grid(hs, Ts, costs, objective,
+                                    self.polish_count)
+        return h, T, cost
+
+    def nominal_objectives(self, workload, policy):
+        kernel_args = cost_args(self.cost_func, policy)
+        return (lambda components: components @ workload,
+                lambda h, T: workload @ cost_components(h, T, *kernel_args))
+
+    def robust_objectives(self, rho, workload, policy):
+        kernel_args = cost_args(self.cost_func, policy)
+        return (lambda components: kl_worst_case_batch(
+                    np.ascontiguousarray(components), workload, rho),
+                lambda h, T: worst_case_objective(
+                    (h, T), rho, workload, kernel_args))
+
+    def policies(self, is_leveling_policy):
+        if is_leveling_policy is None:
+            return [True, False]
+        return [is_leveling_policy]
+
+    def design(self, h, T, policy, cost):
+        design = {}
+        design['T'] = T
+        design['M_h'] = h
+        design['M_filt'] = h * self.cost_func.N
+        design['M_buff'] = self.cost_func.M - design['M_filt']
+        design['is_leveling_policy'] = policy
+        design['cost'] = cost
+        return design
+
+    def get_nominal_design(self, is_leveling_policy=None, workload=None):
+        """Returns the nominal design with an integer T
+
+        :param is_leveling_policy: policy to tune, both if None
+        :param workload: dict with keys z0, z1, q, w, the cost function's
+            workload if None
+        :return design:
+        """
+        workload = workload_vector(self.cost_func, workload)
+
+        design = {'cost': np.inf}
+        for policy in self.policies(is_leveling_policy):
+            h, T, cost = self.search(
+                *self.nominal_objectives(workload, policy), policy, 0)
+            if cost < design['cost']:
+                design = self.design(h, T, policy, cost)
+
+        return design
+
+    def get_robust_design(self, rho, is_leveling_policy=None, workload=None):
+        """Returns the robust design with an integer T, over the same h
+        bounds as WorkloadUncertainty
+
+        :param rho:
+        :param is_leveling_policy: policy to tune, both if None
+        :param workload:
+        :return design:
+        """
+        workload = workload_vector(self.cost_func, workload)
+
+        design = {'obj': np.inf}
+        for policy in self.policies(is_leveling_policy):
+            h, T, obj = self.search(
+                *self.robust_objectives(rho, workload, policy), policy, 1)
+            if obj < design['obj']:
+                kernel_args = cost_args(self.cost_func, policy)
+                components = cost_components(h, T, *kernel_args)
+                _, lamb, eta, _ = kl_worst_case(components, workload, rho)
+                design = self.design(h, T, policy, workload @ components)
+                design['lambda'] = lamb
+                design['eta'] = eta
+                design['obj'] = obj
+
+        return design
+
+    def deploy(self, design, workload=None, rho=None, exhaustive=False):
+        """Adds the configuration RocksDB.init_database builds to a design
+
+        The continuous design is kept. rounded_* describe the design deployed
+        as is, with T rounded up and h to two decimals. deployed_* describe
+        the best deployable design: h re-optimized at the integer T next to
+        design['T'] (or at every integer T if exhaustive) for the design's
+        policy, then rounded the same way.
+
+        :param design: design of any of the CostFunction tuners
+        :param workload:
+        :param rho: tune the KL worst case cost, the nominal cost if None
+        :param exhaustive: search every integer T
+        :return design:
+        """
+        workload = workload_vector(self.cost_func, workload)
+        policy = design['is_leveling_policy']
+        kernel_args = cost_args(self.cost_func, policy)
+
+        if exhaustive:
+            Ts = None
+        else:
+            T_low, T_high = self.size_ratios()[[0, -1]]
+            Ts = np.unique(np.clip(
+                [np.floor(design['T']), np.ceil(design['T'])], T_low, T_high))
+        if rho is None:
+            grid_objective, objective = self.nominal_objectives(
+                workload, policy)
+            h_low = 0
+        else:
+            grid_objective, objective = self.robust_objectives(
+                rho, workload, policy)
+            h_low = 1
+        h, T, _ = self.search(grid_objective, objective, policy, h_low, Ts)
+
+        # init_database formats h with two decimals, keep the better of the
+        # two hundredths around the optimum
+        hs = np.clip([np.floor(h * 100) / 100, np.ceil(h * 100) / 100],
+                     h_low, self.h_upper_lim())
+        deployed_h = min(hs, key=lambda h: objective(h, T))
+
+        for prefix, (h, T) in (('rounded', (design['M_h'], design['T'])),
+                               ('deployed', (deployed_h, T))):
+            h, T = round(h, 2), int(np.ceil(T))
+            components = cost_components(h, T, *kernel_args)
+            design[f'{prefix}_T'] = T
+            design[f'{prefix}_M_h'] = h
+            design[f'{prefix}_cost'] = workload @ components
+            if rho is not None:
+                design[f'{prefix}_obj'] = kl_worst_case(
+                    components, workload, rho)[0]
+
+        return design
@@ -0,0 +1,118 @@
+"""
+Nominal tuning of EndureKHybridCost, the tree with K[i] runs at level i
+
+With (h, T) fixed the level count, the false positive rates and the run
+probabilities are fixed, and the workload cost splits into one term per
+level, a[i] * K[i] + b / K[i] plus a constant: Z0 and Q grow linearly with
+K[i], Z1 grows linearly through the false positives of level i seen by the
+lookups ending at it and below it, and W falls as 1 / K[i]. So the best
+integer run cap of each level is the better of the two integers around
+sqrt(b / a[i]), with no search over the levels jointly. KHybridTuning
+evaluates that over every integer T and an h grid in one kernel, then
+polishes h of the best cells.
+"""
+
+import numpy as np
+from numba import njit
+from lsm_tree.cost_func import (Policy, level_count, level_false_positives,
+                                khybrid_components)
+from lsm_tree.grid_search import polish_grid
+
+
+@njit(cache=True, nogil=True)
+def khybrid_runs(h, T, workload, params):
+    """Best integer K[i] in [1, T - 1] of every level at (h, T)
+
+    :param h:
+    :param T: integer size ratio
+    :param workload: (z0, z1, q, w)
+    :param params: (B, E, H, N, phi, s)
+    :return K: (L,) run caps
+    """
+    B, E, H, N, phi, s = params
+    levels = level_count(h, T, E, H, N, True)
+    fp = level_false_positives(h, T, levels)
+    L = fp.shape[0]
+    z0, z1, q, w = workload
+
+    b = w * (1 + phi) * (T - 1) / (2 * B)
+    K = np.empty(L)
+    lower_run_prob = 0  # Run probabilities of the levels below level i
+    for i in range(L - 1, -1, -1):
+        run_prob = (T - 1) * (T ** i) / ((T ** levels) - 1)
+        a = (z0 * fp[i]) + (z1 * fp[i] * ((run_prob / 2) + lower_run_prob)) + q
+        lower_run_prob += run_prob
+        if a <= 0:
+            K[i] = T - 1
+            continue
+        best = min(max(np.floor(np.sqrt(b / a)), 1), T - 1)
+        if best < T - 1 and (a * (best + 1)) + (b / (best + 1)) < \
+                (a * best) + (b / best):
+            best += 1
+        K[i] = best
+
+    return K
+
+
+@njit(cache=True, nogil=True)
+def khybrid_best_cost(h, T, workload, params):
+    """Workload cost with the best run caps at (h, T)"""
+    components = khybrid_components(
+        h, T, khybrid_runs(h, T, workload, params), params)
+    return ((workload[0] * components[0])
+            + (workload[1] * components[1])
+            + (workload[2] * components[2])
+            + (workload[3] * components[3]))
+
+
+@njit(cache=True, nogil=True)
+def khybrid_grid(hs, Ts, workload, params):
+    """khybrid_best_cost over the grid hs x Ts, shape (len(hs), len(Ts))"""
+    costs = np.empty((hs.shape[0], Ts.shape[0]))
+    for i in range(hs.shape[0]):
+        for j in range(Ts.shape[0]):
+            costs[i, j] = khybrid_best_cost(hs[i], Ts[j], workload, params)
+
+    return costs
+
+
+class KHybridTuning(object):
+    """
+    Nominal tuning of h, integer T and an integer run cap per level
+    """
+
+    def __init__(self, cost_model, h_points=256, polish_count=3) -> None:
+        """Constructor
+
+        :param cost_model: EndureKHybridCost
+        :param h_points: points of the h grid
+        :param polish_count: best cells whose h is polished
+        """
+        self.cost_model = cost_model
+        self.h_points = h_points
+        self.polish_count = polish_count
+
+    def get_nominal_design(self, z0, z1, q, w):
+        """Returns the nominal design
+
+        :param z0:
+        :param z1:
+        :param q:
+        :param w:
+        :return design: dict with keys h, T, K, policy, cost and levels
+        """
+        one_mib_in_bits = 1024 * 1024 * 8
+        B, E, H, N, phi, s = params = self.cost_model.params()
+        workload = np.array([z0, z1, q, w], dtype=np.float64)
+
+        hs = np.linspace(0, H - (one_mib_in_bits / N), self.h_points)
+        Ts = np.arange(2, 101, dtype=np.float64)
+        costs = khybrid_grid(hs, Ts, workload, params)
+
+        cost, h, T, _ = polish_grid(
+            hs, Ts, costs,
+            lambda h, T: khybrid_best_cost(h, T, workload, params),
+            self.polish_count)
+        K = khybrid_runs(h, T, workload, params)
+        return {'h': h, 'T': T, 'K': K.astype(np.int64),
+                'policy': Policy.KHybrid, 'cost': cost, 'levels': len(K)}
@@ -0,0 +1,147 @@
+"""
+Multi-start wrapper around scipy's minimize for the tuners
+"""
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+from lsm_tree.solvers import bound_arrays, minimize_with
+
+
+def latin_hypercube(bounds, num_starts, seed=0):
+    """Latin hypercube sample of num_starts points within bounds, each axis
+    split in num_starts strata holding one point each
+
+    :param bounds:
+    :param num_starts:
+    :param seed:
+    """
+    lb, ub = bound_arrays(bounds)
+    rng = np.random.default_rng(seed)
+    strata = np.stack([rng.permutation(num_starts) for _ in lb], axis=1)
+    unit = (strata + rng.random((num_starts, len(lb)))) / num_starts
+
+    return lb + unit * (ub - lb)
+
+
+def solve(fun, jac, x0, args, minimizer_kwargs):
+    """Runs one start, at module level so process pools can pickle it"""
+    return minimize_with(fun, jac, x0, args, **minimizer_kwargs)
+
+
+def minimize_from(multi_start, fun, jac, x0, args=(), **minimizer_kwargs):
+    """Minimizes from x0 alone, or through multi_start when one is given
+
+    :param multi_start: MultiStart or None
+    :return sol, diagnostics: diagnostics is None for a single start
+    """
+    if multi_start is None:
+        return solve(fun, jac, x0, args, minimizer_kwargs), None
+    return multi_start.minimize(fun, jac, x0, args=args, **minimizer_kwargs)
+
+
+class MultiStart(object):
+    """
+    Runs a minimization from several starts in a worker pool and keeps the
+    best solution
+
+    The objective, its gradient and args are sent to the workers, so with
+    processes they must be picklable (module level functions and arrays, not
+    the jitclass cost functions). Solves that exit with a non-zero status
+    are retried from fresh starts.
+    """
+
+    def __init__(self, num_starts=8, max_workers=None, max_retries=2,
+                 seed=0, use_processes=True):
+        """Constructor
+
+        :param num_starts: starts per minimization, including x0
+        :param max_workers: workers, the number of cores if None
+        :param max_retries: rounds of fresh starts for failed solves
+        :param seed: seed of the Latin hypercube starts
+        :param use_processes: solve in processes, else in threads
+        """
+        self.num_starts = num_starts
+        self.max_workers = max_workers or os.cpu_count()
+        self.max_retries = max_retries
+        self.seed = seed
+        self.use_processes = use_processes
+        self.pool = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """Multi-start set up by the multi_start config section, None when
+        the section is missing or asks for a single start
+
+        :param config:
+        """
+        settings = config.get('multi_start') or {}
+        if settings.get('num_starts', 1) <= 1:
+            return None
+        return cls(**settings)
+
+    def executor(self):
+        """Worker pool, created on first use and shared by all callers"""
+        with self.lock:
+            if self.pool is None:
+                if self.use_processes:
+                    self.pool = ProcessPoolExecutor(self.max_workers)
+                else:
+                    self.pool = ThreadPoolExecutor(self.max_workers)
+            return self.pool
+
+    def close(self):
+        """Shuts the worker pool down"""
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown()
+                self.pool = None
+
+    def minimize(self, fun, jac, x0, args=(), **minimizer_kwargs):
+        """Minimizes from x0 and num_starts - 1 Latin hypercube starts
+
+        :param fun:
+        :param jac:
+        :param x0: first start
+        :param args:
+        :param minimizer_kwargs: method, bounds, constraints and tol of
+            minimize_with, the bounds also place the starts
+        :return sol, diagnostics: best solution, preferring successful
+            solves, and a dict describing the starts
+        """
+        bounds = minimizer_kwargs['bounds']
+        lb, ub = bound_arrays(bounds)
+        starts = np.vstack([
+            np.clip(x0, lb, ub),
+            latin_hypercube(bounds, self.num_starts - 1, self.seed)])
+
+        pool = self.executor()
+        sols = []
+        retries = 0
+        for attempt in range(self.max_retries + 1):
+            results = list(pool.map(
+                solve, *zip(*[(fun, jac, x, args, minimizer_kwargs)
+                              for x in starts])))
+            sols.extend(results)
+            failed = sum(sol.status != 0 for sol in results)
+            if failed == 0 or attempt == self.max_retries:
+                break
+            retries += failed
+            starts = latin_hypercube(
+                bounds, failed, self.seed + attempt + 1)
+
+        def rank(idx):
+            return (sols[idx].status != 0, sols[idx].fun)
+        best = min(range(len(sols)), key=rank)
+
+        diagnostics = {
+            'num_solves': len(sols),
+            'num_failed': sum(sol.status != 0 for sol in sols),
+            'num_retries': retries,
+            'best_start': best,
+            'exit_modes': [int(sol.status) for sol in sols],
+            'objectives': [float(sol.fun) for sol in sols],
+        }
+        return sols[best], diagnostics
@@ -2,27 +2,132 @@
 This class implements the nominal optimization problem
 """
 
-from scipy.optimize import minimize
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import numpy as np
+from lsm_tree.cost_function import cost_components, cost_components_jacobian
+from lsm_tree.multi_start import minimize_from
 np.seterr(all='ignore')
 
 
+def workload_vector(cost_func, workload=None):
+    """Workload as an array (z0, z1, q, w), defaulting to the cost function's
+
+    :param cost_func:
+    :param workload: dict with keys z0, z1, q, w
+    """
+    if workload is None:
+        return np.array([cost_func.z0, cost_func.z1, cost_func.q, cost_func.w])
+    return np.array([workload['z0'], workload['z1'],
+                     workload['q'], workload['w']], dtype=np.float64)
+
+
+def cost_args(cost_func, is_leveling_policy):
+    """Arguments of the cost_function kernels following (h, T)
+
+    The tuners evaluate the nogil kernels with these instead of mutating and
+    calling the cost function, so one tuner can serve many threads.
+
+    :param cost_func:
+    :param is_leveling_policy:
+    """
+    return (cost_func.N, cost_func.phi, cost_func.s, cost_func.B,
+            cost_func.E, cost_func.M, bool(is_leveling_policy))
+
+
+def solve_in_bound_order(bounds, solve, key):
+    """Solves candidates by increasing upper bound, skipping any whose lower
+    bound is not below the best objective found so far
+
+    :param bounds: dict of candidate to (lower, upper)
+    :param solve: solve(candidate) returns a design
+    :param key: design key of the objective, e.g. 'cost' or 'obj'
+    :return designs, pruned: dict of candidate to design, and the skipped
+        candidates
+    """
+    designs = {}
+    pruned = []
+    incumbent = np.inf
+    for candidate in sorted(bounds, key=lambda c: bounds[c][1]):
+        if bounds[candidate][0] >= incumbent:
+            pruned.append(candidate)
+            continue
+        designs[candidate] = solve(candidate)
+        incumbent = min(incumbent, designs[candidate][key])
+
+    return designs, pruned
+
+
+def nominal_objective(x, workload, kernel_args):
+    """Workload cost of x = (h, T, ...), variables past (h, T) are ignored
+
+    :param x:
+    :param workload: (z0, z1, q, w) array
+    :param kernel_args: cost_components arguments after (h, T)
+    """
+    h, T = x[0], x[1]
+    if np.isnan(h) or np.isnan(T):
+        return np.iinfo(np.int64).max
+
+    return workload @ cost_components(h, T, *kernel_args)
+
+
+def nominal_objective_gradient(x, workload, kernel_args):
+    """Gradient of nominal_objective, zero past (h, T)
+
+    :param x:
+    :param workload:
+    :param kernel_args:
+    """
+    h, T = x[0], x[1]
+    grad = np.zeros(len(x))
+    if np.isnan(h) or np.isnan(T):
+        return grad
+
+    grad[:2] = workload @ cost_components_jacobian(h, T, *kernel_args)
+    return grad
+
+
 class NominalWorkloadTuning(object):
     """
     Nominal non-linear program for workload uncertainty
     """
 
-    def __init__(self, cost_func) -> None:
+    def __init__(self, cost_func, multi_start=None, policy_bounds=None,
+                 solver='slsqp') -> None:
+        """Constructor
+
+        :param cost_func:
+        :param multi_start: MultiStart to solve from several starts, a
+            single start from the default design if None
+        :param policy_bounds: PolicyBounds to skip policies that cannot beat
+            the best design found, every policy is solved if None
+        :param solver: name of a backend in lsm_tree.solvers.SOLVERS
+        """
         self.cost_func = cost_func
+        self.multi_start = multi_start
+        self.policy_bounds = policy_bounds
+        self.solver = solver
         self.logger = logging.getLogger('rlt_logger')
 
-    def calculate_objective(self, args):
-        h, T = args
+    def calculate_objective(self, args, workload=None, kernel_args=None):
+        if workload is None:
+            workload = workload_vector(self.cost_func)
+        if kernel_args is None:
+            kernel_args = cost_args(self.cost_func,
+                                    self.cost_func.is_leveling_policy)
 
-        total_cost = self.cost_func.calculate_cost(h, T)
+        return nominal_objective(args, workload, kernel_args)
 
-        return total_cost
+    def calculate_objective_gradient(self, args, workload=None,
+                                     kernel_args=None):
+        if workload is None:
+            workload = workload_vector(self.cost_func)
+        if kernel_args is None:
+            kernel_args = cost_args(self.cost_func,
+                                    self.cost_func.is_leveling_policy)
+
+        return nominal_objective_gradient(args, workload, kernel_args)
 
     def cf_callback(self, x):
         h, T, = x
@@ -30,81 +135,132 @@ class NominalWorkloadTuning(object):
 
         print(f'{total:.6f}\t {h:.6f}\t {T:.6f}')
 
-    def get_nominal_design(self, is_leveling_policy=None, workload=None):
+    def get_nominal_design(self, is_leveling_policy=None, workload=None,
+                           nominal_design=None):
+        """Returns the nominal design, leaving the cost function untouched so
+        concurrent calls with different workloads are safe
+
+        :param is_leveling_policy: policy to tune, both if None
+        :param workload: dict with keys z0, z1, q, w, the cost function's
+            workload if None
+        :param nominal_design: initial (h, T), h = 5 and T = 20 if None
+        :return design:
+        """
         T_UPPER_LIM, T_LOWER_LIM = (100, 2)
         one_mib_in_bits = 1024 * 1024 * 8
         H_UPPER_LIM = ((self.cost_func.M / self.cost_func.N) -
                        (one_mib_in_bits / self.cost_func.N))
 
-        if workload is not None:
-            self.cost_func.w = workload['w']
-            self.cost_func.z0 = workload['z0']
-            self.cost_func.z1 = workload['z1']
-            self.cost_func.q = workload['q']
+        workload = workload_vector(self.cost_func, workload)
 
-        h_initial = 5
-        T_initial = 20.
+        if nominal_design is not None:
+            h_initial = nominal_design['M_filt'] / self.cost_func.N
+            T_initial = nominal_design['T']
+        else:
+            h_initial = 5
+            T_initial = 20.
 
         bounds = ((0, H_UPPER_LIM), (T_LOWER_LIM, T_UPPER_LIM))
-        min_cost = np.inf
-        design = {}
         minimizer_kwargs = {
-            'method': 'SLSQP',
+            'method': self.solver,
             'bounds': bounds,
-            'options': {'ftol': 1e-12, 'disp': False}}
+            'tol': 1e-12}
 
-        # Check leveling cost
+        policies = []
         if (is_leveling_policy is None) or (is_leveling_policy is True):
-            self.cost_func.is_leveling_policy = True
-            sol = minimize(fun=self.calculate_objective,
-                           x0=np.array([h_initial, T_initial]),
-                           #    callback=self.cf_callback,
-                           **minimizer_kwargs)
-            cost = self.cost_func.calculate_cost(sol.x[0], sol.x[1])
-            if cost < min_cost:
-                design['T'] = sol.x[1]
-                design['M_h'] = sol.x[0]
-                design['M_filt'] = sol.x[0] * self.cost_func.N
-                design['M_buff'] = self.cost_func.M - design['M_filt']
-                design['is_leveling_policy'] = True
-                design['cost'] = cost
-                min_cost = cost
-
-        # Check tiering cost
+            policies.append(True)  # Check leveling cost
         if (is_leveling_policy is None) or (is_leveling_policy is False):
-            self.cost_func.is_leveling_policy = False
-            sol = minimize(fun=self.calculate_objective,
-                           x0=np.array([h_initial, T_initial]),
-                           #    callback=self.cf_callback,
-                           **minimizer_kwargs)
-            cost = self.cost_func.calculate_cost(sol.x[0], sol.x[1])
-            if cost < min_cost:
-                design['T'] = sol.x[1]
-                design['M_h'] = sol.x[0]
-                design['M_filt'] = sol.x[0] * self.cost_func.N
-                design['M_buff'] = self.cost_func.M - design['M_filt']
-                design['is_leveling_policy'] = False
-                design['cost'] = cost
-                min_cost = cost
-
+            policies.append(False)  # Check tiering cost
+
+        def solve(policy):
+            kernel_args = cost_args(self.cost_func, policy)
+            sol, diagnostics = minimize_from(
+                self.multi_start,
+                fun=nominal_objective,
+                jac=nominal_objective_gradient,
+                x0=np.clip([h_initial, T_initial], *np.array(bounds).T),
+                args=(workload, kernel_args),
+                #    callback=self.cf_callback,
+                **minimizer_kwargs)
+            design = {}
+            design['T'] = sol.x[1]
+            design['M_h'] = sol.x[0]
+            design['M_filt'] = sol.x[0] * self.cost_func.N
+            design['M_buff'] = self.cost_func.M - design['M_filt']
+            design['is_leveling_policy'] = policy
+            design['cost'] = nominal_objective(sol.x, workload, kernel_args)
+            design['exit_mode'] = sol.status
+            design['nfev'] = sol.nfev
+            design['njev'] = sol.njev
+            if diagnostics is not None:
+                design['diagnostics'] = diagnostics
+            return design
+
+        if self.policy_bounds is None:
+            designs = {policy: solve(policy) for policy in policies}
+        else:
+            designs, pruned = solve_in_bound_order(
+                {policy: self.policy_bounds.nominal_bounds(policy, workload)
+                 for policy in policies},
+                solve, 'cost')
+
+        design = min(designs.values(), key=lambda design: design['cost'])
+        if self.policy_bounds is not None:
+            design['pruned_policies'] = pruned
         return design
 
+    def get_nominal_designs(self, workloads, is_leveling_policy=None,
+                            max_workers=None):
+        """Tunes many workloads concurrently on a thread pool
+
+        :param workloads: list of dicts with keys z0, z1, q, w
+        :param is_leveling_policy:
+        :param max_workers: threads, ThreadPoolExecutor's default if None
+        :return designs: one design per workload, in order
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return list(pool.map(
+                lambda workload: self.get_nominal_design(
+                    is_leveling_policy, workload),
+                workloads))
+
 
 class NominalQTuning(object):
     """
     Nominal non-linear program for workload uncertainty
     """
 
-    def __init__(self, cost_func) -> None:
+    def __init__(self, cost_func, multi_start=None, solver='slsqp') -> None:
+        """Constructor
+
+        :param cost_func:
+        :param multi_start: MultiStart to solve from several starts, a
+            single start from the default design if None
+        :param solver: name of a backend in lsm_tree.solvers.SOLVERS
+        """
         self.cost_func = cost_func
+        self.multi_start = multi_start
+        self.solver = solver
         self.logger = logging.getLogger('rlt_logger')
 
-    def calculate_objective(self, args):
-        h, T, Q = args
+    def calculate_objective(self, args, workload=None, kernel_args=None):
+        if workload is None:
+            workload = workload_vector(self.cost_func)
+        if kernel_args is None:
+            kernel_args = cost_args(self.cost_func,
+                                    self.cost_func.is_leveling_policy)
+
+        return nominal_objective(args, workload, kernel_args)
 
-        total_cost = self.cost_func.calculate_cost(h, T)
+    def calculate_objective_gradient(self, args, workload=None,
+                                     kernel_args=None):
+        if workload is None:
+            workload = workload_vector(self.cost_func)
+        if kernel_args is None:
+            kernel_args = cost_args(self.cost_func,
+                                    self.cost_func.is_leveling_policy)
 
-        return total_cost
+        return nominal_objective_gradient(args, workload, kernel_args)
 
     def cf_callback(self, x):
         h, T, = x
@@ -113,16 +269,19 @@ class NominalQTuning(object):
         print(f'{total:.6f}\t {h:.6f}\t {T:.6f}')
 
     def get_nominal_design(self, is_leveling_policy=None, workload=None):
+        """Returns the nominal design, leaving the cost function untouched
+
+        :param is_leveling_policy: policy to tune, both if None
+        :param workload: dict with keys z0, z1, q, w, the cost function's
+            workload if None
+        :return design:
+        """
         T_UPPER_LIM, T_LOWER_LIM = (100, 2)
         one_mib_in_bits = 1024 * 1024 * 8
         H_UPPER_LIM = ((self.cost_func.M / self.cost_func.N) -
                        (one_mib_in_bits / self.cost_func.N))
 
-        if workload is not None:
-            self.cost_func.w = workload['w']
-            self.cost_func.z0 = workload['z0']
-            self.cost_func.z1 = workload['z1']
-            self.cost_func.q = workload['q']
+        workload = workload_vector(self.cost_func, workload)
 
         h_initial = 5
         T_initial = 20.
@@ -134,42 +293,36 @@ class NominalQTuning(object):
         min_cost = np.inf
         design = {}
         minimizer_kwargs = {
-            'method': 'SLSQP',
+            'method': self.solver,
             'bounds': bounds,
-            'options': {'ftol': 1e-6, 'disp': False}}
+            'tol': 1e-6}
 
-        # Check leveling cost
+        policies = []
         if (is_leveling_policy is None) or (is_leveling_policy is True):
-            self.cost_func.is_leveling_policy = True
-            sol = minimize(fun=self.calculate_objective,
-                           x0=np.array([h_initial, T_initial, Q_initial]),
-                           #    callback=self.cf_callback,
-                           **minimizer_kwargs)
-            cost = self.cost_func.calculate_cost(sol.x[0], sol.x[1])
-            if cost < min_cost:
-                design['T'] = sol.x[1]
-                design['M_filt'] = sol.x[0] * self.cost_func.N
-                design['M_buff'] = self.cost_func.M - design['M_filt']
-                design['is_leveling_policy'] = True
-                design['cost'] = cost
-                min_cost = cost
-
-        # Check tiering cost
+            policies.append(True)  # Check leveling cost
         if (is_leveling_policy is None) or (is_leveling_policy is False):
-            self.cost_func.is_leveling_policy = False
-            sol = minimize(fun=self.calculate_objective,
-                           x0=np.array([h_initial, T_initial]),
-                           #    callback=self.cf_callback,
-                           **minimizer_kwargs)
-            cost = self.cost_func.calculate_cost(sol.x[0], sol.x[1])
+            policies.append(False)  # Check tiering cost
+
+        for policy in policies:
+            kernel_args = cost_args(self.cost_func, policy)
+            sol, diagnostics = minimize_from(
+                self.multi_start,
+                fun=nominal_objective,
+                jac=nominal_objective_gradient,
+                x0=np.array([h_initial, T_initial, Q_initial]),
+                args=(workload, kernel_args),
+                #    callback=self.cf_callback,
+                **minimizer_kwargs)
+            cost = nominal_objective(sol.x, workload, kernel_args)
             if cost < min_cost:
                 design['T'] = sol.x[1]
                 design['M_filt'] = sol.x[0] * self.cost_func.N
                 design['M_buff'] = self.cost_func.M - design['M_filt']
-                design['is_leveling_policy'] = False
+                design['is_leveling_policy'] = policy
                 design['cost'] = cost
+                design['exit_mode'] = sol.status
+                if diagnostics is not None:
+                    design['diagnostics'] = diagnostics
                 min_cost = cost
 
         return design
-
-
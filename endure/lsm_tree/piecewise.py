@@ -0,0 +1,395 @@
+"""
+Nominal tuning by level count
+
+Every cost model depends on (h, T) through ceil(L), so the objective is
+smooth between the curves where the fractional level count crosses an
+integer. These tuners enumerate the level counts the bounds allow, minimize
+each smooth piece with the level count held fixed and constrained to its
+band, and keep the best piece.
+
+The run count models, QFixed and YZHybrid, solve their run counts along
+with (h, T) in every piece, each kept within [1, T - 1]. KHybrid has an
+integer run cap per level and is tuned by KHybridTuning instead.
+"""
+
+from concurrent.futures import Executor
+import numpy as np
+from scipy.optimize import minimize
+from lsm_tree.cost_function import (cost_components, cost_components_at_levels,
+                                    cost_components_jacobian_at_levels)
+from lsm_tree.cost_func import (
+    BITS_IN_BYTES, Policy, tier_level_components,
+    tier_level_components_at_levels, tier_level_components_jac_at_levels,
+    qfixed_components, qfixed_components_at_levels,
+    qfixed_components_jac_at_levels, yzhybrid_components,
+    yzhybrid_components_at_levels, yzhybrid_components_jac_at_levels)
+from lsm_tree.khybrid_tuning import KHybridTuning
+from lsm_tree.nominal import workload_vector, cost_args
+
+# Keeps a piece's solution off the edges of its band, where ceil(L) drops to
+# the previous level count or, past SLSQP's constraint tolerance, jumps to
+# the next
+LEVEL_EPS = 1e-9
+
+
+def fractional_levels(x, a, b, NE):
+    """log(NE / mbuff + 1) / log(T) for a buffer of mbuff = a - b * h
+
+    :param x: (h, T, run counts...)
+    :param a:
+    :param b:
+    :param NE: entries times entry size
+    """
+    h, T = x[0], x[1]
+    return np.log((NE / (a - (b * h))) + 1) / np.log(T)
+
+
+def fractional_levels_gradient(x, a, b, NE):
+    h, T = x[0], x[1]
+    mbuff = a - (b * h)
+    ratio = NE / mbuff
+    level = np.log(ratio + 1) / np.log(T)
+    grad = np.zeros(len(x))
+    grad[0] = (ratio / mbuff) * b / ((ratio + 1) * np.log(T))
+    grad[1] = -level / (T * np.log(T))
+    return grad
+
+
+def bits_at_levels(T, level, a, b, NE):
+    """Inverse of fractional_levels in h"""
+    return (a - (NE / ((T ** level) - 1))) / b
+
+
+def piece_start(fun, levels, bounds, buffer, args):
+    """Lowest cost point of the level count's band along a few size ratios,
+    None if the band misses the bounds
+
+    Run counts following (h, T) start at 1, sqrt(T - 1) or T - 1, the same
+    at every level.
+
+    :param fun:
+    :param levels:
+    :param bounds: ((h_low, h_high), (T_low, T_high), run count bounds...)
+    :param buffer: (a, b, NE) of fractional_levels
+    :param args:
+    """
+    (h_low, h_high), (T_low, T_high) = bounds[:2]
+    num_runs = len(bounds) - 2
+    run_lows, run_highs = np.array(bounds[2:]).reshape(-1, 2).T
+    Ts = np.geomspace(T_low, T_high, 16)
+    best, best_cost = None, np.inf
+    for level in np.linspace(levels - 1 + LEVEL_EPS, levels - LEVEL_EPS,
+                             5)[1:]:
+        for T in Ts:
+            h = bits_at_levels(T, level, *buffer)
+            if not (h_low <= h <= h_high):
+                continue
+            for runs in ((1., np.sqrt(T - 1), T - 1) if num_runs
+                         else (0.,)):
+                x = np.concatenate((
+                    [h, T],
+                    np.clip(np.full(num_runs, runs), run_lows, run_highs)))
+                cost = fun(x, levels, *args)
+                if cost < best_cost:
+                    best, best_cost = x, cost
+        if best is not None:
+            return best
+
+    return best
+
+
+def solve_piece(fun, jac, levels, bounds, buffer, args):
+    """Minimizes fun with the level count held at levels, constraining the
+    fractional level count to (levels - 1, levels] and every run count
+    following (h, T) to at most T - 1
+
+    :return sol: scipy OptimizeResult, None if the band misses the bounds
+    """
+    x0 = piece_start(fun, levels, bounds, buffer, args)
+    if x0 is None:
+        return None
+
+    constraints = (
+        {'type': 'ineq',
+         'fun': lambda x: fractional_levels(x, *buffer) - (levels - 1)
+         - LEVEL_EPS,
+         'jac': lambda x: fractional_levels_gradient(x, *buffer)},
+        {'type': 'ineq',
+         'fun': lambda x: levels - LEVEL_EPS - fractional_levels(x, *buffer),
+         'jac': lambda x: -fractional_levels_gradient(x, *buffer)})
+    if len(x0) > 2:
+        # T - run count >= 1 for each run count
+        A = np.zeros((len(x0) - 2, len(x0)))
+        A[:, 1] = 1
+        A[:, 2:] = -np.eye(len(x0) - 2)
+        constraints += ({'type': 'ineq',
+                         'fun': lambda x: (A @ x) - 1,
+                         'jac': lambda x: A},)
+    return minimize(fun=fun, jac=jac, x0=x0, args=(levels,) + tuple(args),
+                    method='SLSQP', bounds=bounds, constraints=constraints,
+                    options={'ftol': 1e-12, 'disp': False})
+
+
+def solve_pieces(fun, jac, bounds, buffer, args, pool=None):
+    """Solves every level count reachable within bounds
+
+    :param fun: fun(x, levels, *args) of x = (h, T, run counts...)
+    :param jac: jac(x, levels, *args)
+    :param bounds: ((h_low, h_high), (T_low, T_high), run count bounds...)
+    :param buffer: (a, b, NE) of fractional_levels
+    :param args:
+    :param pool: concurrent.futures Executor solving the pieces in
+        parallel, serial if None
+    :return pieces: list of (levels, sol)
+    """
+    (h_low, h_high), (T_low, T_high) = bounds[:2]
+    # The level count grows with h and shrinks with T
+    lowest = fractional_levels((h_low, T_high), *buffer)
+    highest = fractional_levels((h_high, T_low), *buffer)
+    level_counts = np.arange(max(np.ceil(lowest), 1), np.ceil(highest) + 1)
+
+    work = [(fun, jac, levels, bounds, buffer, args)
+            for levels in level_counts]
+    if isinstance(pool, Executor):
+        sols = list(pool.map(solve_piece, *zip(*work)))
+    else:
+        sols = [solve_piece(*piece) for piece in work]
+
+    return [(levels, sol) for levels, sol in zip(level_counts, sols)
+            if sol is not None]
+
+
+def piece_objective(x, levels, workload, kernel_args):
+    """CostFunction's workload cost at a fixed level count"""
+    return workload @ cost_components_at_levels(x[0], x[1], levels,
+                                                *kernel_args)
+
+
+def piece_objective_gradient(x, levels, workload, kernel_args):
+    return workload @ cost_components_jacobian_at_levels(
+        x[0], x[1], levels, *kernel_args)
+
+
+def tier_level_piece_objective(x, levels, workload, tiering, params):
+    """EndureTierLevelCost's workload cost at a fixed level count"""
+    return workload @ tier_level_components_at_levels(
+        x[0], x[1], levels, tiering, params)
+
+
+def tier_level_piece_objective_gradient(x, levels, workload, tiering,
+                                        params):
+    return workload @ tier_level_components_jac_at_levels(
+        x[0], x[1], levels, tiering, params)
+
+
+def qfixed_piece_objective(x, levels, workload, params):
+    """EndureQFixedCost's workload cost of x = (h, T, Q) at a fixed level
+    count"""
+    return workload @ qfixed_components_at_levels(
+        x[0], x[1], levels, x[2], params)
+
+
+def qfixed_piece_objective_gradient(x, levels, workload, params):
+    return workload @ qfixed_components_jac_at_levels(
+        x[0], x[1], levels, x[2], params)
+
+
+def yzhybrid_piece_objective(x, levels, workload, params):
+    """EndureYZHybridCost's workload cost of x = (h, T, Y, Z) at a fixed
+    level count"""
+    return workload @ yzhybrid_components_at_levels(
+        x[0], x[1], levels, x[2], x[3], params)
+
+
+def yzhybrid_piece_objective_gradient(x, levels, workload, params):
+    return workload @ yzhybrid_components_jac_at_levels(
+        x[0], x[1], levels, x[2], x[3], params)
+
+
+# Piece objective, its gradient, the true components and the run count
+# variables following (h, T) of the run count models
+RUN_COUNT_PIECES = {
+    Policy.QFixed: (qfixed_piece_objective, qfixed_piece_objective_gradient,
+                    qfixed_components, ('Q',)),
+    Policy.YZHybrid: (yzhybrid_piece_objective,
+                      yzhybrid_piece_objective_gradient, yzhybrid_components,
+                      ('Y', 'Z')),
+}
+
+
+class PiecewiseWorkloadTuning(object):
+    """
+    Nominal tuning of CostFunction, exact over the level counts
+    """
+
+    def __init__(self, cost_func, pool=None) -> None:
+        """Constructor
+
+        :param cost_func:
+        :param pool: Executor solving the pieces in parallel, serial if None
+        """
+        self.cost_func = cost_func
+        self.pool = pool
+
+    def get_nominal_design(self, is_leveling_policy=None, workload=None):
+        """Returns the nominal design over the same bounds as
+        NominalWorkloadTuning
+
+        :param is_leveling_policy: policy to tune, both if None
+        :param workload: dict with keys z0, z1, q, w, the cost function's
+            workload if None
+        :return design:
+        """
+        T_UPPER_LIM, T_LOWER_LIM = (100, 2)
+        one_mib_in_bits = 1024 * 1024 * 8
+        H_UPPER_LIM = ((self.cost_func.M / self.cost_func.N) -
+                       (one_mib_in_bits / self.cost_func.N))
+        bounds = ((0, H_UPPER_LIM), (T_LOWER_LIM, T_UPPER_LIM))
+        buffer = (self.cost_func.M, self.cost_func.N,
+                  self.cost_func.N * self.cost_func.E)
+
+        workload = workload_vector(self.cost_func, workload)
+
+        policies = []
+        if (is_leveling_policy is None) or (is_leveling_policy is True):
+            policies.append(True)  # Check leveling cost
+        if (is_leveling_policy is None) or (is_leveling_policy is False):
+            policies.append(False)  # Check tiering cost
+
+        min_cost = np.inf
+        design = {}
+        for policy in policies:
+            kernel_args = cost_args(self.cost_func, policy)
+            pieces = solve_pieces(
+                piece_objective, piece_objective_gradient, bounds, buffer,
+                (workload, kernel_args), self.pool)
+            for levels, sol in pieces:
+                h, T = sol.x
+                cost = workload @ cost_components(h, T, *kernel_args)
+                if cost < min_cost:
+                    design['T'] = T
+                    design['M_h'] = h
+                    design['M_filt'] = h * self.cost_func.N
+                    design['M_buff'] = self.cost_func.M - design['M_filt']
+                    design['is_leveling_policy'] = policy
+                    design['cost'] = cost
+                    design['levels'] = int(levels)
+                    design['exit_mode'] = sol.status
+                    min_cost = cost
+
+        return design
+
+
+class PiecewiseTierLevelTuning(object):
+    """
+    Nominal tuning of EndureTierLevelCost, exact over the level counts
+    """
+
+    def __init__(self, cost_model, pool=None) -> None:
+        """Constructor
+
+        :param cost_model: EndureTierLevelCost
+        :param pool: Executor solving the pieces in parallel, serial if None
+        """
+        self.cost_model = cost_model
+        self.pool = pool
+
+    def get_nominal_design(self, z0, z1, q, w, policy=None):
+        """Returns the nominal design
+
+        :param z0:
+        :param z1:
+        :param q:
+        :param w:
+        :param policy: Policy.Leveling or Policy.Tiering, both if None
+        :return design: dict with keys h, T, policy, cost and levels
+        """
+        one_mib_in_bits = 1024 * 1024 * 8
+        B, E, H, N, phi, s = self.cost_model.params()
+        bounds = ((0, H - (one_mib_in_bits / N)), (2, 100))
+        buffer = (H * N / BITS_IN_BYTES, N / BITS_IN_BYTES, N * E)
+        workload = np.array([z0, z1, q, w], dtype=np.float64)
+
+        if policy is None:
+            policies = [Policy.Leveling, Policy.Tiering]
+        else:
+            policies = [policy]
+
+        design = {'cost': np.inf}
+        for policy in policies:
+            params = (policy == Policy.Tiering, self.cost_model.params())
+            pieces = solve_pieces(
+                tier_level_piece_objective,
+                tier_level_piece_objective_gradient, bounds, buffer,
+                (workload,) + params, self.pool)
+            for levels, sol in pieces:
+                h, T = sol.x
+                cost = workload @ tier_level_components(h, T, *params)
+                if cost < design['cost']:
+                    design = {'h': h, 'T': T, 'policy': policy,
+                              'cost': cost, 'levels': int(levels)}
+
+        return design
+
+
+class PiecewiseHybridTuning(object):
+    """
+    Nominal tuning of EndureQFixedCost and EndureYZHybridCost, exact over
+    the level counts
+    """
+
+    def __init__(self, cost_model, pool=None) -> None:
+        """Constructor
+
+        :param cost_model: any of the cost_func models, only its parameters
+            are used so one instance serves every policy
+        :param pool: Executor solving the pieces in parallel, serial if None
+        """
+        self.cost_model = cost_model
+        self.pool = pool
+
+    def get_nominal_design(self, z0, z1, q, w, policy=None):
+        """Returns the nominal design
+
+        :param z0:
+        :param z1:
+        :param q:
+        :param w:
+        :param policy: Policy.QFixed or Policy.YZHybrid, both if None.
+            Policy.KHybrid is tuned by KHybridTuning
+        :return design: dict with keys h, T, the run counts (Q, or Y and
+            Z), policy, cost, levels and exit_mode
+        """
+        if policy == Policy.KHybrid:
+            return KHybridTuning(self.cost_model).get_nominal_design(
+                z0, z1, q, w)
+
+        one_mib_in_bits = 1024 * 1024 * 8
+        B, E, H, N, phi, s = params = self.cost_model.params()
+        T_LOWER_LIM, T_UPPER_LIM = (2, 100)
+        buffer = (H * N / BITS_IN_BYTES, N / BITS_IN_BYTES, N * E)
+        workload = np.array([z0, z1, q, w], dtype=np.float64)
+
+        if policy is None:
+            policies = list(RUN_COUNT_PIECES)
+        else:
+            policies = [policy]
+
+        design = {'cost': np.inf}
+        for policy in policies:
+            fun, jac, components, runs = RUN_COUNT_PIECES[policy]
+            bounds = (((0, H - (one_mib_in_bits / N)),
+                       (T_LOWER_LIM, T_UPPER_LIM))
+                      + ((1, T_UPPER_LIM - 1),) * len(runs))
+            pieces = solve_pieces(fun, jac, bounds, buffer,
+                                  (workload, params), self.pool)
+            for levels, sol in pieces:
+                cost = workload @ components(*sol.x, params)
+                if cost < design['cost']:
+                    design = {'h': sol.x[0], 'T': sol.x[1],
+                              'policy': policy, 'cost': cost,
+                              'levels': int(levels),
+                              'exit_mode': sol.status}
+                    design.update(zip(runs, sol.x[2:]))
+
+        return design
@@ -0,0 +1,178 @@
+"""
+Bounds on the best cost of each policy, to skip policies that cannot win
+
+Every component of CostFunction is monotone in h and in T, or bounded by a
+monotone expression, so its minimum over a cell [h_a, h_b] x [T_a, T_b] is
+bounded below from the cell's corners. Both the workload cost and the KL
+worst case cost are non-decreasing in each component, so the objective of
+the cells' component bounds bounds a policy's optimum from below, while
+the objective at a few feasible probe points bounds it from above.
+"""
+
+import numpy as np
+from numba import njit
+from lsm_tree.cost_function import cost_components, level_count
+from lsm_tree.nominal import cost_args
+from robust.workload_uncertainty import kl_worst_case
+
+
+@njit(cache=True, nogil=True)
+def component_lower_bounds(h_a, h_b, T_a, T_b, N, phi, s, B, E, M,
+                           is_leveling_policy):
+    """Lower bounds on [Z0, Z1, Q, W] over [h_a, h_b] x [T_a, T_b]
+
+    The fractional level count grows with h and shrinks with T. Z0 is
+    alpha(h) * T^(T / (T - 1)) * (1 - T^-L) / (T - 1), times T - 1 under
+    tiering, with alpha decreasing in h, the middle factor decreasing in T
+    and L at least ceil(L) at (h_a, T_b). The run probabilities of Z1 sum to
+    1 / (T - 1), so Z1 >= 1. (T - 1) / log(T) increases with T and
+    (T - 1) / (T * log(T)) decreases with it, which orders Q and W.
+    """
+    alpha = np.exp(-1 * h_b * (np.log(2) ** 2))
+    min_levels = level_count(h_a, T_b, N, E, M, True)
+    fill = 1 - (T_a ** (-min_levels))
+    if is_leveling_policy:
+        z0 = alpha * (T_b ** (T_b / (T_b - 1))) / (T_b - 1) * fill
+    else:
+        z0 = alpha * (T_a ** (T_a / (T_a - 1))) * fill
+
+    q = s * N / B
+    if is_leveling_policy:
+        q += level_count(h_a, T_b, N, E, M, False)
+        w = ((T_a - 1) * (1 + phi)
+             * level_count(h_a, T_a, N, E, M, False) / (2 * B))
+    else:
+        q += level_count(h_a, T_a, N, E, M, False) * (T_a - 1)
+        w = ((T_b - 1) * (1 + phi)
+             * level_count(h_a, T_b, N, E, M, False) / (T_b * B))
+
+    return np.array([z0, 1., q, w])
+
+
+@njit(cache=True, nogil=True)
+def cell_lower_bounds(hs, Ts, N, phi, s, B, E, M, is_leveling_policy):
+    """component_lower_bounds of every cell of the grid hs x Ts
+
+    :param hs: increasing cell edges in h
+    :param Ts: increasing cell edges in T
+    :return bounds: ((len(hs) - 1) * (len(Ts) - 1), 4)
+    """
+    num_h, num_T = len(hs) - 1, len(Ts) - 1
+    out = np.empty((num_h * num_T, 4))
+    for i in range(num_h):
+        for j in range(num_T):
+            out[i * num_T + j] = component_lower_bounds(
+                hs[i], hs[i + 1], Ts[j], Ts[j + 1], N, phi, s, B, E, M,
+                is_leveling_policy)
+
+    return out
+
+
+@njit(cache=True, nogil=True)
+def min_worst_case(components, workload, rho):
+    """Lowest kl_worst_case cost over the rows of components
+
+    Any workload p in the KL ball gives p @ c <= worst case cost of c. With p
+    the worst case workload of the row of lowest workload cost, rows are
+    visited by increasing p @ c until that exceeds the best found.
+
+    :param components: (n, 4)
+    :param workload:
+    :param rho:
+    """
+    start = np.argmin(components @ workload)
+    best, _, _, p = kl_worst_case(components[start], workload, rho)
+    lower = components @ p
+    for i in np.argsort(lower):
+        if lower[i] >= best:
+            break
+        best = min(best, kl_worst_case(components[i], workload, rho)[0])
+
+    return best
+
+
+class PolicyBounds(object):
+    """
+    Lower and upper bounds on the nominal and robust cost of the CostFunction
+    policies over the tuners' (h, T) bounds
+    """
+
+    def __init__(self, cost_func, h_cells=8, T_cells=16, probes=4) -> None:
+        """Constructor
+
+        :param cost_func:
+        :param h_cells: cells along h, evenly spaced
+        :param T_cells: cells along T, log spaced
+        :param probes: probe points per axis for the upper bound
+        """
+        self.cost_func = cost_func
+        self.h_cells = h_cells
+        self.T_cells = T_cells
+        self.probes = probes
+        self.cache = {}
+
+    @classmethod
+    def from_config(cls, cost_func, config):
+        """Bounds set up by the policy_pruning config section, None when the
+        section is missing or disabled
+
+        :param cost_func:
+        :param config:
+        """
+        settings = dict(config.get('policy_pruning') or {})
+        if not settings.pop('enabled', False):
+            return None
+        return cls(cost_func, **settings)
+
+    def h_upper_lim(self):
+        one_mib_in_bits = 1024 * 1024 * 8
+        return ((self.cost_func.M / self.cost_func.N) -
+                (one_mib_in_bits / self.cost_func.N))
+
+    def components(self, is_leveling_policy, h_low):
+        """Component lower bounds of the cells and components at the probe
+        points, both workload independent and cached
+
+        :param is_leveling_policy:
+        :param h_low: lower bound of h
+        :return lower, probes: (n, 4) arrays
+        """
+        kernel_args = cost_args(self.cost_func, is_leveling_policy)
+        cache_key = (kernel_args, h_low)
+        if cache_key not in self.cache:
+            T_UPPER_LIM, T_LOWER_LIM = (100, 2)
+            h_high = self.h_upper_lim()
+            lower = cell_lower_bounds(
+                np.linspace(h_low, h_high, self.h_cells + 1),
+                np.geomspace(T_LOWER_LIM, T_UPPER_LIM, self.T_cells + 1),
+                *kernel_args)
+            probes = np.array([
+                cost_components(h, T, *kernel_args)
+                for h in np.linspace(h_low, h_high, self.probes + 2)[1:-1]
+                for T in np.geomspace(T_LOWER_LIM, T_UPPER_LIM,
+                                      self.probes)])
+            self.cache[cache_key] = (lower, probes)
+
+        return self.cache[cache_key]
+
+    def nominal_bounds(self, is_leveling_policy, workload, h_low=0):
+        """(lower, upper) bounds on the policy's best workload cost
+
+        :param is_leveling_policy:
+        :param workload: (z0, z1, q, w) array
+        :param h_low: lower bound of h
+        """
+        lower, probes = self.components(is_leveling_policy, h_low)
+        return np.min(lower @ workload), np.min(probes @ workload)
+
+    def robust_bounds(self, is_leveling_policy, rho, workload, h_low=1):
+        """(lower, upper) bounds on the policy's best KL worst case cost
+
+        :param is_leveling_policy:
+        :param rho:
+        :param workload: (z0, z1, q, w) array
+        :param h_low: lower bound of h, 1 as in WorkloadUncertainty
+        """
+        lower, probes = self.components(is_leveling_policy, h_low)
+        return (min_worst_case(lower, workload, rho),
+                min_worst_case(probes, workload, rho))
@@ -0,0 +1,345 @@
+"""
+First order sensitivity of the nominal and robust designs of CostFunction
+
+At a solved design the KKT conditions hold on the active set: the bounds h
+or T sit on, and the level boundary where the fractional level count is an
+integer, which the optimum often rides because the cost jumps up when a
+level is added. Parametrizing the free directions by u (h and T, T alone
+along a level boundary, or nothing) the reduced gradient G(u, theta) is zero
+at the optimum, so by the implicit function theorem du/dtheta = -H^-1 B with
+H = dG/du and B = dG/dtheta, theta being (z0, z1, q, w) and rho for robust
+designs. The costs are smooth along a piece of fixed level count, so both
+derivatives are differences of the analytic gradient on the design's piece.
+The optimal cost moves by the envelope theorem: by the components for the
+nominal cost, and for the KL worst case by lambda * p / w for the workload
+and lambda for rho.
+
+IncrementalTuning keeps a solved design per policy with its sensitivities
+and predicts designs for nearby workloads, solving again only when the
+prediction leaves its piece, loses an active constraint or changes policy.
+"""
+
+import numpy as np
+from lsm_tree.cost_function import (cost_components_at_levels,
+                                    cost_components_jacobian_at_levels,
+                                    level_count)
+from lsm_tree.nominal import NominalWorkloadTuning, cost_args, workload_vector
+from robust.workload_uncertainty import WorkloadUncertainty, kl_worst_case
+
+# Distance to a bound or to an integer level count that counts as active
+ACTIVE_TOL = 1e-6
+T_BOUNDS = (2, 100)
+
+
+def objective_at_levels(x, levels, workload, rho, kernel_args):
+    """Nominal (rho None) or KL worst case cost of x = (h, T) and its
+    gradient, with the level count held at levels
+
+    :return obj, grad:
+    """
+    h, T = x
+    components = cost_components_at_levels(h, T, levels, *kernel_args)
+    jac = cost_components_jacobian_at_levels(h, T, levels, *kernel_args)
+    if rho is None:
+        return workload @ components, workload @ jac
+    obj, _, _, p = kl_worst_case(components, workload, rho)
+    return obj, p @ jac
+
+
+class DesignSensitivity(object):
+    """
+    Derivatives of a CostFunction design and its cost with respect to the
+    workload and rho
+    """
+
+    def __init__(self, cost_func, step=1e-6) -> None:
+        """Constructor
+
+        :param cost_func:
+        :param step: relative step of the finite differences of gradients
+        """
+        self.cost_func = cost_func
+        self.step = step
+
+    def h_bounds(self, rho):
+        one_mib_in_bits = 1024 * 1024 * 8
+        h_upper_lim = ((self.cost_func.M / self.cost_func.N) -
+                       (one_mib_in_bits / self.cost_func.N))
+        # WorkloadUncertainty keeps h >= 1
+        return (0 if rho is None else 1), h_upper_lim
+
+    def boundary_bits(self, T, levels):
+        """h at which the fractional level count equals levels, and its
+        derivative with respect to T"""
+        M, N, E = self.cost_func.M, self.cost_func.N, self.cost_func.E
+        grow = (T ** levels) - 1
+        h = (M - (N * E / grow)) / N
+        dh_dT = E * levels * (T ** (levels - 1)) / (grow ** 2)
+        return h, dh_dT
+
+    def active_set(self, design, rho):
+        """Pieces of the design's active set
+
+        :return levels, on_boundary, fixed: level count of the design's
+            piece, whether it rides the boundary where that count is reached,
+            and a dict of variable index to the bound it sits on
+        """
+        h, T = design['M_h'], design['T']
+        N, E, M = self.cost_func.N, self.cost_func.E, self.cost_func.M
+        frac = level_count(h, T, N, E, M, False)
+        on_boundary = abs(frac - np.round(frac)) < ACTIVE_TOL
+        levels = np.round(frac) if on_boundary else np.ceil(frac)
+
+        fixed = {}
+        for idx, (value, bounds) in enumerate(
+                ((h, self.h_bounds(rho)), (T, T_BOUNDS))):
+            for bound in bounds:
+                if abs(value - bound) < ACTIVE_TOL * max(1, abs(bound)):
+                    fixed[idx] = bound
+        if on_boundary and fixed:
+            # Either variable at a bound on the level boundary pins the other
+            fixed = {0: h, 1: T}
+        return levels, on_boundary and not fixed, fixed
+
+    def parametrize(self, design, rho):
+        """Maps u to x = (h, T) over the free directions of the active set
+
+        :return active, u0, to_x: active_set of the design, u at the design
+            and to_x(u) returning x and dx/du
+        """
+        levels, on_boundary, fixed = active = self.active_set(design, rho)
+        x0 = np.array([design['M_h'], design['T']], dtype=np.float64)
+
+        if on_boundary:
+            def to_x(u):
+                h, dh_dT = self.boundary_bits(u[0], levels)
+                return np.array([h, u[0]]), np.array([[dh_dT], [1.]])
+            return active, x0[1:], to_x
+
+        free = [idx for idx in (0, 1) if idx not in fixed]
+
+        def to_x(u):
+            x = x0.copy()
+            for idx, bound in fixed.items():
+                x[idx] = bound
+            x[free] = u
+            return x, np.eye(2)[:, free]
+        return active, x0[free], to_x
+
+    def get_sensitivity(self, design, workload=None, rho=None):
+        """Derivatives of a solved design
+
+        :param design: design of NominalWorkloadTuning (rho None) or
+            WorkloadUncertainty for the same cost function
+        :param workload: workload the design was solved for, the cost
+            function's if None
+        :param rho: radius the robust design was solved for, None for a
+            nominal design
+        :return sensitivity: dict with dx_dtheta, the (2, k) derivatives of
+            (h, T) with respect to theta = (z0, z1, q, w) and rho if robust,
+            dobj_dtheta, the (k,) derivatives of the optimal cost (obj for
+            robust designs), and the active set
+        """
+        workload = workload_vector(self.cost_func, workload)
+        kernel_args = cost_args(self.cost_func, design['is_leveling_policy'])
+        (levels, on_boundary, fixed), u0, to_x = self.parametrize(design, rho)
+        theta0 = workload if rho is None else np.append(workload, rho)
+
+        def reduced_gradient(u, theta):
+            x, dx_du = to_x(u)
+            rho = None if len(theta) == 4 else max(theta[4], 0)
+            _, grad = objective_at_levels(x, levels, theta[:4], rho,
+                                          kernel_args)
+            return grad @ dx_du
+
+        def difference(fun, z, idx):
+            step = self.step * max(1, abs(z[idx]))
+            up, down = z.copy(), z.copy()
+            up[idx] += step
+            down[idx] -= step
+            return (fun(up) - fun(down)) / (2 * step)
+
+        dx_dtheta = np.zeros((2, len(theta0)))
+        if len(u0) > 0:
+            H = np.column_stack([
+                difference(lambda u: reduced_gradient(u, theta0), u0, idx)
+                for idx in range(len(u0))])
+            B = np.column_stack([
+                difference(lambda theta: reduced_gradient(u0, theta),
+                           theta0, idx)
+                for idx in range(len(theta0))])
+            try:
+                du_dtheta = -np.linalg.solve(H, B)
+            except np.linalg.LinAlgError:
+                du_dtheta = np.full((len(u0), len(theta0)), np.nan)
+            dx_dtheta = to_x(u0)[1] @ du_dtheta
+
+        x0 = to_x(u0)[0]
+        components = cost_components_at_levels(*x0, levels, *kernel_args)
+        if rho is None:
+            dobj_dtheta = components
+        else:
+            _, lamb, eta, _ = kl_worst_case(components, workload, rho)
+            if not np.isfinite(lamb):
+                dobj_w = components  # rho = 0 leaves the nominal cost
+            elif lamb > 0:
+                # lamb * p / w, which stays finite where w is 0
+                dobj_w = lamb * np.exp((components - eta) / lamb)
+            else:
+                dobj_w = np.zeros(4)  # The worst case runs only max(c)
+            dobj_dtheta = np.append(dobj_w, lamb)
+
+        return {'dx_dtheta': dx_dtheta, 'dobj_dtheta': dobj_dtheta,
+                'x': x0, 'theta': theta0, 'levels': int(levels),
+                'on_level_boundary': on_boundary, 'fixed': fixed}
+
+
+class IncrementalTuning(object):
+    """
+    Re-tunes a drifting workload from first order predictions, solving from
+    scratch only when a prediction cannot be trusted
+    """
+
+    def __init__(self, cost_func, rho=None, max_change=0.1,
+                 nominal=None, robust=None) -> None:
+        """Constructor
+
+        :param cost_func:
+        :param rho: tune the KL worst case of this radius, nominal if None
+        :param max_change: largest relative change of h or T predicted
+            before solving again
+        :param nominal: NominalWorkloadTuning for the full solves
+        :param robust: WorkloadUncertainty for the full solves
+        """
+        self.cost_func = cost_func
+        self.rho = rho
+        self.max_change = max_change
+        self.nominal = nominal or NominalWorkloadTuning(cost_func)
+        self.robust = robust or WorkloadUncertainty(cost_func)
+        self.sensitivity = DesignSensitivity(cost_func)
+        self.anchors = {}
+        self.num_solves = 0
+        self.num_predictions = 0
+
+    def solve(self, workload, rho):
+        """Solves every policy and anchors the predictions there
+
+        :return design: best design, with 'predicted' False
+        """
+        workload_dict = dict(zip(('z0', 'z1', 'q', 'w'), workload))
+        self.anchors = {}
+        for policy in (True, False):
+            if rho is None:
+                design = self.nominal.get_nominal_design(
+                    policy, workload_dict)
+            else:
+                design = self.robust.get_robust_design(
+                    rho, policy, workload_dict)
+            self.anchors[policy] = (design, self.sensitivity.get_sensitivity(
+                design, workload_dict, rho))
+        self.num_solves += 1
+
+        design = dict(min((anchor for anchor, _ in self.anchors.values()),
+                          key=self.objective_key))
+        design['predicted'] = False
+        return design
+
+    def objective_key(self, design):
+        return design['cost'] if self.rho is None else design['obj']
+
+    def predict(self, policy, theta):
+        """First order design of one policy at theta
+
+        :return design, reason: reason is None when the prediction holds,
+            else why a full solve is needed
+        """
+        anchor, sens = self.anchors[policy]
+        delta = theta - sens['theta']
+        x = sens['x'] + sens['dx_dtheta'] @ delta
+        if not np.all(np.isfinite(x)):
+            return None, 'singular'
+        if np.any(np.abs(x - sens['x']) > self.max_change * sens['x']):
+            return None, 'step'
+
+        levels = sens['levels']
+        if sens['on_level_boundary']:
+            x[0] = self.sensitivity.boundary_bits(x[1], levels)[0]
+        h_bounds = self.sensitivity.h_bounds(self.rho)
+        for idx, (low, high) in enumerate((h_bounds, T_BOUNDS)):
+            if idx not in sens['fixed'] and not (low <= x[idx] <= high):
+                return None, 'bound'
+
+        N, E, M = self.cost_func.N, self.cost_func.E, self.cost_func.M
+        frac = level_count(x[0], x[1], N, E, M, False)
+        if not sens['on_level_boundary'] and np.ceil(frac) != levels:
+            return None, 'levels'
+
+        # The constraints must still hold the design in place: gradients
+        # pushing into the bounds, and increasing h (adding a level) still
+        # lowering the cost on a level boundary
+        kernel_args = cost_args(self.cost_func, policy)
+        workload, rho = theta[:4], (None if self.rho is None else theta[4])
+        _, grad = objective_at_levels(x, levels, workload, rho, kernel_args)
+        for idx, bound in sens['fixed'].items():
+            low, high = (h_bounds, T_BOUNDS)[idx]
+            if (bound == low and grad[idx] < 0) or \
+                    (bound == high and grad[idx] > 0):
+                return None, 'active set'
+        if sens['on_level_boundary'] and grad[0] > 0:
+            return None, 'active set'
+
+        components = cost_components_at_levels(*x, levels, *kernel_args)
+        design = dict(anchor)
+        design['T'] = x[1]
+        design['M_h'] = x[0]
+        design['M_filt'] = x[0] * self.cost_func.N
+        design['M_buff'] = self.cost_func.M - design['M_filt']
+        design['cost'] = workload @ components
+        if rho is not None:
+            design['obj'], design['lambda'], design['eta'], _ = \
+                kl_worst_case(components, workload, rho)
+            design['rho'] = rho
+        design.pop('diagnostics', None)
+        return design, None
+
+    def tune(self, workload=None):
+        """Returns the design for workload, predicted from the anchors when
+        possible
+
+        :param workload: dict with keys z0, z1, q, w, the cost function's
+            workload if None
+        :return design: with 'predicted' True for a prediction, and
+            'fallback' naming why a full solve ran
+        """
+        workload = workload_vector(self.cost_func, workload)
+        if not self.anchors:
+            design = self.solve(workload, self.rho)
+            design['fallback'] = 'first'
+            return design
+
+        theta = workload if self.rho is None else np.append(workload,
+                                                            self.rho)
+        predictions = {}
+        reason = None
+        for policy in self.anchors:
+            predictions[policy], reason = self.predict(policy, theta)
+            if reason is not None:
+                break
+
+        if reason is None:
+            best = min(predictions, key=lambda policy: self.objective_key(
+                predictions[policy]))
+            anchor_best = min(self.anchors, key=lambda policy:
+                              self.objective_key(self.anchors[policy][0]))
+            if best != anchor_best:
+                reason = 'policy'
+
+        if reason is not None:
+            design = self.solve(workload, self.rho)
+            design['fallback'] = reason
+            return design
+
+        self.num_predictions += 1
+        design = predictions[best]
+        design['predicted'] = True
+        return design
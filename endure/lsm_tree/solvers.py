@@ -0,0 +1,133 @@
+"""
+Solver backends for the tuners
+
+Every backend minimizes fun over box bounds, optionally with scipy
+constraints, and returns a scipy OptimizeResult whose status is 0 exactly
+when the solve succeeded, so exit_mode means the same whatever the backend.
+The tuners pass their minimizer_kwargs as {'method': backend name, 'bounds':
+..., 'tol': ...} and solve through minimize_with, alone or through
+MultiStart.
+"""
+
+import numpy as np
+from scipy.optimize import minimize, Bounds
+
+# Status of a failed solve whose backend reports failure with status 0
+FAILED_STATUS = 9
+
+SOLVERS = {}
+
+
+def register_solver(name):
+    """Registers a backend under name
+
+    A backend is called as backend(fun, jac, x0, args, bounds, constraints,
+    tol) and returns an OptimizeResult.
+
+    :param name:
+    """
+    def register(backend):
+        SOLVERS[name] = backend
+        return backend
+    return register
+
+
+def minimize_with(fun, jac, x0, args=(), method='slsqp', bounds=None,
+                  constraints=(), tol=1e-12):
+    """Minimizes with the backend registered as method
+
+    :param fun:
+    :param jac:
+    :param x0:
+    :param args:
+    :param method: name of a backend in SOLVERS, case insensitive
+    :param bounds: sequence of (low, high) pairs or scipy Bounds
+    :param constraints: scipy constraints, not every backend supports them
+    :param tol: convergence tolerance, mapped to each backend's options
+    :return sol:
+    """
+    method = method.lower()
+    if method not in SOLVERS:
+        raise ValueError(f'Unknown solver {method}, '
+                         f'expected one of {sorted(SOLVERS)}')
+    sol = SOLVERS[method](fun, jac, np.asarray(x0, dtype=np.float64), args,
+                          bounds, constraints, tol)
+    if sol.success:
+        sol.status = 0
+    elif sol.status == 0:
+        sol.status = FAILED_STATUS
+    sol.setdefault('njev', 0)
+    return sol
+
+
+def bound_arrays(bounds):
+    """Lower and upper bounds as arrays
+
+    :param bounds: scipy Bounds or a sequence of (low, high) pairs
+    """
+    if isinstance(bounds, Bounds):
+        return (np.asarray(bounds.lb, dtype=np.float64),
+                np.asarray(bounds.ub, dtype=np.float64))
+    lb, ub = np.asarray(bounds, dtype=np.float64).T
+    return lb, ub
+
+
+def unconstrained(name, constraints):
+    if constraints:
+        raise ValueError(f'Solver {name} does not support constraints')
+
+
+@register_solver('slsqp')
+def slsqp(fun, jac, x0, args, bounds, constraints, tol):
+    return minimize(fun=fun, jac=jac, x0=x0, args=args, method='SLSQP',
+                    bounds=bounds, constraints=constraints,
+                    options={'ftol': tol, 'maxiter': 100, 'disp': False})
+
+
+@register_solver('trust-constr')
+def trust_constr(fun, jac, x0, args, bounds, constraints, tol):
+    # The interior point iterates may leave plain bounds, where the cost
+    # models are undefined
+    bounds = Bounds(*bound_arrays(bounds), keep_feasible=True)
+    return minimize(fun=fun, jac=jac, x0=x0, args=args,
+                    method='trust-constr', bounds=bounds,
+                    constraints=constraints,
+                    options={'gtol': max(tol, 1e-10),
+                             'xtol': max(tol, 1e-10),
+                             'maxiter': 1000})
+
+
+@register_solver('l-bfgs-b')
+def l_bfgs_b(fun, jac, x0, args, bounds, constraints, tol):
+    # Projects every iterate onto the bounds
+    unconstrained('l-bfgs-b', constraints)
+    return minimize(fun=fun, jac=jac, x0=x0, args=args, method='L-BFGS-B',
+                    bounds=bounds, options={'ftol': tol, 'gtol': 1e-10})
+
+
+@register_solver('nelder-mead')
+def nelder_mead(fun, jac, x0, args, bounds, constraints, tol):
+    unconstrained('nelder-mead', constraints)
+    return minimize(fun=fun, x0=x0, args=args, method='Nelder-Mead',
+                    bounds=bounds,
+                    options={'fatol': tol, 'xatol': 1e-8,
+                             'maxfev': 2000 * len(x0)})
+
+
+@register_solver('grid-slsqp')
+def grid_slsqp(fun, jac, x0, args, bounds, constraints, tol,
+               points_per_axis=8):
+    """SLSQP from the best of x0 and a grid spanning the bounds, the grid
+    log spaced along axes whose lower bound is positive"""
+    lb, ub = bound_arrays(bounds)
+    axes = [np.geomspace(low, high, points_per_axis) if low > 0
+            else np.linspace(low, high, points_per_axis)
+            for low, high in zip(lb, ub)]
+    grid = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1)
+    grid = np.vstack([x0, grid.reshape(-1, len(x0))])
+
+    costs = np.array([fun(x, *args) for x in grid])
+    sol = slsqp(fun, jac, grid[np.argmin(costs)], args, bounds, constraints,
+                tol)
+    sol.nfev += len(grid)
+    return sol
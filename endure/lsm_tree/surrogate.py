@@ -0,0 +1,314 @@
+"""
+Surrogate tuner, a small MLP fitted to the designs of the exact tuners
+
+The network maps (z0, z1, q, w, rho, N, M / N) to (h, T) and the optimal
+objective of both policies, rho = 0 standing for the nominal design. h is
+learned as a fraction of its upper limit and T on a log scale over [2, 100],
+so every prediction lands inside the tuners' bounds. A lookup is one forward
+pass and one exact evaluation of each policy's predicted design; the policy
+with the lower verified objective wins. When that objective exceeds the
+predicted optimum by more than the threshold the prediction is discarded
+and the exact tuner solves the workload instead.
+"""
+
+import logging
+import os
+import numpy as np
+from lsm_tree.cost_function import CostFunction, cost_components
+from lsm_tree.nominal import NominalWorkloadTuning, cost_args, workload_vector
+from robust.workload_uncertainty import WorkloadUncertainty, kl_worst_case
+
+SURROGATE_FILE = 'surrogate.npz'
+POLICIES = (True, False)  # Leveling, tiering
+T_LOWER_LIM, T_UPPER_LIM = (2, 100)
+# Smallest operation share told apart on the log scale
+SHARE_FLOOR = 1e-4
+
+
+def h_bounds(N, M, rho):
+    """Bits per element bounds of the nominal (rho = 0) and robust tuners"""
+    one_mib_in_bits = 1024 * 1024 * 8
+    return (0 if rho == 0 else 1), (M / N) - (one_mib_in_bits / N)
+
+
+def surrogate_features(workload, rho, N, M):
+    """Network inputs, shape (n, 11), of (n, 4) workloads
+
+    The designs turn sharply as an operation's share nears 0, tiering's T
+    growing without bound as q vanishes, so the shares also enter on a log
+    scale.
+
+    :param workload: (z0, z1, q, w) or an (n, 4) array
+    :param rho: scalar or (n,)
+    :param N: scalar or (n,)
+    :param M: scalar or (n,)
+    """
+    workload = np.atleast_2d(workload)
+    x = np.empty((workload.shape[0], 11))
+    x[:, :4] = workload
+    x[:, 4:8] = np.log10(workload + SHARE_FLOOR)
+    x[:, 8] = np.log1p(rho)
+    x[:, 9] = np.log10(N)
+    x[:, 10] = np.divide(M, N)
+    return x
+
+
+def design_objective(h, T, rho, workload, kernel_args):
+    """Nominal cost (rho = 0) or KL worst case cost of (h, T), and the
+    nominal cost"""
+    components = cost_components(h, T, *kernel_args)
+    cost = workload @ components
+    if rho == 0:
+        return cost, cost
+    return kl_worst_case(components, workload, rho)[0], cost
+
+
+def init_mlp(sizes, rng):
+    """Weights and biases of a tanh MLP with layer widths sizes"""
+    return [(rng.normal(0, np.sqrt(1 / fan_in), (fan_in, fan_out)),
+             np.zeros(fan_out))
+            for fan_in, fan_out in zip(sizes[:-1], sizes[1:])]
+
+
+def mlp_forward(layers, x):
+    """Outputs of the MLP, tanh on every layer but the last"""
+    for W, b in layers[:-1]:
+        x = np.tanh((x @ W) + b)
+    W, b = layers[-1]
+    return (x @ W) + b
+
+
+def train_mlp(layers, X, Y, epochs, batch_size, lr, rng):
+    """Fits layers to the squared error on (X, Y) with Adam, in place
+
+    :return loss: mean squared error over the last epoch
+    """
+    moments = [[np.zeros_like(p) for p in layer for _ in (0, 1)]
+               for layer in layers]
+    beta1, beta2, eps = 0.9, 0.999, 1e-8
+    step = 0
+    for epoch in range(epochs):
+        order = rng.permutation(len(X))
+        loss = 0.
+        # Cosine decay of the learning rate over the epochs
+        epoch_lr = lr * 0.5 * (1 + np.cos(np.pi * epoch / epochs))
+        for start in range(0, len(X), batch_size):
+            batch = order[start:start + batch_size]
+            activations = [X[batch]]
+            for W, b in layers[:-1]:
+                activations.append(np.tanh((activations[-1] @ W) + b))
+            W, b = layers[-1]
+            error = ((activations[-1] @ W) + b) - Y[batch]
+            loss += np.sum(error ** 2)
+
+            step += 1
+            grad = 2 * error / error.size
+            for idx in range(len(layers) - 1, -1, -1):
+                W, b = layers[idx]
+                grads = (activations[idx].T @ grad, grad.sum(axis=0))
+                if idx > 0:
+                    grad = (grad @ W.T) * (1 - activations[idx] ** 2)
+                for k, (param, g) in enumerate(zip((W, b), grads)):
+                    m, v = moments[idx][2 * k], moments[idx][2 * k + 1]
+                    m *= beta1
+                    m += (1 - beta1) * g
+                    v *= beta2
+                    v += (1 - beta2) * (g ** 2)
+                    param -= (epoch_lr * (m / (1 - beta1 ** step))
+                              / (np.sqrt(v / (1 - beta2 ** step)) + eps))
+
+    return loss / Y.size
+
+
+def sample_designs(lsm, num_samples, rho=(0, 4), N=(1e7, 1e10),
+                   bits=(4, 20), solver='slsqp', seed=0):
+    """Solves random problems with the exact tuners
+
+    Workloads are uniform on the simplex, half of the problems are nominal
+    and the rest draw rho uniformly, N is log uniform and the bits per
+    element uniform.
+
+    :param lsm: lsm_tree_config, N and M are drawn
+    :param num_samples:
+    :param rho: (low, high) of the robust radius
+    :param N: (low, high) of the entries
+    :param bits: (low, high) of the total memory per entry
+    :param solver: backend of the tuners
+    :param seed:
+    :return X, Y: features and targets, Y holding per policy h as a fraction
+        of its upper limit, log(T) scaled to [0, 1] and log of the objective
+    """
+    rng = np.random.default_rng(seed)
+    workloads = rng.dirichlet(np.ones(4), num_samples)
+    rhos = np.where(rng.random(num_samples) < 0.5, 0,
+                    rng.uniform(*rho, num_samples))
+    Ns = np.exp(rng.uniform(*np.log(N), num_samples))
+    Ms = Ns * rng.uniform(*bits, num_samples)
+
+    Y = np.empty((num_samples, 3 * len(POLICIES)))
+    for idx in range(num_samples):
+        params = dict(lsm, N=Ns[idx], M=Ms[idx])
+        cf = CostFunction(**params, **dict(zip(('z0', 'z1', 'q', 'w'),
+                                               workloads[idx])))
+        if rhos[idx] == 0:
+            tuner = NominalWorkloadTuning(cf, solver=solver)
+            designs = [tuner.get_nominal_design(policy)
+                       for policy in POLICIES]
+        else:
+            tuner = WorkloadUncertainty(cf, solver=solver)
+            designs = [tuner.get_robust_design(rhos[idx], policy)
+                       for policy in POLICIES]
+        _, h_high = h_bounds(Ns[idx], Ms[idx], rhos[idx])
+        for k, design in enumerate(designs):
+            Y[idx, 3 * k:3 * (k + 1)] = (
+                design['M_h'] / h_high,
+                np.log(design['T'] / T_LOWER_LIM)
+                / np.log(T_UPPER_LIM / T_LOWER_LIM),
+                np.log(design.get('obj', design['cost'])))
+
+    return surrogate_features(workloads, rhos, Ns, Ms), Y
+
+
+class SurrogateTuning(object):
+    """
+    Design lookups from a trained surrogate, verified on the cost model
+    """
+
+    def __init__(self, path, threshold=0.01, solver='slsqp'):
+        """Loads a surrogate written by SurrogateTuning.build
+
+        :param path: directory holding the surrogate
+        :param threshold: largest relative excess of the verified objective
+            over the predicted optimum accepted before solving exactly
+        :param solver: backend of the exact tuners
+        """
+        self.path = path
+        self.threshold = threshold
+        self.solver = solver
+        self.logger = logging.getLogger("rlt_logger")
+        with np.load(os.path.join(path, SURROGATE_FILE)) as saved:
+            num_layers = int(saved['num_layers'])
+            self.layers = [(saved[f'W{idx}'], saved[f'b{idx}'])
+                           for idx in range(num_layers)]
+            self.x_mean, self.x_std = saved['x_mean'], saved['x_std']
+            self.y_mean, self.y_std = saved['y_mean'], saved['y_std']
+        self.num_lookups = 0
+        self.num_fallbacks = 0
+
+    @classmethod
+    def build(cls, path, X, Y, hidden=(64, 64), epochs=400, batch_size=64,
+              lr=3e-3, seed=0, **kwargs):
+        """Trains the surrogate on (X, Y) of sample_designs, saves it and
+        returns it opened
+
+        :param path: directory to write the surrogate to
+        :param X:
+        :param Y:
+        :param hidden: widths of the hidden layers
+        :param epochs:
+        :param batch_size:
+        :param lr: initial Adam learning rate
+        :param seed:
+        :param kwargs: passed to the constructor
+        """
+        rng = np.random.default_rng(seed)
+        x_mean, x_std = X.mean(axis=0), X.std(axis=0)
+        y_mean, y_std = Y.mean(axis=0), Y.std(axis=0)
+        # Constant columns, such as a single N, train and predict as zeros
+        x_std[x_std == 0] = 1
+        y_std[y_std == 0] = 1
+
+        layers = init_mlp((X.shape[1],) + tuple(hidden) + (Y.shape[1],), rng)
+        loss = train_mlp(layers, (X - x_mean) / x_std, (Y - y_mean) / y_std,
+                         epochs, batch_size, lr, rng)
+        logging.getLogger("rlt_logger").info(
+            f'Surrogate trained on {len(X)} designs, loss {loss:.2e}')
+
+        os.makedirs(path, exist_ok=True)
+        weights = {}
+        for idx, (W, b) in enumerate(layers):
+            weights[f'W{idx}'], weights[f'b{idx}'] = W, b
+        np.savez(os.path.join(path, SURROGATE_FILE), num_layers=len(layers),
+                 x_mean=x_mean, x_std=x_std, y_mean=y_mean, y_std=y_std,
+                 **weights)
+
+        return cls(path, **kwargs)
+
+    def predict(self, cost_func, rho=0, workload=None):
+        """Predicted designs of both policies, without verification
+
+        :param cost_func: CostFunction giving N, M and the other parameters
+        :param rho: KL radius, 0 for the nominal design
+        :param workload: dict with keys z0, z1, q, w, the cost function's
+            workload if None
+        :return predictions: list of (is_leveling_policy, h, T, predicted
+            objective)
+        """
+        workload = workload_vector(cost_func, workload)
+        x = surrogate_features(workload, rho, cost_func.N, cost_func.M)[0]
+        y = (mlp_forward(self.layers, (x - self.x_mean) / self.x_std)
+             * self.y_std) + self.y_mean
+
+        h_low, h_high = h_bounds(cost_func.N, cost_func.M, rho)
+        predictions = []
+        for k, policy in enumerate(POLICIES):
+            h_frac, T_frac, log_obj = y[3 * k:3 * (k + 1)]
+            h = min(max(h_frac * h_high, h_low), h_high)
+            T = T_LOWER_LIM * np.exp(min(max(T_frac, 0), 1) * np.log(
+                T_UPPER_LIM / T_LOWER_LIM))
+            predictions.append((policy, h, T, np.exp(log_obj)))
+        return predictions
+
+    def get_design(self, cost_func, rho=0, workload=None):
+        """Returns the verified surrogate design, or the exact tuner's when
+        the surrogate's regresses
+
+        :param cost_func:
+        :param rho: KL radius, 0 for the nominal design
+        :param workload: dict with keys z0, z1, q, w, the cost function's
+            workload if None
+        :return design: dict with keys T, M_h, M_filt, M_buff,
+            is_leveling_policy, cost, obj, predicted and regression, the
+            relative excess of the surrogate's verified objective over its
+            predicted optimum
+        """
+        self.num_lookups += 1
+        workload_arr = workload_vector(cost_func, workload)
+        best, reference = None, np.inf
+        for policy, h, T, predicted_obj in self.predict(cost_func, rho,
+                                                        workload):
+            reference = min(reference, predicted_obj)
+            obj, cost = design_objective(h, T, rho, workload_arr,
+                                         cost_args(cost_func, policy))
+            if best is None or obj < best[0]:
+                best = (obj, cost, policy, h, T)
+
+        obj, cost, policy, h, T = best
+        regression = (obj / reference) - 1
+        if regression > self.threshold:
+            self.num_fallbacks += 1
+            design = self.solve(cost_func, rho, workload, h, T)
+        else:
+            design = {'T': T, 'M_h': h, 'M_filt': h * cost_func.N,
+                      'M_buff': cost_func.M - (h * cost_func.N),
+                      'is_leveling_policy': policy, 'cost': cost,
+                      'obj': obj, 'predicted': True}
+        design['regression'] = regression
+        return design
+
+    def solve(self, cost_func, rho, workload, h, T):
+        """Exact design of both policies, the robust ones started from the
+        surrogate's best prediction"""
+        if rho == 0:
+            design = NominalWorkloadTuning(
+                cost_func, solver=self.solver).get_nominal_design(
+                    None, workload)
+            design['obj'] = design['cost']
+        else:
+            tuner = WorkloadUncertainty(cost_func, solver=self.solver)
+            seed = {'M_filt': h * cost_func.N, 'T': T}
+            design = min((tuner.get_robust_design(rho, policy, workload, seed)
+                          for policy in POLICIES),
+                         key=lambda design: design['obj'])
+        design['predicted'] = False
+        return design
@@ -0,0 +1,341 @@
+"""
+Precomputed designs over the workload simplex
+
+An atlas holds one slice per (rho, bits per element), rho = 0 standing for
+the nominal designs. Each slice solves both policies on a lattice of the
+simplex (z0, z1, q, w), with integer coordinates summing to resolution.
+Every refinement level halves the edge length wherever the designs at the
+two ends of an edge differ, either in policy, by more than tol_h bits
+per element, or by more than tol_T in log(T). Midpoints land on the finer
+lattice, so after levels rounds the mesh is dense only around the policy
+switches and the level count jumps.
+
+Slices are saved after every chunk of solves together with the refinement
+level of each point, so a killed build resumes from the last chunk. A query
+interpolates (h, T) of each policy from the nearest lattice points through
+a KD-tree, keeps the policy with the lower exact objective and optionally
+polishes it with the tuner's objective.
+"""
+
+import glob
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from scipy.spatial import cKDTree
+from lsm_tree.cost_function import CostFunction
+from lsm_tree.nominal import (NominalWorkloadTuning, nominal_objective,
+                              nominal_objective_gradient)
+from lsm_tree.solvers import minimize_with
+from lsm_tree.surrogate import POLICIES, design_objective, h_bounds
+from robust.workload_uncertainty import (WorkloadUncertainty,
+                                         worst_case_objective,
+                                         worst_case_objective_gradient)
+
+SLICE_FILE = 'slice_rho{rho:g}_bits{bits:g}.npz'
+TMP_SUFFIX = '.tmp.npz'
+# Per policy design fields of a slice
+FIELDS = ('h', 'T', 'obj', 'cost')
+LSM_KEYS = ('N', 'phi', 's', 'B', 'E')
+T_BOUNDS = (2, 100)
+
+
+def lattice(resolution, scale):
+    """Integer points of the simplex with coordinates summing to
+    resolution, multiplied by scale"""
+    points = [(a, b, c, resolution - a - b - c)
+              for a in range(resolution + 1)
+              for b in range(resolution + 1 - a)
+              for c in range(resolution + 1 - a - b)]
+    return np.array(points, dtype=np.int64) * scale
+
+
+def lattice_workloads(coords, total, margin):
+    """Workloads of lattice coordinates, keeping every share >= margin"""
+    return margin + ((1 - (4 * margin)) * coords / total)
+
+
+def solve_workloads(lsm, rho, bits, workloads, solver='slsqp'):
+    """Designs of both policies at each workload
+
+    :param lsm: lsm_tree_config, M is set from bits
+    :param rho: KL radius, 0 for the nominal designs
+    :param bits: total memory per entry
+    :param workloads: (n, 4) array
+    :param solver:
+    :return designs: (n, len(POLICIES), len(FIELDS))
+    """
+    designs = np.empty((len(workloads), len(POLICIES), len(FIELDS)))
+    params = dict(lsm, M=bits * lsm['N'])
+    for idx, workload in enumerate(workloads):
+        cf = CostFunction(**params,
+                          **dict(zip(('z0', 'z1', 'q', 'w'), workload)))
+        for k, policy in enumerate(POLICIES):
+            if rho == 0:
+                design = NominalWorkloadTuning(
+                    cf, solver=solver).get_nominal_design(policy)
+                design['obj'] = design['cost']
+            else:
+                design = WorkloadUncertainty(
+                    cf, solver=solver).get_robust_design(rho, policy)
+            designs[idx, k] = [design['M_h'], design['T'], design['obj'],
+                               design['cost']]
+
+    return designs
+
+
+def refine(coords, designs, spacing, tol_h, tol_T):
+    """Midpoints of the lattice edges of length spacing whose designs
+    differ
+
+    :param coords: (n, 4) integer coordinates
+    :param designs: (n, len(POLICIES), len(FIELDS))
+    :param spacing: even edge length in integer coordinates
+    :param tol_h:
+    :param tol_T:
+    :return midpoints: (m, 4) coordinates not in coords
+    """
+    index = {tuple(point): idx for idx, point in enumerate(coords)}
+    best = np.argmin(designs[:, :, FIELDS.index('obj')], axis=1)
+    midpoints = set()
+    for idx, point in enumerate(coords):
+        for i in range(4):
+            for j in range(4):
+                if i == j:
+                    continue
+                step = np.zeros(4, dtype=np.int64)
+                step[i], step[j] = spacing, -spacing
+                other = index.get(tuple(point + step))
+                if other is None or other < idx:
+                    continue
+                policy = best[idx]
+                h, T = designs[idx, policy, :2]
+                other_h, other_T = designs[other, policy, :2]
+                if (best[other] != policy or abs(h - other_h) > tol_h
+                        or abs(np.log(T / other_T)) > tol_T):
+                    midpoint = tuple(point + (step // 2))
+                    if midpoint not in index:
+                        midpoints.add(midpoint)
+
+    return np.array(sorted(midpoints), dtype=np.int64).reshape(-1, 4)
+
+
+class AtlasSlice(object):
+    """
+    Designs of one (rho, bits) slice and their KD-tree
+    """
+
+    def __init__(self, filepath):
+        """Loads a slice written by TuningAtlas.build
+
+        :param filepath:
+        """
+        with np.load(filepath) as saved:
+            self.rho = float(saved['rho'])
+            self.bits = float(saved['bits'])
+            self.total = int(saved['total'])
+            self.margin = float(saved['margin'])
+            self.levels_done = int(saved['levels_done'])
+            self.coords = saved['coords']
+            self.point_levels = saved['point_levels']
+            self.designs = saved['designs']
+            self.lsm = {key: saved[key].item() for key in LSM_KEYS}
+        self.workloads = lattice_workloads(self.coords, self.total,
+                                           self.margin)
+        self.tree = cKDTree(self.workloads)
+
+
+class TuningAtlas(object):
+    """
+    Design lookups from an atlas of precomputed designs
+    """
+
+    def __init__(self, path, neighbours=4, solver='slsqp'):
+        """Opens every slice of an atlas
+
+        :param path: directory holding the slices
+        :param neighbours: lattice points a query interpolates from
+        :param solver: backend of the polish
+        """
+        self.path = path
+        self.neighbours = neighbours
+        self.solver = solver
+        self.slices = {}
+        for filepath in sorted(glob.glob(os.path.join(path, '*.npz'))):
+            if filepath.endswith(TMP_SUFFIX):
+                continue
+            atlas_slice = AtlasSlice(filepath)
+            self.slices[(atlas_slice.rho, atlas_slice.bits)] = atlas_slice
+
+    @classmethod
+    def build(cls, path, lsm, rhos, bits, resolution=8, levels=3,
+              margin=0.01, tol_h=1.0, tol_T=0.25, solver='slsqp',
+              max_workers=1, chunk_size=32, **kwargs):
+        """Builds, or resumes building, every slice and returns the opened
+        atlas
+
+        :param path: directory to write the slices to
+        :param lsm: lsm_tree_config, M is set from each bits
+        :param rhos: KL radii, 0 for the nominal designs
+        :param bits: total memory per entry of each slice
+        :param resolution: coordinate sum of the initial lattice
+        :param levels: refinement levels
+        :param margin: smallest share of each operation
+        :param tol_h: largest change of h along a refined edge
+        :param tol_T: largest change of log(T) along a refined edge
+        :param solver: backend of the tuners
+        :param max_workers: processes solving chunks, inline if 1
+        :param chunk_size: workloads per chunk, and per saved checkpoint
+        :param kwargs: passed to the constructor
+        """
+        os.makedirs(path, exist_ok=True)
+        pool = ProcessPoolExecutor(max_workers) if max_workers != 1 else None
+        try:
+            for rho in rhos:
+                for bits_per_entry in bits:
+                    cls.build_slice(path, lsm, rho, bits_per_entry,
+                                    resolution, levels, margin, tol_h, tol_T,
+                                    solver, pool, chunk_size)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        return cls(path, solver=solver, **kwargs)
+
+    @staticmethod
+    def build_slice(path, lsm, rho, bits, resolution, levels, margin, tol_h,
+                    tol_T, solver, pool, chunk_size):
+        """Builds one slice, resuming from its file when it exists"""
+        logger = logging.getLogger("rlt_logger")
+        filepath = os.path.join(path, SLICE_FILE.format(rho=rho, bits=bits))
+        total = resolution * (2 ** levels)
+        state = {'rho': rho, 'bits': bits, 'total': total, 'margin': margin,
+                 'levels_done': -1,
+                 'coords': np.empty((0, 4), dtype=np.int64),
+                 'point_levels': np.empty(0, dtype=np.int64),
+                 'designs': np.empty((0, len(POLICIES), len(FIELDS))),
+                 **{key: lsm[key] for key in LSM_KEYS}}
+        if os.path.exists(filepath):
+            with np.load(filepath) as saved:
+                if int(saved['total']) == total and \
+                        float(saved['margin']) == margin:
+                    state.update({key: saved[key] for key in saved.files})
+                    state['levels_done'] = int(state['levels_done'])
+
+        def save():
+            # Written aside and renamed, so a kill never leaves a torn file
+            tmp_path = filepath + TMP_SUFFIX
+            np.savez(tmp_path, **state)
+            os.replace(tmp_path, filepath)
+
+        for level in range(state['levels_done'] + 1, levels + 1):
+            # Points of this level depend only on the levels before it, so
+            # a partly solved level recomputes the same candidates
+            earlier = state['point_levels'] < level
+            if level == 0:
+                candidates = lattice(resolution, 2 ** levels)
+            else:
+                candidates = refine(
+                    state['coords'][earlier], state['designs'][earlier],
+                    2 ** (levels - level + 1), tol_h, tol_T)
+            solved = {tuple(point) for point in state['coords']}
+            pending = np.array([point for point in candidates
+                                if tuple(point) not in solved],
+                               dtype=np.int64).reshape(-1, 4)
+
+            chunks = [pending[start:start + chunk_size]
+                      for start in range(0, len(pending), chunk_size)]
+            if pool is None:
+                results = ((chunk, solve_workloads(
+                    lsm, rho, bits, lattice_workloads(chunk, total, margin),
+                    solver)) for chunk in chunks)
+            else:
+                futures = {pool.submit(
+                    solve_workloads, lsm, rho, bits,
+                    lattice_workloads(chunk, total, margin), solver): chunk
+                    for chunk in chunks}
+                results = ((futures[future], future.result())
+                           for future in as_completed(futures))
+            for chunk, designs in results:
+                state['coords'] = np.vstack([state['coords'], chunk])
+                state['point_levels'] = np.append(
+                    state['point_levels'], np.full(len(chunk), level))
+                state['designs'] = np.vstack([state['designs'], designs])
+                save()
+
+            state['levels_done'] = level
+            save()
+            logger.info(f'Atlas slice rho {rho:g}, bits {bits:g}: level '
+                        f'{level} solved {len(pending)} workloads, '
+                        f'{len(state["coords"])} in total')
+
+    def get_slice(self, rho, bits):
+        """Slice nearest to (rho, bits)"""
+        return min(self.slices.values(),
+                   key=lambda s: (abs(s.rho - rho), abs(s.bits - bits)))
+
+    def get_design(self, workload, rho=0, bits=None, polish=False):
+        """Returns the design interpolated from the atlas
+
+        :param workload: dict with keys z0, z1, q, w
+        :param rho: KL radius, 0 for the nominal design. Slices are matched
+            to the nearest stored (rho, bits), while the objective, and the
+            polish, use the requested ones
+        :param bits: total memory per entry, the first slice's if None
+        :param polish: solve from the interpolated designs with the tuner's
+            objective
+        :return design: dict with keys T, M_h, M_filt, M_buff,
+            is_leveling_policy, cost, obj, slice_rho and slice_bits
+        """
+        workload = np.array([workload['z0'], workload['z1'], workload['q'],
+                             workload['w']], dtype=np.float64)
+        atlas_slice = self.get_slice(
+            rho, next(iter(self.slices))[1] if bits is None else bits)
+        bits = atlas_slice.bits if bits is None else bits
+        lsm = atlas_slice.lsm
+        N, M = lsm['N'], bits * lsm['N']
+        h_low, h_high = h_bounds(N, M, rho)
+
+        # Inverse distance weights of the nearest lattice points, h and
+        # log(T) interpolated per policy
+        dist, idx = atlas_slice.tree.query(
+            workload, k=min(self.neighbours, len(atlas_slice.workloads)))
+        dist, idx = np.atleast_1d(dist), np.atleast_1d(idx)
+        if dist[0] == 0:
+            weights = (dist == 0).astype(np.float64)
+        else:
+            weights = 1 / dist
+        weights /= weights.sum()
+        neighbours = atlas_slice.designs[idx]
+
+        best = None
+        for k, policy in enumerate(POLICIES):
+            kernel_args = (N, lsm['phi'], lsm['s'], lsm['B'], lsm['E'], M,
+                           policy)
+            x = np.array([
+                min(max(weights @ neighbours[:, k, 0], h_low), h_high),
+                np.exp(weights @ np.log(neighbours[:, k, 1]))])
+            if polish:
+                x = self.polish(x, rho, workload, kernel_args,
+                                ((h_low, h_high), T_BOUNDS))
+            obj, cost = design_objective(*x, rho, workload, kernel_args)
+            if best is None or obj < best[0]:
+                best = (obj, cost, policy, x)
+
+        obj, cost, policy, (h, T) = best
+        return {'T': T, 'M_h': h, 'M_filt': h * N, 'M_buff': M - (h * N),
+                'is_leveling_policy': policy, 'cost': cost, 'obj': obj,
+                'slice_rho': atlas_slice.rho, 'slice_bits': atlas_slice.bits}
+
+    def polish(self, x, rho, workload, kernel_args, bounds):
+        """Solves from x with the nominal or robust tuner's objective,
+        keeping x if the solve ends higher"""
+        if rho == 0:
+            fun, jac = nominal_objective, nominal_objective_gradient
+            args = (workload, kernel_args)
+        else:
+            fun, jac = worst_case_objective, worst_case_objective_gradient
+            args = (rho, workload, kernel_args)
+        sol = minimize_with(fun, jac, x, args, method=self.solver,
+                            bounds=bounds, tol=1e-12)
+        return sol.x if sol.fun <= fun(x, *args) else x
@@ -1,16 +1,49 @@
+#!/usr/bin/env python3
 """
 This class implements the driver program for the robust-lsm-trees
 project
 """
 
+import argparse
+import importlib
 import os
 import logging
 import sys
 import yaml
-from jobs.create_workload_uncertainty_tunings import CreateWorkloadUncertaintyTunings
-from jobs.create_workload_nominal_tunings import CreateNominalWorkloadTunings
-from jobs.sample_uncertain_workloads import SampleUncertainWorkloads
-from jobs.run_experiments import ExperimentDriver
+from jobs.run_experiments import EXPERIMENTS
+
+# Job name -> (module, class), imported only when a job runs so a single job
+# (or --list) does not pay for loading every other job's dependencies
+JOBS = {
+    'create_workload_uncertainty_tunings': (
+        'jobs.create_workload_uncertainty_tunings',
+        'CreateWorkloadUncertaintyTunings'),
+    'run_experiments': ('jobs.run_experiments', 'ExperimentDriver'),
+    'sample_uncertain_workloads': (
+        'jobs.sample_uncertain_workloads', 'SampleUncertainWorkloads'),
+    'create_workload_nominal_tunings': (
+        'jobs.create_workload_nominal_tunings',
+        'CreateNominalWorkloadTunings'),
+    'benchmark_cost_models': (
+        'jobs.benchmark_cost_models', 'BenchmarkCostModels'),
+    'benchmark_solvers': ('jobs.benchmark_solvers', 'BenchmarkSolvers'),
+    'build_cost_surface': ('jobs.build_cost_surface', 'BuildCostSurface'),
+    'train_surrogate': ('jobs.train_surrogate', 'TrainSurrogate'),
+    'build_tuning_atlas': ('jobs.build_tuning_atlas', 'BuildTuningAtlas'),
+    'create_batch_tunings': (
+        'jobs.create_batch_tunings', 'CreateBatchTunings'),
+    'warm_up_cost_models': (
+        'jobs.warm_up_cost_models', 'WarmUpCostModels'),
+}
+
+
+def load_job(job_name):
+    """Imports and returns the class implementing a job
+
+    :param job_name: key of JOBS
+    """
+    module_name, class_name = JOBS[job_name]
+    return getattr(importlib.import_module(module_name), class_name)
 
 
 class RobustLSMTreesDriver(object):
@@ -48,36 +81,66 @@ class RobustLSMTreesDriver(object):
         # Get job list
         job_list = self.config['jobs']['job_list']
 
+        # Compile the cost models once, up front
+        if self.config['app'].get('warm_up', False):
+            load_job('warm_up_cost_models')(self.config).run()
+
         # Execute jobs
         for job_name in job_list:
-            if job_name == "create_workload_uncertainty_tunings":
-                job = CreateWorkloadUncertaintyTunings(self.config)
-                job.run()
-            if job_name == "run_experiments":
-                job = ExperimentDriver(self.config)
-                job.run()
-            if job_name == "sample_uncertain_workloads":
-                job = SampleUncertainWorkloads(self.config)
-                job.run()
-            if job_name == 'create_workload_nominal_tunings':
-                job = CreateNominalWorkloadTunings(self.config)
-                job.run()
+            if job_name not in JOBS:
+                self.logger.warning(f'Unknown job: {job_name}')
+                continue
+            job = load_job(job_name)(self.config)
+            job.run()
 
         self.logger.info("Finished")
 
 
-if __name__ == "__main__":
+def list_registry(config):
+    """Prints the registered jobs and experiments, marking the ones enabled
+    in the config with '*'
 
-    # Load configuration
-    if len(sys.argv) > 1:
-        config_yaml_path = sys.argv[1]
-    else:
-        dirname = os.path.dirname(__file__)
-        config_yaml_path = os.path.join(dirname, 'config/robust-lsm-trees.yaml')
+    :param config:
+    """
+    job_list = config['jobs']['job_list'] or []
+    expt_list = config['experiments']['expt_list'] or []
+    print('jobs:')
+    for job_name in JOBS:
+        print(f"  {'*' if job_name in job_list else ' '} {job_name}")
+    print('experiments:')
+    for expt_name in EXPERIMENTS:
+        print(f"  {'*' if expt_name in expt_list else ' '} {expt_name}")
+
+
+def main(argv=None):
+    """Command line entry point
 
-    with open(config_yaml_path) as f:
+    :param argv: arguments, defaults to sys.argv[1:]
+    """
+    dirname = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description='Endure driver')
+    parser.add_argument(
+        'config', nargs='?',
+        default=os.path.join(dirname, 'config/robust-lsm-trees.yaml'),
+        help='YAML configuration file')
+    parser.add_argument(
+        '--list', action='store_true',
+        help='list the available jobs and experiments and exit')
+    args = parser.parse_args(argv)
+
+    # Load configuration
+    with open(args.config) as f:
         config = yaml.load(f, Loader=yaml.FullLoader)
 
+    if args.list:
+        list_registry(config)
+        return 0
+
     # Start driver
     driver = RobustLSMTreesDriver(config)
     driver.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
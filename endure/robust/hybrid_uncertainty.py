@@ -0,0 +1,380 @@
+"""
+Robust tuning of the cost models in lsm_tree.cost_func
+
+Every model exposes [Z0, Z1, Q, W] and their Jacobian through module level
+kernels, so the KL dual of WorkloadUncertainty carries over unchanged: the
+worst case cost of a design is kl_worst_case of its components and, by the
+envelope theorem, its gradient is the worst case workload times the
+Jacobian. Leveling, tiering, QFixed and YZHybrid are solved over their
+continuous variables keeping every run count within [1, T - 1], one level
+count at a time through lsm_tree.piecewise.solve_pieces: across the jumps
+of ceil(L) SLSQP mostly ends at its iteration limit. Without pieces they
+are solved from a few starts with any lsm_tree.solvers backend.
+
+KHybrid has one integer run cap per level. At a fixed (h, T) the caps
+minimizing the worst case cost are found by best responses, the nominal
+caps of khybrid_runs under the worst case workload of the previous caps,
+followed by a search over single +-1 moves, and (h, T) are searched over
+integer T and an h grid as in KHybridTuning.
+"""
+
+import logging
+import numpy as np
+from numba import njit
+from scipy.optimize import LinearConstraint
+from lsm_tree.cost_func import (
+    BITS_IN_BYTES, Policy, tier_level_components, tier_level_components_jac,
+    tier_level_components_at_levels, tier_level_components_jac_at_levels,
+    qfixed_components, qfixed_components_jac, qfixed_components_at_levels,
+    qfixed_components_jac_at_levels, yzhybrid_components,
+    yzhybrid_components_jac, yzhybrid_components_at_levels,
+    yzhybrid_components_jac_at_levels, khybrid_components)
+from lsm_tree.khybrid_tuning import khybrid_runs
+from lsm_tree.multi_start import minimize_from
+from lsm_tree.grid_search import polish_grid
+from lsm_tree.piecewise import solve_pieces
+from lsm_tree.solvers import bound_arrays
+from robust.workload_uncertainty import kl_worst_case
+
+# Components kernel, Jacobian kernel, arguments between x and params, and
+# the run count variables following (h, T) of the continuous models
+MODEL_KERNELS = {
+    Policy.Leveling: (tier_level_components, tier_level_components_jac,
+                      (False,), ()),
+    Policy.Tiering: (tier_level_components, tier_level_components_jac,
+                     (True,), ()),
+    Policy.QFixed: (qfixed_components, qfixed_components_jac, (), ('Q',)),
+    Policy.YZHybrid: (yzhybrid_components, yzhybrid_components_jac, (),
+                      ('Y', 'Z')),
+}
+# The same kernels with the level count held fixed, called as
+# kernel(h, T, levels, runs..., *arguments)
+PIECE_KERNELS = {
+    Policy.Leveling: (tier_level_components_at_levels,
+                      tier_level_components_jac_at_levels),
+    Policy.Tiering: (tier_level_components_at_levels,
+                     tier_level_components_jac_at_levels),
+    Policy.QFixed: (qfixed_components_at_levels,
+                    qfixed_components_jac_at_levels),
+    Policy.YZHybrid: (yzhybrid_components_at_levels,
+                      yzhybrid_components_jac_at_levels),
+}
+
+
+def model_worst_case_objective(x, rho, workload, kernels, kernel_args):
+    """Worst case cost of x = (h, T, runs...) over the KL ball of radius rho
+
+    :param x:
+    :param rho:
+    :param workload: (z0, z1, q, w) array
+    :param kernels: (components, jacobian) kernels of the model
+    :param kernel_args: kernel arguments following x
+    """
+    if np.any(np.isnan(x)):
+        return np.finfo(np.float64).max
+
+    components = kernels[0](*x, *kernel_args)
+    return kl_worst_case(components, workload, rho)[0]
+
+
+def model_worst_case_objective_gradient(x, rho, workload, kernels,
+                                        kernel_args):
+    """Gradient of model_worst_case_objective, the gradient of the cost
+    under the worst case workload"""
+    if np.any(np.isnan(x)):
+        return np.zeros(len(x))
+
+    components = kernels[0](*x, *kernel_args)
+    p = kl_worst_case(components, workload, rho)[3]
+    return p @ kernels[1](*x, *kernel_args)
+
+
+def piece_worst_case_objective(x, levels, rho, workload, kernels,
+                               kernel_args):
+    """model_worst_case_objective with the level count held at levels"""
+    components = kernels[0](x[0], x[1], levels, *x[2:], *kernel_args)
+    return kl_worst_case(components, workload, rho)[0]
+
+
+def piece_worst_case_objective_gradient(x, levels, rho, workload, kernels,
+                                        kernel_args):
+    components = kernels[0](x[0], x[1], levels, *x[2:], *kernel_args)
+    p = kl_worst_case(components, workload, rho)[3]
+    return p @ kernels[1](x[0], x[1], levels, *x[2:], *kernel_args)
+
+
+@njit(cache=True, nogil=True)
+def khybrid_robust_runs(h, T, workload, rho, params):
+    """Run caps with the lowest KL worst case cost at (h, T)
+
+    :param h:
+    :param T: integer size ratio
+    :param workload:
+    :param rho:
+    :param params: (B, E, H, N, phi, s)
+    :return K, cost:
+    """
+    best_K = khybrid_runs(h, T, workload, params)
+    best = np.inf
+    K = best_K
+    for _ in range(16):
+        cost, _, _, p = kl_worst_case(
+            khybrid_components(h, T, K, params), workload, rho)
+        if cost < best:
+            best, best_K = cost, K
+        next_K = khybrid_runs(h, T, p, params)
+        if np.all(next_K == K):
+            break
+        K = next_K
+
+    improved = True
+    while improved:
+        improved = False
+        for i in range(best_K.shape[0]):
+            for step in (-1., 1.):
+                if not (1 <= best_K[i] + step <= T - 1):
+                    continue
+                K = best_K.copy()
+                K[i] += step
+                cost = kl_worst_case(
+                    khybrid_components(h, T, K, params), workload, rho)[0]
+                if cost < best:
+                    best, best_K, improved = cost, K, True
+
+    return best_K, best
+
+
+@njit(cache=True, nogil=True)
+def khybrid_robust_grid(hs, Ts, workload, rho, params):
+    """khybrid_robust_runs cost over the grid hs x Ts"""
+    costs = np.empty((hs.shape[0], Ts.shape[0]))
+    for i in range(hs.shape[0]):
+        for j in range(Ts.shape[0]):
+            costs[i, j] = khybrid_robust_runs(
+                hs[i], Ts[j], workload, rho, params)[1]
+
+    return costs
+
+
+class HybridWorkloadUncertainty(object):
+    """
+    Robust program for workload uncertainty over the cost_func models
+    """
+
+    def __init__(self, cost_model, multi_start=None, h_points=64,
+                 polish_count=3, solver='slsqp', piecewise=True, pool=None):
+        """Constructor
+
+        :param cost_model: any of the cost_func models, only its parameters
+            are used so one instance serves every policy
+        :param multi_start: MultiStart for the continuous models, a single
+            start if None, unused with piecewise
+        :param h_points: points of the KHybrid h grid
+        :param polish_count: KHybrid cells whose h is polished
+        :param solver: name of a backend in lsm_tree.solvers.SOLVERS for the
+            continuous models, one supporting constraints for the run count
+            models, unused with piecewise
+        :param piecewise: solve the continuous models one level count at a
+            time, else from the starts of get_robust_design
+        :param pool: Executor solving the pieces in parallel, serial if None
+        """
+        self.cost_model = cost_model
+        self.multi_start = multi_start
+        self.solver = solver
+        self.piecewise = piecewise
+        self.pool = pool
+        self.h_points = h_points
+        self.polish_count = polish_count
+        self.logger = logging.getLogger("rlt_logger")
+
+    def h_bounds(self):
+        one_mib_in_bits = 1024 * 1024 * 8
+        B, E, H, N, phi, s = self.cost_model.params()
+        return 1, H - (one_mib_in_bits / N)
+
+    def design(self, h, T, policy, components, workload, rho):
+        """Design dict with the dual's diagnostics"""
+        obj, lamb, eta, _ = kl_worst_case(components, workload, rho)
+        return {'h': h, 'T': T, 'policy': policy, 'lambda': lamb,
+                'eta': eta, 'cost': workload @ components, 'obj': obj}
+
+    def get_robust_design(self, rho, policy, z0, z1, q, w,
+                          nominal_design=None, seeds=None):
+        """Returns the robust design of one policy, the best of the solves
+        and of the points they start from
+
+        :param rho:
+        :param policy: Policy
+        :param z0:
+        :param z1:
+        :param q:
+        :param w:
+        :param nominal_design: design to start from, with keys h, T and the
+            policy's run counts. If None, h = 5, T = 20 and run counts of 10,
+            and for the run count models the robust leveling and tiering
+            designs. With piecewise it is only a candidate next to the
+            pieces
+        :param seeds: dict of Policy to the robust leveling and tiering
+            designs at rho, the ones missing are solved and added. Unused
+            with piecewise
+        :return design: dict with keys h, T, the run counts (Q, Y and Z, or
+            K), policy, cost, obj, lambda, eta, exit_mode and from_start,
+            True when the design is a start no solve improved on. exit_mode
+            is the status of the solve giving the design, 0 for a start
+        """
+        workload = np.array([z0, z1, q, w], dtype=np.float64)
+        if policy == Policy.KHybrid:
+            return self.get_robust_khybrid_design(rho, workload)
+
+        components, jacobian, extra, runs = MODEL_KERNELS[policy]
+        kernel_args = extra + (self.cost_model.params(),)
+        args = (rho, workload, (components, jacobian), kernel_args)
+
+        h_low, h_high = self.h_bounds()
+        T_LOWER_LIM, T_UPPER_LIM = (2, 100)
+        bounds = ([(h_low, h_high), (T_LOWER_LIM, T_UPPER_LIM)]
+                  + [(1, T_UPPER_LIM - 1)] * len(runs))
+
+        if nominal_design is not None:
+            starts = [[nominal_design[key] for key in ('h', 'T') + runs]]
+        elif self.piecewise:
+            starts = []
+        else:
+            starts = [[5., 20.] + [10.] * len(runs)]
+            if runs:
+                # ceil(L) makes the run count models rugged, so they also
+                # start from the robust leveling (runs of 1) and tiering
+                # (runs of T - 1) designs they contain
+                seeds = {} if seeds is None else seeds
+                for seed, count in ((Policy.Leveling, lambda T: 1.),
+                                    (Policy.Tiering, lambda T: T - 1)):
+                    if seed not in seeds:
+                        seeds[seed] = self.get_robust_design(
+                            rho, seed, z0, z1, q, w)
+                    seed = seeds[seed]
+                    starts.append([seed['h'], seed['T']]
+                                  + [count(seed['T'])] * len(runs))
+
+        # (obj, x, exit_mode, from_start, diagnostics) of every solve and of
+        # every feasible start, as SLSQP can end above the point it started
+        # from
+        candidates = []
+        for x0 in starts:
+            x0 = np.clip(x0, *bound_arrays(bounds))
+            if np.all(x0[1] - x0[2:] >= 1):
+                candidates.append((model_worst_case_objective(x0, *args),
+                                   x0, 0, True, None))
+            if not self.piecewise:
+                candidates.append(
+                    self.solve_from(x0, bounds, len(runs), args))
+        if self.piecewise:
+            candidates += self.solve_by_levels(policy, bounds, args)
+
+        _, x, status, from_start, diagnostics = min(
+            candidates, key=lambda candidate: candidate[0])
+        design = self.design(x[0], x[1], policy,
+                             components(*x, *kernel_args), workload, rho)
+        for key, value in zip(runs, x[2:]):
+            design[key] = value
+        design['exit_mode'] = status
+        design['from_start'] = from_start
+        if diagnostics is not None:
+            design['diagnostics'] = diagnostics
+        return design
+
+    def solve_from(self, x0, bounds, num_runs, args):
+        """Solves from x0 with the backend self.solver, through
+        self.multi_start if set
+
+        :return candidate: (obj, x, exit_mode, False, diagnostics)
+        """
+        minimizer_kwargs = {
+            'method': self.solver,
+            'bounds': bounds,
+            'tol': 1e-12}
+        if num_runs:
+            # T - run count >= 1 for each run count
+            A = np.zeros((num_runs, 2 + num_runs))
+            A[:, 1] = 1
+            A[:, 2:] = -np.eye(num_runs)
+            minimizer_kwargs['constraints'] = LinearConstraint(A, 1, np.inf)
+
+        sol, diagnostics = minimize_from(
+            self.multi_start,
+            fun=model_worst_case_objective,
+            jac=model_worst_case_objective_gradient,
+            x0=x0, args=args, **minimizer_kwargs)
+        return sol.fun, sol.x, sol.status, False, diagnostics
+
+    def solve_by_levels(self, policy, bounds, args):
+        """Solves every level count the bounds allow with solve_pieces
+
+        :return candidates: (obj, x, exit_mode, False, None) of each piece,
+            obj at the true level count of x
+        """
+        B, E, H, N, phi, s = self.cost_model.params()
+        buffer = (H * N / BITS_IN_BYTES, N / BITS_IN_BYTES, N * E)
+        rho, workload, _, kernel_args = args
+        pieces = solve_pieces(
+            piece_worst_case_objective, piece_worst_case_objective_gradient,
+            tuple(bounds), buffer,
+            (rho, workload, PIECE_KERNELS[policy], kernel_args), self.pool)
+
+        return [(model_worst_case_objective(sol.x, *args), sol.x,
+                 sol.status, False, None)
+                for _, sol in pieces]
+
+    def get_robust_khybrid_design(self, rho, workload):
+        """Returns the robust KHybrid design with an integer T and integer
+        run caps
+
+        :param rho:
+        :param workload: (z0, z1, q, w) array
+        :return design:
+        """
+        params = self.cost_model.params()
+        hs = np.linspace(*self.h_bounds(), self.h_points)
+        Ts = np.arange(2, 101, dtype=np.float64)
+        costs = khybrid_robust_grid(hs, Ts, workload, rho, params)
+
+        obj, h, T, status = polish_grid(
+            hs, Ts, costs,
+            lambda h, T: khybrid_robust_runs(h, T, workload, rho, params)[1],
+            self.polish_count)
+        K, _ = khybrid_robust_runs(h, T, workload, rho, params)
+        design = self.design(h, T, Policy.KHybrid,
+                             khybrid_components(h, T, K, params),
+                             workload, rho)
+        design['K'] = K.astype(np.int64)
+        design['levels'] = len(K)
+        design['exit_mode'] = status
+        return design
+
+    def get_robust_designs(self, rho, z0, z1, q, w, policies=None):
+        """Returns the robust design of each policy
+
+        :param rho:
+        :param z0:
+        :param z1:
+        :param q:
+        :param w:
+        :param policies: policies to tune, every one if None
+        :return designs: dict of Policy to design
+        """
+        if policies is None:
+            policies = list(MODEL_KERNELS) + [Policy.KHybrid]
+        # The run count models start from the leveling and tiering designs,
+        # each solved once
+        seeds = {}
+        designs = {}
+        for policy in policies:
+            if policy in seeds:
+                design = seeds[policy]
+            else:
+                design = self.get_robust_design(rho, policy, z0, z1, q, w,
+                                                seeds=seeds)
+                if policy in (Policy.Leveling, Policy.Tiering):
+                    seeds[policy] = design
+            design['rho'] = rho
+            designs[policy] = design
+        return designs
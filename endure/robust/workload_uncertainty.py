@@ -5,7 +5,174 @@ This class implements the robust linear program
 import logging
 import numpy as np
 # np.seterr(all='ignore')
-from scipy.optimize import minimize, Bounds
+from numba import njit, prange
+from scipy.optimize import Bounds
+from lsm_tree.cost_function import cost_components, cost_components_jacobian
+from lsm_tree.multi_start import minimize_from
+from lsm_tree.nominal import workload_vector, cost_args, solve_in_bound_order
+
+
+@njit(cache=True, nogil=True)
+def kl_worst_case(components, workload, rho):
+    """Worst case workload cost over the KL ball of radius rho
+
+    Minimizing the dual eta + rho * lamb + lamb * sum(w * (exp((c - eta) /
+    lamb) - 1)) over eta gives eta = lamb * log(sum(w * exp(c / lamb))),
+    leaving a convex problem in lamb alone. Its optimum is where the tilted
+    workload p ~ w * exp(c / lamb) is at KL divergence rho from w, found by
+    a safeguarded Newton search on t = 1 / lamb with the exponentials
+    shifted by max(c) so they never overflow.
+
+    :param components: [Z0, Z1, Q, W]
+    :param workload: (z0, z1, q, w)
+    :param rho: radius of the KL ball
+    :return cost, lamb, eta, p: worst case cost, dual variables and the
+        worst case workload
+    """
+    n = components.shape[0]
+    c_max = -np.inf
+    c_min = np.inf
+    c_mean = 0.
+    for i in range(n):
+        if workload[i] > 0:
+            c_max = max(c_max, components[i])
+            c_min = min(c_min, components[i])
+            c_mean += workload[i] * components[i]
+
+    if rho <= 0 or c_max == c_min:
+        return c_mean, np.inf, c_mean, workload.copy()
+
+    # Beyond -log(w(argmax c)) the ball holds the workload running only the
+    # most expensive operations
+    p = np.zeros(n)
+    w_max = 0.
+    for i in range(n):
+        if workload[i] > 0 and components[i] == c_max:
+            w_max += workload[i]
+            p[i] = workload[i]
+    if rho >= -np.log(w_max):
+        return c_max, 0., c_max, p / w_max
+
+    # KL(p_t || w) - rho increases from -rho at t = 0 to a positive limit
+    lo, hi = 0., np.inf
+    t = 1. / (c_max - c_min)
+    log_z = 0.
+    for _ in range(200):
+        z = 0.
+        p_c = 0.
+        p_c2 = 0.
+        # Operations off the workload stay off, even if they cost more than
+        # c_max and their exponential overflows
+        for i in range(n):
+            p[i] = 0.
+            if workload[i] > 0:
+                p[i] = workload[i] * np.exp(t * (components[i] - c_max))
+                z += p[i]
+        for i in range(n):
+            if p[i] == 0:
+                continue
+            p[i] /= z
+            p_c += p[i] * (components[i] - c_max)
+            p_c2 += p[i] * (components[i] - c_max) ** 2
+        log_z = np.log(z)
+        excess = (t * p_c) - log_z - rho
+        if excess > 0:
+            hi = t
+        else:
+            lo = t
+        if abs(excess) <= 1e-12 * rho:
+            break
+
+        slope = t * (p_c2 - p_c ** 2)
+        step = t - excess / slope if slope > 0 else np.nan
+        if lo < step < hi:
+            t = step
+        elif hi == np.inf:
+            t *= 2
+        else:
+            t = (lo + hi) / 2
+
+    lamb = 1. / t
+    eta = c_max + lamb * log_z
+    return eta + (rho * lamb), lamb, eta, p
+
+
+@njit(cache=True, nogil=True)
+def kl_worst_case_batch(components, workload, rho):
+    """kl_worst_case cost of each row of an (n, 4) array of [Z0, Z1, Q, W],
+    NaN rows stay NaN"""
+    costs = np.empty(components.shape[0])
+    for i in range(components.shape[0]):
+        if np.isnan(components[i, 0]):
+            costs[i] = np.nan
+            continue
+        costs[i] = kl_worst_case(components[i], workload, rho)[0]
+
+    return costs
+
+
+@njit(cache=True, nogil=True, parallel=True)
+def kl_worst_case_grid(components, workloads, rhos):
+    """Worst case workload and cost of every tuning at every radius
+
+    Each entry is kl_worst_case, the expected workload tilted by exp(c /
+    lamb) with lamb found by a 1-D search, so it is the exact supremum over
+    the KL ball rather than the largest cost among sampled workloads.
+
+    :param components: (t, 4) [Z0, Z1, Q, W] of each tuning
+    :param workloads: (t, 4) expected workload of each tuning
+    :param rhos: (r,) KL radii
+    :return costs, worst_workloads: (t, r) worst case costs and (t, r, 4)
+        worst case workloads, NaN for NaN components
+    """
+    t, r = components.shape[0], rhos.shape[0]
+    costs = np.empty((t, r))
+    worst_workloads = np.empty((t, r, 4))
+    for row in prange(t * r):
+        i, j = row // r, row % r
+        if np.isnan(components[i, 0]):
+            costs[i, j] = np.nan
+            worst_workloads[i, j, :] = np.nan
+            continue
+        cost, _, _, p = kl_worst_case(components[i], workloads[i], rhos[j])
+        costs[i, j] = cost
+        worst_workloads[i, j, :] = p
+
+    return costs, worst_workloads
+
+
+def worst_case_objective(x, rho, workload, kernel_args):
+    """Worst case cost of x = (h, T) over the KL ball of radius rho
+
+    :param x:
+    :param rho:
+    :param workload: (z0, z1, q, w) array
+    :param kernel_args: cost_components arguments after (h, T)
+    """
+    h, T = x
+    if np.isnan(h) or np.isnan(T):
+        return np.iinfo(np.int64).max
+
+    components = cost_components(h, T, *kernel_args)
+    return kl_worst_case(components, workload, rho)[0]
+
+
+def worst_case_objective_gradient(x, rho, workload, kernel_args):
+    """Gradient of worst_case_objective, which by the envelope theorem is the
+    gradient of the cost under the worst case workload
+
+    :param x:
+    :param rho:
+    :param workload:
+    :param kernel_args:
+    """
+    h, T = x
+    if np.isnan(h) or np.isnan(T):
+        return np.zeros(2)
+
+    components = cost_components(h, T, *kernel_args)
+    p = kl_worst_case(components, workload, rho)[3]
+    return p @ cost_components_jacobian(h, T, *kernel_args)
 
 
 class WorkloadUncertainty(object):
@@ -13,12 +180,21 @@ class WorkloadUncertainty(object):
     Robust non-linear program for workload uncertainty
     """
 
-    def __init__(self, cf):
+    def __init__(self, cf, multi_start=None, policy_bounds=None,
+                 solver='slsqp'):
         """Constructor
 
         :param cf:
+        :param multi_start: MultiStart to solve from several starts, a
+            single start if None
+        :param policy_bounds: PolicyBounds to skip policies that cannot beat
+            the best design found, every policy is solved if None
+        :param solver: name of a backend in lsm_tree.solvers.SOLVERS
         """
         self.cf = cf
+        self.multi_start = multi_start
+        self.policy_bounds = policy_bounds
+        self.solver = solver
         self.logger = logging.getLogger("rlt_logger")
         self.rho = 0.
 
@@ -32,36 +208,89 @@ class WorkloadUncertainty(object):
         # return min(1e6, ret)
         return ret
 
-    def calculate_objective(self, x):
+    def calculate_objective(self, x, rho=None, workload=None,
+                            kernel_args=None):
         """Calculates dual objective
 
         :param x:
+        :param rho: defaults to self.rho
+        :param workload: (z0, z1, q, w), defaults to the cost function's
+        :param kernel_args: cost_components arguments after (h, T), defaults
+            to the cost function's
         :return cost:
         """
         h = x[0]
         T = x[1]
         lamb = x[2]
         eta = x[3]
+        rho, workload, kernel_args = self.problem(rho, workload, kernel_args)
+
+        z0, z1, q, w = cost_components(h, T, *kernel_args)
 
         total_cost = 0
-        total_cost += self.cf.z0 * \
-            self.KL_divergence_conjugate((self.cf.Z0(h, T) - eta) / lamb)
-        total_cost += self.cf.z1 * \
-            self.KL_divergence_conjugate((self.cf.Z1(h, T) - eta) / lamb)
-        total_cost += self.cf.q * \
-            self.KL_divergence_conjugate((self.cf.Q(h, T) - eta) / lamb)
-        total_cost += self.cf.w * \
-            self.KL_divergence_conjugate((self.cf.W(h, T) - eta) / lamb)
-        cost = eta + (self.rho * lamb) + (lamb * total_cost)
+        total_cost += workload[0] * \
+            self.KL_divergence_conjugate((z0 - eta) / lamb)
+        total_cost += workload[1] * \
+            self.KL_divergence_conjugate((z1 - eta) / lamb)
+        total_cost += workload[2] * \
+            self.KL_divergence_conjugate((q - eta) / lamb)
+        total_cost += workload[3] * \
+            self.KL_divergence_conjugate((w - eta) / lamb)
+        cost = eta + (rho * lamb) + (lamb * total_cost)
         return cost
 
+    def calculate_objective_gradient(self, x, rho=None, workload=None,
+                                     kernel_args=None):
+        """Calculates the gradient of the dual objective
+
+        :param x:
+        :param rho:
+        :param workload:
+        :param kernel_args:
+        :return grad:
+        """
+        h = x[0]
+        T = x[1]
+        lamb = x[2]
+        eta = x[3]
+        rho, workload, kernel_args = self.problem(rho, workload, kernel_args)
+
+        components = cost_components(h, T, *kernel_args)
+        jac = cost_components_jacobian(h, T, *kernel_args)
+        # Derivative of the conjugate exp(s) - 1 weighted by each operation
+        tilt = workload * np.exp((components - eta) / lamb)
+
+        grad = np.empty(4)
+        grad[:2] = tilt @ jac
+        grad[2] = (rho
+                   + np.sum(workload * self.KL_divergence_conjugate(
+                       (components - eta) / lamb))
+                   - np.sum(tilt * (components - eta)) / lamb)
+        grad[3] = 1 - np.sum(tilt)
+        return grad
+
+    def problem(self, rho=None, workload=None, kernel_args=None):
+        """Fills in the defaults of the dual's parameters from self.rho and
+        the cost function, without modifying either
+
+        :param rho:
+        :param workload: (z0, z1, q, w) array
+        :param kernel_args:
+        """
+        if rho is None:
+            rho = self.rho
+        if workload is None:
+            workload = workload_vector(self.cf)
+        if kernel_args is None:
+            kernel_args = cost_args(self.cf, self.cf.is_leveling_policy)
+        return rho, workload, kernel_args
+
     def cf_callback(self, x):
         h, T, eta, lamb = x
         total = self.cf.calculate_cost(h, T)
-        z0 = self.KL_divergence_conjugate((self.cf.Z0(h, T) - eta) / lamb)
-        z1 = self.KL_divergence_conjugate((self.cf.Z1(h, T) - eta) / lamb)
-        q = self.KL_divergence_conjugate((self.cf.Q(h, T) - eta) / lamb)
-        w = self.KL_divergence_conjugate((self.cf.W(h, T) - eta) / lamb)
+        components = self.cf.calculate_components(h, T)
+        z0, z1, q, w = self.KL_divergence_conjugate(
+            (components - eta) / lamb)
 
         print(f'{eta:.2f}'
               f'\t {lamb:.2f}'
@@ -74,28 +303,52 @@ class WorkloadUncertainty(object):
               f'\t {h:.6f}'
               f'\t {T:.6f}')
 
-    def get_robust_leveling_design(
+    def calculate_worst_case(self, x, rho=None, workload=None,
+                             kernel_args=None):
+        """Calculates the dual objective with lambda and eta minimized out,
+        i.e. the worst case cost of (h, T) over the KL ball
+
+        :param x: (h, T)
+        :param rho:
+        :param workload:
+        :param kernel_args:
+        :return cost:
+        """
+        rho, workload, kernel_args = self.problem(rho, workload, kernel_args)
+        return worst_case_objective(x, rho, workload, kernel_args)
+
+    def calculate_worst_case_gradient(self, x, rho=None, workload=None,
+                                      kernel_args=None):
+        """Calculates the gradient of the worst case cost
+
+        :param x: (h, T)
+        :param rho:
+        :param workload:
+        :param kernel_args:
+        :return grad:
+        """
+        rho, workload, kernel_args = self.problem(rho, workload, kernel_args)
+        return worst_case_objective_gradient(x, rho, workload, kernel_args)
+
+    def get_robust_design(
         self,
         rho,
+        is_leveling_policy,
         workload=None,
         nominal_design=None
     ):
-        """Returns robust leveling design
+        """Returns the robust design of one policy
+
+        Searches (h, T) for the lowest worst case cost, each evaluation
+        solving the 1-D dual in lambda with kl_worst_case.
 
         :param rho:
+        :param is_leveling_policy:
         :param workload:
-        :param nominal_design:
+        :param nominal_design: initial (h, T), h = 5 and T = 20 if None
         :return design:
         """
-        self.rho = rho
-
-        if workload is not None:
-            self.cf.w = workload['w']
-            self.cf.z0 = workload['z0']
-            self.cf.z1 = workload['z1']
-            self.cf.q = workload['q']
-
-        one_mib_in_bits = 1024 * 1024 * 8
+        workload = workload_vector(self.cf, workload)
 
         if nominal_design is not None:
             h_initial = nominal_design['M_filt'] / self.cf.N
@@ -104,99 +357,256 @@ class WorkloadUncertainty(object):
             h_initial = 5.
             T_initial = 20.
 
+        bounds = self.design_bounds()
+        minimizer_kwargs = {
+            'method': self.solver,
+            'bounds': bounds,
+            'tol': 1e-12}
+
+        kernel_args = cost_args(self.cf, is_leveling_policy)
+        sol, diagnostics = minimize_from(
+            self.multi_start,
+            fun=worst_case_objective,
+            jac=worst_case_objective_gradient,
+            args=(rho, workload, kernel_args),
+            x0=np.clip([h_initial, T_initial], bounds.lb, bounds.ub),
+            **minimizer_kwargs)
+
         design = {}
+        design['exit_mode'] = sol.status
+        design['nfev'] = sol.nfev
+        design['njev'] = sol.njev
+        design.update(self.design_at(sol.x, rho, is_leveling_policy, workload))
+        if diagnostics is not None:
+            design['diagnostics'] = diagnostics
+        return design
 
-        # Check leveling cost
+    def design_bounds(self):
+        """Bounds of (h, T), h leaving 1 MiB to the buffer
+
+        :return bounds: Bounds
+        """
+        one_mib_in_bits = 1024 * 1024 * 8
         h_upper_lim = (self.cf.M / self.cf.N) - (one_mib_in_bits / self.cf.N)
         T_upper_lim = 100
         T_lower_lim = 2
-        bounds = Bounds(
-            [1, T_lower_lim, 0.1, -np.inf],
-            [h_upper_lim, T_upper_lim, np.inf, np.inf],
-            keep_feasible=True)
+        return Bounds([1, T_lower_lim], [h_upper_lim, T_upper_lim],
+                      keep_feasible=True)
 
-        minimizer_kwargs = {
-            'method': 'SLSQP',
-            'bounds': bounds,
-            'options': {'ftol': 1e-12, 'disp': False}}
-
-        self.cf.is_leveling_policy = True
-        sol = minimize(fun=self.calculate_objective,
-                       x0=np.array([h_initial, T_initial, 1., 1.]),
-                       #    callback = self.cf_callback,
-                       **minimizer_kwargs)
-        cost = self.cf.calculate_cost(sol.x[0], sol.x[1])
-        design['exit_mode'] = sol.status
-        design['T'] = sol.x[1]
-        design['M_h'] = sol.x[0]
-        design['M_filt'] = sol.x[0] * self.cf.N
+    def design_at(self, x, rho, is_leveling_policy, workload):
+        """Design keys of (h, T) at rho, without the solver ones
+
+        :param x: (h, T)
+        :param rho:
+        :param is_leveling_policy:
+        :param workload: (z0, z1, q, w) array
+        :return design:
+        """
+        kernel_args = cost_args(self.cf, is_leveling_policy)
+        components = cost_components(x[0], x[1], *kernel_args)
+        obj, lamb, eta, _ = kl_worst_case(components, workload, rho)
+        design = {}
+        design['T'] = x[1]
+        design['M_h'] = x[0]
+        design['M_filt'] = x[0] * self.cf.N
         design['M_buff'] = self.cf.M - design['M_filt']
-        design['is_leveling_policy'] = True
-        design['lambda'] = sol.x[2]
-        design['eta'] = sol.x[3]
-        design['cost'] = cost
-        design['obj'] = sol.fun
+        design['is_leveling_policy'] = bool(is_leveling_policy)
+        design['lambda'] = lamb
+        design['eta'] = eta
+        design['cost'] = workload @ components
+        design['obj'] = obj
         return design
 
-    def get_robust_tiering_design(
+    def get_robust_leveling_design(
         self,
         rho,
         workload=None,
         nominal_design=None
     ):
-        """Returns robust tiering design
+        """Returns robust leveling design
 
         :param rho:
         :param workload:
         :param nominal_design:
         :return design:
         """
-        self.rho = rho
+        return self.get_robust_design(rho, True, workload, nominal_design)
 
-        if workload is not None:
-            self.cf.w = workload['w']
-            self.cf.z0 = workload['z0']
-            self.cf.z1 = workload['z1']
-            self.cf.q = workload['q']
-
-        one_mib_in_bits = 1024 * 1024 * 8
-
-        if nominal_design is not None:
-            h_initial = nominal_design['M_filt'] / self.cf.N
-            T_initial = nominal_design['T']
-        else:
-            h_initial = 5.
-            T_initial = 20.
-
-        design = {}
+    def get_robust_tiering_design(
+        self,
+        rho,
+        workload=None,
+        nominal_design=None
+    ):
+        """Returns robust tiering design
 
-        # Check tiering cost
-        h_upper_lim = (self.cf.M / self.cf.N) - (one_mib_in_bits / self.cf.N)
-        T_upper_lim = 100
-        T_lower_lim = 2
-        bounds = Bounds([1, T_lower_lim, 0.1, -np.inf], [h_upper_lim,
-                        T_upper_lim, np.inf, np.inf], keep_feasible=True)
+        :param rho:
+        :param workload:
+        :param nominal_design:
+        :return design:
+        """
+        return self.get_robust_design(rho, False, workload, nominal_design)
 
-        minimizer_kwargs = {
-            'method': 'SLSQP',
-            'bounds': bounds,
-            'options': {'ftol': 1e-12, 'disp': False}}
+    def get_robust_designs(self, rho, workload=None, seeds=None):
+        """Returns the robust design of each policy
 
-        self.cf.is_leveling_policy = False
-        sol = minimize(fun=self.calculate_objective,
-                       x0=np.array([h_initial, T_initial, 1e20, 1]),
-                       #    callback = self.cf_callback,
-                       **minimizer_kwargs)
+        :param rho:
+        :param workload:
+        :param seeds: dict of policy to the design to start from
+        :return designs: dict of is_leveling_policy to design, without the
+            policies policy_bounds pruned
+        """
+        seeds = seeds or {}
+
+        def solve(policy):
+            design = self.get_robust_design(
+                rho, policy, workload, seeds.get(policy))
+            design['rho'] = rho
+            return design
+
+        if self.policy_bounds is None:
+            return {policy: solve(policy) for policy in (True, False)}
+
+        workload_array = workload_vector(self.cf, workload)
+        designs, _ = solve_in_bound_order(
+            {policy: self.policy_bounds.robust_bounds(
+                policy, rho, workload_array)
+             for policy in (True, False)},
+            solve, 'obj')
+        return designs
+
+    def predict_designs(self, rho, workload, solved, step_tol):
+        """Returns the designs at rho by a first-order step along the last two
+        solved rhos, None where the step needs a solve
+
+        A solve is needed when h or T would move by more than step_tol
+        relative to the last solved design, when the last solved design beats
+        the step at rho (the step left a kink of ceil(L)), when the best
+        policy would flip, or when policy_bounds cannot rule out a policy
+        that was pruned.
 
-        cost = self.cf.calculate_cost(sol.x[0], sol.x[1])
-        design['exit_mode'] = sol.status
-        design['T'] = sol.x[1]
-        design['M_h'] = sol.x[0]
-        design['M_filt'] = sol.x[0] * self.cf.N
-        design['M_buff'] = self.cf.M - design['M_filt']
-        design['is_leveling_policy'] = False
-        design['lambda'] = sol.x[2]
-        design['eta'] = sol.x[3]
-        design['cost'] = cost
-        design['obj'] = sol.fun
-        return design
+        :param rho:
+        :param workload:
+        :param solved: the designs of the last two solved rhos, oldest first
+        :param step_tol:
+        :return designs: dict of is_leveling_policy to design, or None
+        """
+        if len(solved) < 2:
+            return None
+
+        before, last = solved
+        workload = workload_vector(self.cf, workload)
+        bounds = self.design_bounds()
+        designs = {}
+        for policy, design in last.items():
+            if policy not in before:
+                return None
+            x1 = np.array([design['M_h'], design['T']])
+            x0 = np.array([before[policy]['M_h'], before[policy]['T']])
+            slope = (x1 - x0) / (design['rho'] - before[policy]['rho'])
+            x = x1 + slope * (rho - design['rho'])
+            if np.any(np.abs(x - x1) > step_tol * np.abs(x1)):
+                return None
+            x = np.clip(x, bounds.lb, bounds.ub)
+            designs[policy] = self.design_at(x, rho, policy, workload)
+            # Beyond rounding, so flat stretches of the path are not solved
+            stale = self.design_at(x1, rho, policy, workload)
+            if stale['obj'] < designs[policy]['obj'] * (1 - 1e-9):
+                return None
+            designs[policy]['exit_mode'] = design['exit_mode']
+            designs[policy]['rho'] = rho
+
+        def best_policy(designs):
+            return min(designs, key=lambda policy: designs[policy]['obj'])
+
+        if best_policy(designs) != best_policy(last):
+            return None
+        incumbent = designs[best_policy(designs)]['obj']
+        for policy in {True, False} - set(designs):
+            lower, _ = self.policy_bounds.robust_bounds(policy, rho, workload)
+            if lower < incumbent:
+                return None
+        return designs
+
+    def get_robust_path(
+        self,
+        rhos,
+        workload=None,
+        nominal_design=None,
+        jump_tol=0.25,
+        max_refine=4,
+        step_tol=0.02
+    ):
+        """Returns robust designs along a rho grid by continuation
+
+        Each solve starts from the previous rho's design of the same policy,
+        so neighbouring rhos take few iterations. At interior grid rhos the
+        solve is skipped when predict_designs finds the first-order step
+        along the last two solved rhos below step_tol with no policy flip,
+        so the number of solves follows how far the designs move more than
+        the grid size. This does not make a fine grid as cheap as a coarse
+        one: on 8 workloads over rho in [0, 4), step 0.01 takes about 6 times
+        as long as step 0.25, and skipped rhos can sit up to about 6e-4
+        (relative) above a solve near the kinks of ceil(L). Set step_tol = 0
+        to solve every rho.
+
+        Where the best design jumps between two rhos (a policy flip or h or T
+        moving by more than jump_tol relative to the previous design), the
+        interval is bisected up to max_refine times to locate the jump.
+
+        :param rhos: increasing rhos
+        :param workload:
+        :param nominal_design: design to start the first rho from
+        :param jump_tol:
+        :param max_refine:
+        :param step_tol: largest relative step of h and T taken without a
+            solve, 0 solves every rho
+        :return path: best design per rho in increasing rho, with 'refined'
+            True for the rhos added around jumps and 'predicted' True for the
+            rhos not solved, which keep the exit_mode of the last solve
+        """
+        def best(designs):
+            return min(designs.values(), key=lambda design: design['obj'])
+
+        def is_jump(left, right):
+            if left['is_leveling_policy'] != right['is_leveling_policy']:
+                return True
+            return any(abs(right[key] - left[key]) > jump_tol * abs(left[key])
+                       for key in ('M_h', 'T'))
+
+        def solve(rho, seeds):
+            designs = self.get_robust_designs(rho, workload, seeds)
+            for design in designs.values():
+                design['predicted'] = False
+            return designs
+
+        def refine(left, right, depth):
+            if depth >= max_refine or not is_jump(best(left), best(right)):
+                return []
+            rho = (best(left)['rho'] + best(right)['rho']) / 2
+            mid = solve(rho, left)
+            best(mid)['refined'] = True
+            return (refine(left, mid, depth + 1) + [best(mid)]
+                    + refine(mid, right, depth + 1))
+
+        path = []
+        prev = {True: nominal_design, False: nominal_design}
+        solved = []
+        for idx, rho in enumerate(rhos):
+            designs = None
+            if 0 < idx < len(rhos) - 1 and step_tol > 0:
+                designs = self.predict_designs(rho, workload, solved,
+                                               step_tol)
+                if designs is not None:
+                    for design in designs.values():
+                        design['predicted'] = True
+            if designs is None:
+                designs = solve(rho, prev)
+                solved = solved[-1:] + [designs]
+            best(designs)['refined'] = False
+            if idx > 0:
+                path.extend(refine(prev, designs, 0))
+            path.append(best(designs))
+            prev = designs
+
+        return path